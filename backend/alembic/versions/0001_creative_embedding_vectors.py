@@ -0,0 +1,87 @@
+"""creative embeddings as vectors
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+creative_embeddings.embedding_data becomes a float32 vector (pgvector's
+vector(256) on PostgreSQL, packed bytes elsewhere) with an
+embedding_version, one row per (creative_id, embedding_type) and an HNSW
+cosine index on PostgreSQL. Databases that init_db creates from the models
+already have this layout; the steps below only touch what is missing.
+
+The old text column was never written, so existing rows are dropped rather
+than converted.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.models import EmbeddingVector
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "creative_embeddings"
+DIM = 256
+
+
+def _columns() -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(TABLE)}
+
+
+def _indexes() -> set:
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(TABLE)}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if TABLE not in sa.inspect(bind).get_table_names():
+        # New database: init_db creates the table as the models define it
+        return
+    postgresql = bind.dialect.name == "postgresql"
+    if postgresql:
+        op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    
+    if "embedding_version" not in _columns():
+        op.execute(sa.text(f"DELETE FROM {TABLE}"))
+        with op.batch_alter_table(TABLE) as batch:
+            batch.drop_column("embedding_data")
+            batch.add_column(sa.Column("embedding_data", EmbeddingVector(DIM), nullable=False))
+            batch.add_column(sa.Column("embedding_version", sa.String(20)))
+    
+    indexes = _indexes()
+    if "ix_creative_embeddings_created_at" not in indexes:
+        op.create_index("ix_creative_embeddings_created_at", TABLE, ["created_at"])
+    if "idx_embeddings_creative_type" not in indexes:
+        op.create_index(
+            "idx_embeddings_creative_type", TABLE, ["creative_id", "embedding_type"], unique=True
+        )
+    if postgresql and "idx_embeddings_hnsw" not in indexes:
+        op.create_index(
+            "idx_embeddings_hnsw", TABLE, ["embedding_data"],
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding_data": "vector_cosine_ops"},
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if TABLE not in sa.inspect(bind).get_table_names():
+        return
+    
+    indexes = _indexes()
+    for name in ("idx_embeddings_hnsw", "idx_embeddings_creative_type", "ix_creative_embeddings_created_at"):
+        if name in indexes:
+            op.drop_index(name, table_name=TABLE)
+    
+    if "embedding_version" in _columns():
+        op.execute(sa.text(f"DELETE FROM {TABLE}"))
+        with op.batch_alter_table(TABLE) as batch:
+            batch.drop_column("embedding_version")
+            batch.drop_column("embedding_data")
+            batch.add_column(sa.Column("embedding_data", sa.Text()))
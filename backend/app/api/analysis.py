@@ -1,20 +1,27 @@
 """
 Analysis API Router - Direct analysis endpoints for creatives.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional, Any
-import uuid
+from typing import Optional, Any, AsyncIterator, List
+import asyncio
 import os
-import tempfile
+import json
+import uuid
 import numpy as np
 
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
 from app.core.auth import get_current_user
 from app.core.config import settings
 from app.models.models import User
 from app.services.orchestrator import AnalysisOrchestrator
+from app.services.persistence import charge_tokens
+from app.services.cpu_pool import get_cpu_pool
+from app.services.llm.rate_limiter import get_rate_limiter, set_llm_user
+from app.services.progress import stream_events, batch_channel, rescore_channel, SSE_HEADERS
+from app.services.storage.media_storage import ingest_upload, max_upload_bytes, UploadTooLarge
 
 router = APIRouter(prefix="/analysis", tags=["Analysis"])
 
@@ -42,12 +49,18 @@ async def analyze_image(
     category: str = "general",
     platform: str = "general",
     funnel_stage: str = "awareness",
+    progressive: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze a creative image with full pipeline.
     Returns scores, signals, and recommendations.
+    
+    With `progressive=true` the response is newline-delimited JSON instead:
+    a provisional score from the deterministic layers (OpenCV, OCR) as soon
+    as they finish, a revision once Vision is in, and finally the full
+    result. Every line carries its `revision` number and a `final` flag.
     """
     # Check token budget
     if current_user.tokens_used >= current_user.token_budget:
@@ -60,15 +73,24 @@ async def analyze_image(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files are supported")
     
-    # Save to temp
-    file_ext = file.filename.split(".")[-1] if file.filename else "jpg"
-    temp_path = os.path.join(tempfile.gettempdir(), f"analysis_{uuid.uuid4()}.{file_ext}")
+    # Backpressure before any work is done (503 + Retry-After)
+    get_cpu_pool().ensure_capacity()
+    set_llm_user(current_user.id)
+    
+    # Stream to a temp file in chunks (size-limited)
+    temp_path = (await ingest_upload(file)).path
+    
+    if progressive:
+        return StreamingResponse(
+            _progressive_analysis(
+                temp_path, current_user.id,
+                current_user.token_budget - current_user.tokens_used,
+                category, platform, funnel_stage
+            ),
+            media_type="application/x-ndjson"
+        )
     
     try:
-        content = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(content)
-        
         # Run analysis with user's remaining token budget
         remaining_budget = current_user.token_budget - current_user.tokens_used
         orchestrator = AnalysisOrchestrator()
@@ -95,88 +117,516 @@ async def analyze_image(
             os.remove(temp_path)
 
 
+def _progressive_analysis(
+    temp_path: str,
+    user_id: uuid.UUID,
+    token_budget: int,
+    category: str,
+    platform: str,
+    funnel_stage: str
+) -> AsyncIterator[str]:
+    """
+    Start the analysis now and return the NDJSON lines of its score
+    revisions. The analysis owns the temp file and the token charge, so
+    both are settled even if the client disconnects mid-stream (which
+    cancels the analysis).
+    """
+    revisions: asyncio.Queue = asyncio.Queue()
+    
+    async def on_progress(event: dict):
+        if event["event"] == "score" and not event["final"]:
+            revisions.put_nowait(event)
+    
+    orchestrator = AnalysisOrchestrator(progress=on_progress, progressive=True)
+    
+    async def run() -> dict:
+        try:
+            return await orchestrator.analyze_creative(
+                image_path=temp_path,
+                category=category,
+                platform=platform,
+                funnel_stage=funnel_stage,
+                user_token_budget=token_budget
+            )
+        finally:
+            await charge_tokens(user_id, orchestrator.tokens_used)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    analysis = asyncio.create_task(run())
+    analysis.add_done_callback(lambda _: revisions.put_nowait(None))
+    
+    async def lines():
+        revision = 0
+        try:
+            while (event := await revisions.get()) is not None:
+                revision = event["revision"]
+                line = {key: event[key] for key in ("revision", "final", "layers", "score")}
+                yield json.dumps(convert_numpy_types(line)) + "\n"
+            
+            result = convert_numpy_types(analysis.result())
+            yield json.dumps({
+                "revision": revision + 1,
+                "final": True,
+                "layers": [name for name, signals in result["signals"]["layers"].items() if signals],
+                "result": result
+            }) + "\n"
+        finally:
+            analysis.cancel()
+    
+    return lines()
+
+
 @router.post("/compare")
 async def compare_creatives(
-    creative_a: UploadFile = File(...),
-    creative_b: UploadFile = File(...),
+    creative_a: Optional[UploadFile] = File(None),
+    creative_b: Optional[UploadFile] = File(None),
+    variants: List[UploadFile] = File(None),
     category: str = "general",
     platform: str = "general",
     funnel_stage: str = "awareness",
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Compare two creatives side-by-side."""
-    from app.services.scoring.comparison_engine import compare_creatives as compare_fn
+    """
+    Compare creatives side-by-side, or rank up to COMPARE_MAX_VARIANTS variants.
+    
+    Variants are labelled A, B, C... in upload order (creative_a and
+    creative_b first). All variants are analyzed concurrently, and
+    byte-identical uploads are analyzed only once.
+    """
+    import string
+    from app.services.orchestrator import VISION_TOKEN_RESERVE, COPY_TOKEN_RESERVE
+    from app.services.scoring.comparison_engine import (
+        compare_creatives as compare_fn, rank_creatives
+    )
+    
+    uploads = [f for f in (creative_a, creative_b) if f is not None] + list(variants or [])
+    if len(uploads) < 2:
+        raise HTTPException(status_code=400, detail="At least two creatives are required")
+    if len(uploads) > settings.COMPARE_MAX_VARIANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.COMPARE_MAX_VARIANTS} variants can be compared"
+        )
+    for file in uploads:
+        if not file.content_type or not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Only image files are supported")
     
-    # Analyze both
-    results = []
+    if current_user.tokens_used >= current_user.token_budget:
+        raise HTTPException(
+            status_code=402,
+            detail="Token budget exceeded. Upgrade your plan for more analysis."
+        )
+    
+    get_cpu_pool().ensure_capacity()
+    set_llm_user(current_user.id)
+    
+    labels = list(string.ascii_uppercase[:len(uploads)])
     temp_files = []
     
     try:
-        for file in [creative_a, creative_b]:
-            file_ext = file.filename.split(".")[-1] if file.filename else "jpg"
-            temp_path = os.path.join(tempfile.gettempdir(), f"compare_{uuid.uuid4()}.{file_ext}")
-            temp_files.append(temp_path)
-            
-            content = await file.read()
-            with open(temp_path, "wb") as f:
-                f.write(content)
-            
-            orchestrator = AnalysisOrchestrator()
-            result = await orchestrator.analyze_creative(
-                image_path=temp_path,
+        # Stream uploads to disk, keyed by content hash so identical variants
+        # share one analysis
+        label_digest = {}
+        digest_path = {}
+        for label, file in zip(labels, uploads):
+            ingested = await ingest_upload(file)
+            temp_files.append(ingested.path)
+            label_digest[label] = ingested.sha256
+            digest_path.setdefault(ingested.sha256, ingested.path)
+        
+        # Analyses run concurrently, so each is granted at most its worst-case
+        # LLM spend out of the user's remaining budget
+        remaining = current_user.token_budget - current_user.tokens_used
+        grants = {}
+        for digest in digest_path:
+            grants[digest] = max(0, min(VISION_TOKEN_RESERVE + COPY_TOKEN_RESERVE, remaining))
+            remaining -= grants[digest]
+        
+        analyses = await asyncio.gather(*(
+            AnalysisOrchestrator().analyze_creative(
+                image_path=path,
                 category=category,
                 platform=platform,
-                funnel_stage=funnel_stage
+                funnel_stage=funnel_stage,
+                user_token_budget=grants[digest]
             )
-            results.append(result)
+            for digest, path in digest_path.items()
+        ))
+        by_digest = dict(zip(digest_path, analyses))
+        results = {label: by_digest[label_digest[label]] for label in labels}
         
-        # Compare
-        comparison = compare_fn(
-            results[0].get("score", {}),
-            results[1].get("score", {})
-        )
+        current_user.tokens_used += sum(r.get("total_tokens_used", 0) for r in analyses)
+        await db.commit()
         
-        return {
-            "creative_a": results[0],
-            "creative_b": results[1],
-            "comparison": comparison
+        # Rank distinct creatives only; duplicates are listed under the original
+        duplicate_of = {}
+        for i, label in enumerate(labels):
+            duplicate_of[label] = next(
+                (other for other in labels[:i] if label_digest[other] == label_digest[label]), None
+            )
+        distinct = [label for label in labels if duplicate_of[label] is None]
+        
+        ranking = rank_creatives({label: results[label].get("score", {}) for label in distinct})
+        for entry in ranking["ranking"]:
+            entry["duplicates"] = [l for l in labels if duplicate_of[l] == entry["label"]]
+        
+        response = {
+            "variants": [
+                {
+                    "label": label,
+                    "filename": file.filename,
+                    "duplicate_of": duplicate_of[label],
+                    "result": results[label]
+                }
+                for label, file in zip(labels, uploads)
+            ],
+            "ranking": ranking
         }
         
+        if creative_a is not None and creative_b is not None and not variants:
+            # Legacy two-file shape: A vs B as uploaded, even when identical
+            response["creative_a"] = results["A"]
+            response["creative_b"] = results["B"]
+            response["comparison"] = compare_fn(results["A"].get("score", {}), results["B"].get("score", {}))
+        elif len(distinct) > 1:
+            # Head-to-head between the top two distinct variants
+            first, second = ranking["ranking"][0]["label"], ranking["ranking"][1]["label"]
+            comparison = compare_fn(results[first].get("score", {}), results[second].get("score", {}))
+            comparison["labels"] = {"A": first, "B": second}
+            response["comparison"] = comparison
+        else:
+            response["comparison"] = None
+        
+        return convert_numpy_types(response)
+        
     finally:
         for temp_path in temp_files:
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
 
-@router.get("/benchmarks")
-async def get_benchmarks(
+@router.post("/batch", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(
+    files: List[UploadFile] = File(...),
     category: str = "general",
-    platform: str = None,
+    platform: str = "general",
+    funnel_stage: str = "awareness",
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Analyze many creatives in one shared context.
+    
+    Accepts image files and/or zip archives of images. Returns a job id right
+    away; poll GET /analysis/batch/{job_id} (or follow .../events) for progress or stream completed
+    results from GET /analysis/batch/{job_id}/results.
+    """
+    from app.services.batch import BatchTooLarge, batch_manager, extract_zip, is_image_name
+    
+    if current_user.tokens_used >= current_user.token_budget:
+        raise HTTPException(
+            status_code=402,
+            detail="Token budget exceeded. Upgrade your plan for more analysis."
+        )
+    
+    get_cpu_pool().ensure_capacity()
+    set_llm_user(current_user.id)
+    
+    job = batch_manager.create_job(
+        user_id=current_user.id,
+        category=category,
+        platform=platform,
+        funnel_stage=funnel_stage,
+        token_budget=current_user.token_budget - current_user.tokens_used
+    )
+    
+    try:
+        image_limit = max_upload_bytes("image/")
+        total_limit = settings.BATCH_MAX_TOTAL_MB * 1024 * 1024
+        total_bytes = 0
+        for file in files:
+            filename = file.filename or "upload"
+            is_zip = filename.lower().endswith(".zip") or file.content_type in (
+                "application/zip", "application/x-zip-compressed"
+            )
+            if not is_zip and not ((file.content_type or "").startswith("image/") or is_image_name(filename)):
+                raise HTTPException(status_code=400, detail=f"Unsupported file: {filename}")
+            
+            # A zip may hold up to the whole batch's remaining bytes
+            limit = total_limit - total_bytes if is_zip else image_limit
+            ingested = await ingest_upload(file, max_bytes=limit, directory=job.work_dir)
+            
+            if is_zip:
+                members = await asyncio.to_thread(
+                    extract_zip, ingested.path, job.work_dir, image_limit,
+                    settings.BATCH_MAX_ITEMS - len(job.items), total_limit - total_bytes
+                )
+                for member_name, member_path, size in members:
+                    batch_manager.add_item(job, member_name, member_path)
+                    total_bytes += size
+                os.remove(ingested.path)
+            else:
+                batch_manager.add_item(job, filename, ingested.path)
+                total_bytes += ingested.size
+            
+            if len(job.items) > settings.BATCH_MAX_ITEMS:
+                raise BatchTooLarge(settings.BATCH_MAX_ITEMS)
+            if total_bytes > total_limit:
+                raise UploadTooLarge(filename, total_limit)
+    except BatchTooLarge:
+        batch_manager.discard(job)
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} creatives")
+    except Exception as e:
+        batch_manager.discard(job)
+        if isinstance(e, (HTTPException, UploadTooLarge)):
+            raise
+        raise HTTPException(status_code=400, detail=f"Could not read upload: {e}")
+    
+    if not job.items:
+        batch_manager.discard(job)
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    
+    batch_manager.start(job)
+    
+    return {"job_id": job.id, "status": job.status, "total": len(job.items)}
+
+
+@router.get("/batch/{job_id}")
+async def get_batch_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Batch progress, throughput and per-item latency."""
+    from app.services.batch import batch_manager
+    
+    job = batch_manager.get_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    return job.status_dict()
+
+
+@router.get("/batch/{job_id}/results")
+async def stream_batch_results(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream results as newline-delimited JSON, one line per creative in
+    completion order. The stream ends when the batch is finished.
+    """
+    from app.services.batch import batch_manager
+    
+    job = batch_manager.get_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    async def lines():
+        async for item in job.stream_results():
+            payload = {**item.summary(), "result": item.result}
+            yield json.dumps(convert_numpy_types(payload)) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/batch/{job_id}/events")
+async def batch_events(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of batch progress: job status first, then
+    item_started, per-stage and item_completed events, ending with a
+    completed event carrying the job totals.
+    """
+    from app.services.batch import batch_manager
+    
+    job = batch_manager.get_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    async def snapshot():
+        return {"event": "status", **job.progress_dict(), "done": job.done}
+    
+    return StreamingResponse(
+        stream_events(batch_channel(job.id), snapshot),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.post("/rescore", status_code=status.HTTP_202_ACCEPTED)
+async def create_rescore(
+    background_tasks: BackgroundTasks,
+    brand_id: Optional[uuid.UUID] = None,
+    campaign_id: Optional[uuid.UUID] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Rescore every analysed creative of a brand or campaign from stored
+    signals, e.g. after pillar weights or benchmarks changed. No image
+    analysis or LLM calls, so no tokens are charged. Follow progress at
+    GET /analysis/rescore/{job_id} or .../events.
+    """
+    from app.models.models import Brand, Campaign
+    from app.services.rescore import create_rescore_job, enqueue_rescore, job_status
+    
+    if (brand_id is None) == (campaign_id is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of brand_id or campaign_id")
+    
+    if campaign_id:
+        query = select(Campaign.id).join(Brand).where(Campaign.id == campaign_id, Brand.user_id == current_user.id)
+    else:
+        query = select(Brand.id).where(Brand.id == brand_id, Brand.user_id == current_user.id)
+    if await db.scalar(query) is None:
+        raise HTTPException(status_code=404, detail="Campaign not found" if campaign_id else "Brand not found")
+    
+    job = await create_rescore_job(db, current_user.id, brand_id=brand_id, campaign_id=campaign_id)
+    await enqueue_rescore(job, background_tasks)
+    
+    return job_status(job)
+
+
+async def _get_rescore_job(db: AsyncSession, job_id: uuid.UUID, user: User):
+    from app.models.models import RescoreJob
+    
+    job = await db.get(RescoreJob, job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Rescore job not found")
+    return job
+
+
+@router.get("/rescore/{job_id}")
+async def get_rescore_status(
+    job_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Rescore job progress and throughput."""
+    from app.services.rescore import job_status
+    
+    return job_status(await _get_rescore_job(db, job_id, current_user))
+
+
+@router.post("/rescore/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+async def resume_rescore(
+    job_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get benchmark data for a category/platform."""
-    from app.models.models import Benchmark
+    """Continue a failed or interrupted rescore job from its checkpoint."""
+    from app.services.rescore import enqueue_rescore, is_resumable, job_status
+    
+    job = await _get_rescore_job(db, job_id, current_user)
+    if not is_resumable(job):
+        raise HTTPException(status_code=409, detail=f"Rescore job is {job.status}")
+    
+    job.status = "queued"
+    await db.commit()
+    await enqueue_rescore(job, background_tasks)
+    
+    return job_status(job)
+
+
+@router.get("/rescore/{job_id}/events")
+async def rescore_events(
+    job_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-Sent Events stream of rescore progress: job status first, then a
+    progress event per committed chunk, ending with completed or failed.
+    """
+    from app.models.models import RescoreJob
+    from app.services.rescore import job_status
+    
+    job = await _get_rescore_job(db, job_id, current_user)
+    
+    # The request's session is closed once the response starts streaming
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            current = await session.get(RescoreJob, job.id)
+            return {"event": "status", **job_status(current), "done": current.status in ("completed", "failed")}
+    
+    return StreamingResponse(
+        stream_events(rescore_channel(job.id), snapshot),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Hit/miss counters for the analysis result cache."""
+    from app.services.cache.result_cache import get_result_cache
     
-    query = select(Benchmark).where(Benchmark.category == category)
-    if platform:
-        query = query.where(Benchmark.platform == platform)
+    cache = get_result_cache()
+    if cache is None:
+        return {"backend": "none", "enabled": False}
     
-    result = await db.execute(query)
-    benchmarks = result.scalars().all()
+    return {"enabled": True, **await cache.stats()}
+
+
+@router.get("/cpu-pool/stats")
+async def get_cpu_pool_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Queue depth and throughput counters for the OpenCV/OCR process pool."""
+    return get_cpu_pool().stats()
+
+
+@router.get("/benchmark-index/stats")
+async def get_benchmark_index_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Version and size of this process's benchmark/pillar-weight index."""
+    from app.services.benchmark_index import get_benchmark_index
+    from app.services.benchmark_stats import get_benchmark_aggregator
+    
+    return {
+        "backend": settings.BENCHMARK_INDEX_BACKEND,
+        **get_benchmark_index().stats(),
+        "pending_sketches": get_benchmark_aggregator().pending,
+    }
+
+
+@router.get("/llm-limiter/stats")
+async def get_llm_limiter_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Admission queue and wait times for LLM calls in this process."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **limiter.stats()}
+
+
+@router.get("/benchmarks")
+async def get_benchmarks(
+    category: str = "general",
+    platform: str = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Get benchmark data for a category/platform (served from the in-memory index)."""
+    from app.services.benchmark_index import get_benchmark_index
     
     return {
         "category": category,
         "platform": platform,
         "benchmarks": [
             {
-                "signal_name": b.signal_name,
-                "p25": b.p25,
-                "p50": b.p50,
-                "p75": b.p75,
-                "sample_size": b.sample_size
+                "signal_name": b["signal_name"],
+                "p25": b["p25"],
+                "p50": b["p50"],
+                "p75": b["p75"],
+                "sample_size": b["sample_size"]
             }
-            for b in benchmarks
+            for b in get_benchmark_index().rows(category, platform)
         ]
     }
@@ -1,19 +1,24 @@
 """
 Creatives API Router - Upload, analysis, and management of creative assets.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 import uuid
-import os
-import tempfile
 
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
 from app.core.auth import get_current_user
-from app.models.models import User, Brand, Campaign, Creative, CreativeStatus, MediaType
-from app.models.schemas import CreativeResponse, CreativeDetail
+from app.models.models import User, Brand, Campaign, Creative, CreativeStatus, MediaType, MicroSignal
+from app.models.schemas import CreativeResponse, CreativeDetail, ScorePillarResponse, SimilarCreative
+from app.services.persistence import (
+    save_analysis_rows, load_layer_outputs, can_rescore, load_scoring_context, apply_scores
+)
+from app.services.storage.media_storage import ingest_upload, get_storage
+from app.services.analysis_queue import enqueue_analysis, LANE_INTERACTIVE, LANE_BULK
+from app.services.progress import get_progress_bus, stream_events, creative_channel, SSE_HEADERS
 
 router = APIRouter(prefix="/creatives", tags=["Creatives"])
 
@@ -49,8 +54,8 @@ async def list_creatives(
 @router.post("/upload", response_model=CreativeResponse, status_code=status.HTTP_201_CREATED)
 async def upload_creative(
     campaign_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -74,23 +79,19 @@ async def upload_creative(
     else:
         raise HTTPException(status_code=400, detail="Only image and video files are supported")
     
-    # Save file to temp storage (in production, use S3/MinIO)
-    file_ext = file.filename.split(".")[-1] if file.filename else "jpg"
-    file_id = str(uuid.uuid4())
-    temp_dir = tempfile.gettempdir()
-    file_path = os.path.join(temp_dir, f"creative_{file_id}.{file_ext}")
-    
-    content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # Stream to disk in chunks (size-limited), then hand over to media storage
+    ingested = await ingest_upload(file)
+    media_url = await get_storage().put(
+        ingested.path, f"creatives/{campaign_id}/{uuid.uuid4()}{ingested.extension}"
+    )
     
     # Create creative record
     creative = Creative(
         id=uuid.uuid4(),
         campaign_id=campaign_id,
-        media_url=file_path,  # In production, this would be S3 URL
+        media_url=media_url,
         media_type=media_type,
-        file_size=len(content),
+        file_size=ingested.size,
         status=CreativeStatus.PENDING
     )
     
@@ -98,41 +99,49 @@ async def upload_creative(
     await db.commit()
     await db.refresh(creative)
     
-    # Queue analysis in background (if background_tasks available)
-    if background_tasks:
-        background_tasks.add_task(run_analysis, str(creative.id), file_path, db)
+    # Single uploads take the interactive lane
+    await enqueue_analysis(creative, current_user.tier, LANE_INTERACTIVE, background_tasks)
     
     return CreativeResponse.model_validate(creative)
 
 
-async def run_analysis(creative_id: str, file_path: str, db: AsyncSession):
-    """Background task to run creative analysis."""
-    from app.services.orchestrator import analyze_creative
-    
-    try:
-        # Update status to processing
-        result = await db.execute(select(Creative).where(Creative.id == creative_id))
-        creative = result.scalar_one_or_none()
-        if creative:
-            creative.status = CreativeStatus.PROCESSING
-            await db.commit()
-        
-        # Run analysis
-        analysis_result = await analyze_creative(file_path)
-        
-        # Update creative with results
-        if creative and analysis_result.get("score"):
-            creative.status = CreativeStatus.COMPLETED
-            creative.final_score = analysis_result["score"].get("overall_score")
-            creative.score_confidence = analysis_result["score"].get("confidence_band", [0, 0])[0]
-            creative.funnel_fit_score = analysis_result["score"].get("funnel_fit_score")
-            creative.platform_fit_score = analysis_result["score"].get("platform_fit_score")
-            await db.commit()
-            
-    except Exception as e:
-        if creative:
-            creative.status = CreativeStatus.FAILED
-            await db.commit()
+@router.post("/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def backfill_campaign(
+    campaign_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    include_completed: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue analysis for a campaign's pending and failed creatives (or all of
+    them with include_completed=true) on the bulk lane.
+    """
+    result = await db.execute(
+        select(Campaign).join(Brand).where(
+            Campaign.id == campaign_id,
+            Brand.user_id == current_user.id
+        )
+    )
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    query = select(Creative).where(
+        Creative.campaign_id == campaign_id,
+        Creative.media_type == MediaType.IMAGE
+    )
+    if not include_completed:
+        query = query.where(Creative.status.in_([CreativeStatus.PENDING, CreativeStatus.FAILED]))
+    creatives = (await db.execute(query)).scalars().all()
+    
+    for creative in creatives:
+        creative.status = CreativeStatus.PENDING
+    await db.commit()
+    
+    for creative in creatives:
+        await enqueue_analysis(creative, current_user.tier, LANE_BULK, background_tasks)
+    
+    return {"campaign_id": str(campaign_id), "queued": len(creatives)}
 
 
 @router.get("/{creative_id}", response_model=CreativeDetail)
@@ -157,34 +166,181 @@ async def get_creative(
     if not creative:
         raise HTTPException(status_code=404, detail="Creative not found")
     
-    return CreativeDetail.model_validate(creative)
+    signal_count = await db.scalar(
+        select(func.count()).select_from(MicroSignal).where(MicroSignal.creative_id == creative.id)
+    )
+    
+    detail = CreativeDetail.model_validate(creative)
+    detail.pillars = [ScorePillarResponse.model_validate(p) for p in creative.score_pillars]
+    detail.recommendations = sorted(detail.recommendations, key=lambda r: r.priority)
+    detail.signal_count = signal_count or 0
+    return detail
+
+
+@router.get("/{creative_id}/events")
+async def creative_events(
+    creative_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-Sent Events stream of the creative's analysis progress: its
+    current status first, then queued, processing and per-stage events,
+    ending with a completed or failed event. Replaces polling this
+    creative's detail endpoint.
+    """
+    await _get_owned_creative(db, creative_id, current_user)
+    # The stream can stay open for minutes; don't hold a pooled connection
+    await db.close()
+    
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            current = await session.scalar(select(Creative.status).where(Creative.id == creative_id))
+        return {
+            "event": "status",
+            "status": current.value if current else None,
+            "done": current in (None, CreativeStatus.COMPLETED, CreativeStatus.FAILED),
+        }
+    
+    return StreamingResponse(
+        stream_events(creative_channel(creative_id), snapshot),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @router.post("/{creative_id}/reanalyze", response_model=CreativeResponse)
 async def reanalyze_creative(
     creative_id: uuid.UUID,
     background_tasks: BackgroundTasks,
+    force: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Trigger re-analysis of a creative.
+    
+    When per-layer signals are stored, the creative is rescored in place
+    (no image I/O, no LLM spend). Pass force=true to re-run the full pipeline.
+    """
+    creative = await _get_owned_creative(db, creative_id, current_user)
+    
+    if not force:
+        layers = await load_layer_outputs(db, creative.id)
+        if can_rescore(layers):
+            await _rescore(db, creative, layers)
+            return CreativeResponse.model_validate(creative)
+    
+    creative.status = CreativeStatus.PENDING
+    await db.commit()
+    
+    await enqueue_analysis(creative, current_user.tier, LANE_INTERACTIVE, background_tasks)
+    
+    return CreativeResponse.model_validate(creative)
+
+
+@router.post("/{creative_id}/rescore")
+async def rescore_creative(
+    creative_id: uuid.UUID,
+    category: Optional[str] = None,
+    platform: Optional[str] = None,
+    funnel_stage: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Rescore stored signals, optionally in a different category/platform/funnel
+    context. Only the creative's own context updates its stored scores.
+    """
+    from app.api.analysis import convert_numpy_types
+    
+    creative = await _get_owned_creative(db, creative_id, current_user)
+    
+    layers = await load_layer_outputs(db, creative.id)
+    if not can_rescore(layers):
+        raise HTTPException(
+            status_code=409,
+            detail="No stored signals for this creative. Run a full analysis first."
+        )
+    
+    result = await _rescore(db, creative, layers, category, platform, funnel_stage)
+    result["creative_id"] = str(creative.id)
+    return convert_numpy_types(result)
+
+
+@router.get("/{creative_id}/similar", response_model=List[SimilarCreative])
+async def get_similar_creatives(
+    creative_id: uuid.UUID,
+    k: int = Query(10, ge=1, le=100),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Trigger re-analysis of a creative."""
+    """Your k creatives that look most like this one, most similar first."""
+    from app.services.similarity import find_similar
+    
+    creative = await _get_owned_creative(db, creative_id, current_user)
+    
+    similar = await find_similar(db, creative.id, current_user.id, k)
+    if similar is None:
+        raise HTTPException(
+            status_code=409,
+            detail="No embedding for this creative yet. Analyze it first."
+        )
+    
+    return [
+        SimilarCreative(**CreativeResponse.model_validate(c).model_dump(), similarity=round(score, 4))
+        for c, score in similar
+    ]
+
+
+async def _get_owned_creative(db: AsyncSession, creative_id: uuid.UUID, user: User) -> Creative:
+    """Load a creative owned by the user or raise 404."""
     result = await db.execute(
         select(Creative)
         .join(Campaign)
         .join(Brand)
-        .where(Creative.id == creative_id, Brand.user_id == current_user.id)
+        .where(Creative.id == creative_id, Brand.user_id == user.id)
     )
     creative = result.scalar_one_or_none()
     
     if not creative:
         raise HTTPException(status_code=404, detail="Creative not found")
     
-    creative.status = CreativeStatus.PENDING
-    await db.commit()
+    return creative
+
+
+async def _rescore(
+    db: AsyncSession,
+    creative: Creative,
+    layers: dict,
+    category: Optional[str] = None,
+    platform: Optional[str] = None,
+    funnel_stage: Optional[str] = None
+) -> dict:
+    """Rescore stored layers; persist scores when run in the creative's own context."""
+    from app.services.orchestrator import AnalysisOrchestrator
     
-    background_tasks.add_task(run_analysis, str(creative.id), creative.media_url, db)
+    own_context = await load_scoring_context(db, creative)
+    context = (
+        category or own_context[0],
+        platform or own_context[1],
+        funnel_stage or own_context[2]
+    )
     
-    return CreativeResponse.model_validate(creative)
+    result = await AnalysisOrchestrator().rescore(layers, *context)
+    
+    if context == own_context:
+        apply_scores(creative, result)
+        if creative.status == CreativeStatus.COMPLETED:
+            await save_analysis_rows(db, creative.id, result, include_signals=False)
+        await db.commit()
+        await get_progress_bus().publish(creative_channel(creative.id), {
+            "event": "completed",
+            "overall_score": creative.final_score,
+            "rescored": True
+        })
+    
+    return result
 
 
 @router.delete("/{creative_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -205,9 +361,9 @@ async def delete_creative(
     if not creative:
         raise HTTPException(status_code=404, detail="Creative not found")
     
-    # Delete file if exists
-    if creative.media_url and os.path.exists(creative.media_url):
-        os.remove(creative.media_url)
+    # Delete stored media
+    if creative.media_url:
+        await get_storage().delete(creative.media_url)
     
     await db.delete(creative)
     await db.commit()
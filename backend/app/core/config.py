@@ -29,8 +29,26 @@ class Settings(BaseSettings):
     OPENAI_MODEL_TEXT: str = "gpt-4-turbo-preview"
     OPENAI_MAX_TOKENS_VISION: int = 2000
     OPENAI_MAX_TOKENS_TEXT: int = 3000
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. a local mock server
+    OPENAI_HTTP2: bool = True
+    OPENAI_MAX_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_SECONDS: float = 60.0
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    # Shared LLM rate limit: local (per process), redis (all processes) or none
+    LLM_RATE_LIMIT_BACKEND: str = "local"
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 300000
+    # Vision micro-batching: images per request (1 = off) and collection window
+    VISION_BATCH_MAX_IMAGES: int = 1
+    VISION_BATCH_WINDOW_MS: int = 50
+    # Send each image at the cheapest tier keeping this share of detail (SSIM)
+    VISION_ADAPTIVE_PAYLOAD: bool = True
+    VISION_DETAIL_TOLERANCE: float = 0.95
     
-    # Storage
+    # Storage (local or s3; s3 uses the S3_* / AWS_* settings below)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_DIR: Optional[str] = None  # defaults to <tmp>/creative_intel_media
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
     S3_BUCKET: str = "creative-intel-media"
     S3_ENDPOINT: Optional[str] = None
     AWS_ACCESS_KEY_ID: Optional[str] = None
@@ -41,6 +59,80 @@ class Settings(BaseSettings):
     MAX_VIDEO_SIZE_MB: int = 100
     ANALYSIS_RESOLUTION: tuple = (1024, 1024)
     
+    # Pipeline
+    # Copy analysis waits for Vision so it can use the visual summary; set false
+    # to start it as soon as OCR text is ready (lower latency, copy judged
+    # without the visual context).
+    PIPELINE_COPY_AWAITS_VISION: bool = True
+    
+    # Analysis result cache (disk, redis or none)
+    RESULT_CACHE_BACKEND: str = "disk"
+    RESULT_CACHE_DIR: Optional[str] = None  # defaults to <tmp>/creative_intel_cache
+    RESULT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+    
+    # CPU pool for OpenCV/OCR stages (0 = thread pool, e.g. for local dev)
+    CPU_POOL_WORKERS: int = 4
+    CPU_POOL_MAX_QUEUE: int = 32  # queued jobs before new analyses get 503
+    
+    # OCR: tesserocr (warm in-process Tesseract handles), pytesseract (a
+    # tesseract process per call) or auto (tesserocr when installed)
+    OCR_ENGINE: str = "auto"
+    OCR_LANG: str = "eng"
+    OCR_ENGINE_POOL_SIZE: int = 2  # Tesseract handles per process
+    # Read only candidate text regions, unless they cover more than this share
+    OCR_TEXT_REGIONS: bool = True
+    OCR_REGION_MAX_COVERAGE: float = 0.5
+    
+    # Analysis queue: inline (in-process, no Redis) or celery (interactive/bulk queues)
+    ANALYSIS_QUEUE_BACKEND: str = "inline"
+    # A creative's queued task dedupes new requests for at most this long; once
+    # running, for its time limit
+    ANALYSIS_TASK_KEY_TTL_SECONDS: int = 3600
+    # Progress events behind the SSE endpoints: local (in-process) or redis
+    # (pub/sub, needed when Celery workers run the analyses)
+    PROGRESS_BACKEND: str = "local"
+    PROGRESS_HEARTBEAT_SECONDS: float = 15.0  # keepalive; also re-checks status
+    # Provisional "score" events (deterministic layers, then + Vision) before the final score
+    PROGRESS_PROVISIONAL_SCORES: bool = True
+    
+    # Benchmark/pillar-weight index: local (periodic reload) or redis (reload on
+    # change notifications from any process, plus the periodic reload)
+    BENCHMARK_INDEX_BACKEND: str = "local"
+    BENCHMARK_INDEX_REFRESH_SECONDS: float = 300.0
+    # Benchmark statistics from completed analyses (t-digest per context and signal)
+    BENCHMARK_AGGREGATION: bool = True
+    BENCHMARK_FLUSH_SECONDS: float = 60.0
+    BENCHMARK_MIN_SAMPLES: int = 30  # a context's Benchmark row is published from this many
+    # A published row is rewritten once its sample grew by this share; each
+    # rewrite invalidates cached results in that context
+    BENCHMARK_REPUBLISH_GROWTH: float = 0.1
+    BENCHMARK_SKETCH_COMPRESSION: int = 200
+    BENCHMARK_REBUILD_PARTITIONS: int = 4  # rebuild tasks, one per signal-name partition
+    
+    # Similarity search: pgvector (PostgreSQL), local (in-process IVF index
+    # memory-mapped from SIMILARITY_INDEX_DIR) or auto (pgvector on PostgreSQL)
+    SIMILARITY_BACKEND: str = "auto"
+    SIMILARITY_INDEX_DIR: Optional[str] = None  # defaults to <tmp>/creative_intel_similarity
+    SIMILARITY_REFRESH_SECONDS: float = 30.0  # new embeddings are searchable after this
+    SIMILARITY_REBUILD_THRESHOLD: int = 20000  # unindexed embeddings before a rebuild
+    SIMILARITY_NPROBE: int = 16  # IVF lists scanned per query
+    EMBEDDING_OCR_TEXT: bool = True  # include OCR words in embeddings
+    
+    # Compare endpoint
+    COMPARE_MAX_VARIANTS: int = 6
+    
+    # Batch analysis
+    BATCH_MAX_ITEMS: int = 300
+    BATCH_MAX_TOTAL_MB: int = 1024  # all files of one batch upload, zips counted uncompressed
+    BATCH_MAX_CONCURRENT_ITEMS: int = 8  # creatives in flight per batch
+    BATCH_LLM_CONCURRENCY: int = 4  # concurrent LLM calls per batch
+    BATCH_JOB_TTL_SECONDS: int = 3600  # finished jobs are kept this long
+    
+    # Bulk rescore of stored signals
+    RESCORE_CHUNK_SIZE: int = 1000  # creatives per keyset page and commit
+    RESCORE_TASK_SLICE_SECONDS: float = 240.0  # then the Celery task re-queues itself
+    
     # Token Budgets
     TOKEN_BUDGET_FREE: int = 10000
     TOKEN_BUDGET_PRO: int = 100000
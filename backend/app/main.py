@@ -12,6 +12,12 @@ import time
 from app.core.config import settings
 from app.core.database import init_db
 from app.api import auth, brands, campaigns, creatives, analysis
+from app.services.benchmark_index import start_benchmark_index, stop_benchmark_index
+from app.services.benchmark_stats import start_benchmark_aggregation, stop_benchmark_aggregation
+from app.services.similarity import start_similarity_index, stop_similarity_index
+from app.services.cpu_pool import get_cpu_pool, shutdown_cpu_pool, CPUPoolSaturated
+from app.services.storage.media_storage import UploadTooLarge
+from app.services.llm.client import close_llm_client
 
 logger = structlog.get_logger()
 
@@ -21,7 +27,16 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("starting_application", version=settings.APP_VERSION)
     await init_db()
+    await start_benchmark_index()
+    await start_benchmark_aggregation()
+    await start_similarity_index()
+    await get_cpu_pool().start()
     yield
+    await stop_similarity_index()
+    await stop_benchmark_aggregation()
+    await stop_benchmark_index()
+    shutdown_cpu_pool()
+    await close_llm_client()
     logger.info("shutting_down_application")
 
 
@@ -54,6 +69,21 @@ async def add_process_time_header(request: Request, call_next):
     return response
 
 
+# Backpressure: CPU pool backlog is full, ask the client to retry later
+@app.exception_handler(CPUPoolSaturated)
+async def cpu_pool_saturated_handler(request: Request, exc: CPUPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Analysis capacity exhausted, retry later", "queue_depth": exc.queue_depth},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
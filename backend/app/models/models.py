@@ -6,9 +6,10 @@ from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
     Column, String, Integer, Float, Boolean, DateTime, Text, 
-    ForeignKey, JSON, Index, Enum as SQLEnum, TypeDecorator
+    ForeignKey, JSON, Index, LargeBinary, Enum as SQLEnum, TypeDecorator
 )
 from sqlalchemy.orm import relationship
+import numpy as np
 import uuid
 import enum
 
@@ -46,6 +47,37 @@ class GUID(TypeDecorator):
         return value
 
 
+class EmbeddingVector(TypeDecorator):
+    """float32 vector: pgvector's vector(dim) on PostgreSQL, packed little-endian bytes elsewhere."""
+    impl = LargeBinary
+    cache_ok = True
+    
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            from pgvector.sqlalchemy import Vector
+            return dialect.type_descriptor(Vector(self.dim))
+        return dialect.type_descriptor(LargeBinary())
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        vector = np.asarray(value, dtype="<f4")
+        if dialect.name == 'postgresql':
+            return vector
+        return vector.tobytes()
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        if dialect.name == 'postgresql':
+            return np.asarray(value, dtype=np.float32)
+        return np.frombuffer(value, dtype="<f4")
+
+
 # ============== ENUMS ==============
 
 class UserTier(str, enum.Enum):
@@ -318,6 +350,24 @@ class Benchmark(Base):
     )
 
 
+class BenchmarkSketch(Base):
+    """Mergeable quantile sketch (t-digest) a Benchmark row's statistics come from."""
+    __tablename__ = "benchmark_sketches"
+    
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    category = Column(String(100), nullable=False)
+    platform = Column(String(50))
+    funnel_stage = Column(String(50))
+    signal_name = Column(String(100), nullable=False)
+    digest = Column(JSON, nullable=False)  # TDigest.to_dict()
+    sample_size = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_sketches_lookup", "category", "platform", "funnel_stage", "signal_name", unique=True),
+    )
+
+
 # ============== PILLAR WEIGHT ==============
 
 class PillarWeight(Base):
@@ -339,18 +389,32 @@ class PillarWeight(Base):
 
 # ============== CREATIVE EMBEDDING ==============
 
+# Length of CreativeEmbedding vectors (layout in app.services.embeddings)
+EMBEDDING_DIM = 256
+
+
 class CreativeEmbedding(Base):
-    """Vector embeddings for similarity search (PostgreSQL only with pgvector)."""
+    """Vector embeddings for similarity search (pgvector on PostgreSQL, float32 blobs elsewhere)."""
     __tablename__ = "creative_embeddings"
     
     id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     creative_id = Column(GUID(), ForeignKey("creatives.id", ondelete="CASCADE"), nullable=False)
     embedding_type = Column(String(50), nullable=False)  # visual, text, combined
-    embedding_data = Column(Text)  # JSON string for SQLite, use pgvector Vector type in production
-    created_at = Column(DateTime, default=datetime.utcnow)
+    embedding_data = Column(EmbeddingVector(EMBEDDING_DIM), nullable=False)  # unit length
+    embedding_version = Column(String(20))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     creative = relationship("Creative", back_populates="embeddings")
+    
+    __table_args__ = (
+        Index("idx_embeddings_creative_type", "creative_id", "embedding_type", unique=True),
+        Index(
+            "idx_embeddings_hnsw", "embedding_data",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding_data": "vector_cosine_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
 
 # ============== AUDIT LOG ==============
@@ -395,3 +459,29 @@ class CreativeComparison(Base):
     __table_args__ = (
         Index("idx_comparison_creatives", "creative_a_id", "creative_b_id"),
     )
+
+
+# ============== RESCORE JOB ==============
+
+class RescoreJob(Base):
+    """Bulk rescore of a brand's or campaign's stored signals, resumable from its checkpoint."""
+    __tablename__ = "rescore_jobs"
+    
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    user_id = Column(GUID(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    brand_id = Column(GUID(), ForeignKey("brands.id", ondelete="CASCADE"))
+    campaign_id = Column(GUID(), ForeignKey("campaigns.id", ondelete="CASCADE"))
+    status = Column(String(20), default="queued", index=True)  # queued, processing, completed, failed
+    
+    # Checkpoint: creatives are processed in id order, every id up to this one is done
+    last_creative_id = Column(GUID())
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    updated = Column(Integer, default=0)  # creatives whose stored scores changed
+    skipped = Column(Integer, default=0)  # no stored deterministic signals
+    error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
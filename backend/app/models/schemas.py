@@ -145,6 +145,11 @@ class CreativeResponse(BaseModel):
         from_attributes = True
 
 
+class SimilarCreative(CreativeResponse):
+    """A creative in a similarity search result."""
+    similarity: float  # cosine similarity of the embeddings, -1 to 1
+
+
 class CreativeDetail(CreativeResponse):
     """Extended creative response with analysis details."""
     pillars: List["ScorePillarResponse"] = []
@@ -0,0 +1,274 @@
+"""
+Analysis Queue - Scheduling creative analysis outside the request.
+By default (ANALYSIS_QUEUE_BACKEND=inline) analyses run in the API process
+after the response. With the Celery backend, single uploads go to the
+interactive queue and backfills to the bulk queue, so a large backfill never
+sits in front of someone waiting on one upload. Within a queue, paid tiers
+are served first.
+"""
+import asyncio
+import functools
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import structlog
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.models import Brand, Campaign, Creative, CreativeStatus, UserTier
+from app.services.llm.rate_limiter import set_llm_user
+from app.services.progress import get_progress_bus, creative_channel
+
+logger = structlog.get_logger()
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+QUEUES = {
+    LANE_INTERACTIVE: "analysis.interactive",
+    LANE_BULK: "analysis.bulk",
+}
+
+# Redis transport: 0 is served first, 9 last
+TIER_PRIORITY = {
+    UserTier.ENTERPRISE: 0,
+    UserTier.PRO: 3,
+    UserTier.FREE: 6,
+}
+BULK_PRIORITY_OFFSET = 3
+
+TASK_KEY_PREFIX = "analysis:task:"
+
+# Task-key updates that must not race a concurrent request or task; each
+# sets or clears the key only while it still holds the expected task id
+SWAP_TASK_KEY = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+  return 1
+end
+return 0
+"""
+CLAIM_TASK_KEY = """
+local current = redis.call('GET', KEYS[1])
+if not current or current == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+  return 1
+end
+return 0
+"""
+RELEASE_TASK_KEY = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def task_priority(tier: Optional[UserTier], lane: str) -> int:
+    priority = TIER_PRIORITY.get(tier, TIER_PRIORITY[UserTier.FREE])
+    if lane == LANE_BULK:
+        priority += BULK_PRIORITY_OFFSET
+    return min(priority, 9)
+
+
+async def enqueue_analysis(
+    creative: Creative,
+    tier: Optional[UserTier],
+    lane: str = LANE_INTERACTIVE,
+    background_tasks: Optional[BackgroundTasks] = None
+) -> Optional[str]:
+    """
+    Schedule analysis of a stored creative; returns the task id.
+    
+    With ANALYSIS_QUEUE_BACKEND=inline (the default) the analysis runs
+    in-process after the response and no task id is returned. With the
+    Celery backend, enqueueing is idempotent per creative: while a task for
+    it is queued or running, the existing task id is returned and nothing
+    new is sent.
+    """
+    creative_id = str(creative.id)
+    requested_at = datetime.utcnow().isoformat()
+    
+    if settings.ANALYSIS_QUEUE_BACKEND == "inline":
+        if background_tasks is None:
+            raise RuntimeError("Inline analysis queue needs BackgroundTasks")
+        background_tasks.add_task(_run_inline, creative_id, creative.media_url, requested_at)
+        task_id = None
+    else:
+        task_id = await asyncio.to_thread(
+            _send_task, creative_id, creative.media_url, requested_at, lane, task_priority(tier, lane)
+        )
+    
+    await get_progress_bus().publish(
+        creative_channel(creative_id), {"event": "queued", "lane": lane, "task_id": task_id}
+    )
+    return task_id
+
+
+@functools.lru_cache(maxsize=1)
+def _redis():
+    """One client, and so one connection pool, per process for the task keys."""
+    import redis
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+@functools.lru_cache(maxsize=None)
+def _script(source: str):
+    return _redis().register_script(source)
+
+
+def _send_task(creative_id: str, media_url: str, requested_at: str, lane: str, priority: int) -> str:
+    from app.workers.tasks import analyze_creative_task
+    
+    task_id = str(uuid.uuid4())
+    client = _redis()
+    key = TASK_KEY_PREFIX + creative_id
+    ttl = settings.ANALYSIS_TASK_KEY_TTL_SECONDS
+    # Take the key, or replace a finished task's id with a compare-and-swap;
+    # losing either race means another request just queued a task
+    while not client.set(key, task_id, nx=True, ex=ttl):
+        existing = client.get(key)
+        if existing is None:
+            continue
+        if _task_unfinished(existing.decode()):
+            logger.info("analysis_already_queued", creative_id=creative_id, task_id=existing.decode())
+            return existing.decode()
+        if _script(SWAP_TASK_KEY)(keys=[key], args=[existing, task_id, ttl]):
+            break
+    
+    analyze_creative_task.apply_async(
+        args=[creative_id, media_url, requested_at],
+        task_id=task_id,
+        queue=QUEUES[lane],
+        priority=priority,
+    )
+    
+    logger.info("analysis_queued", creative_id=creative_id, task_id=task_id, lane=lane, priority=priority)
+    return task_id
+
+
+def _task_unfinished(task_id: str) -> bool:
+    """
+    Whether a task may still be queued or running. A finished task whose key
+    was never released (its worker died before the cleanup) does not block
+    a new one.
+    """
+    from celery import states
+    from app.workers.tasks import analyze_creative_task
+    
+    return analyze_creative_task.AsyncResult(task_id).state not in states.READY_STATES
+
+
+async def _run_inline(creative_id: str, media_url: str, requested_at: str):
+    # The creative is already marked failed; log it, but don't surface it as a server error
+    try:
+        await run_creative_analysis(creative_id, media_url, requested_at)
+    except Exception:
+        logger.exception("inline_analysis_failed", creative_id=creative_id)
+
+
+def claim_task_key(creative_id: str, task_id: str, ttl_seconds: int):
+    """
+    Re-arm the creative's idempotency key when its task starts, for the
+    task's run time only: a task lost while running then stops blocking new
+    ones soon after its time limit, not after the queueing TTL.
+    """
+    _script(CLAIM_TASK_KEY)(keys=[TASK_KEY_PREFIX + creative_id], args=[task_id, ttl_seconds])
+
+
+def release_task_key(creative_id: str, task_id: str):
+    """Clear the creative's idempotency key once its task is done, unless it was replaced."""
+    _script(RELEASE_TASK_KEY)(keys=[TASK_KEY_PREFIX + creative_id], args=[task_id])
+
+
+async def run_creative_analysis(creative_id: str, media_url: str, requested_at: Optional[str] = None):
+    """
+    Analyze a stored creative and persist the results in its own session.
+    
+    A redelivered task whose creative was already analyzed after
+    `requested_at` is skipped.
+    """
+    from app.core.database import AsyncSessionLocal
+    from app.services.benchmark_stats import get_benchmark_aggregator
+    from app.services.orchestrator import AnalysisOrchestrator
+    from app.services.persistence import (
+        save_layer_outputs, save_analysis_rows, save_embedding, load_scoring_context, apply_scores
+    )
+    from app.services.storage.media_storage import get_storage
+    
+    bus = get_progress_bus()
+    channel = creative_channel(creative_id)
+    
+    async with AsyncSessionLocal() as db:
+        creative = None
+        try:
+            result = await db.execute(select(Creative).where(Creative.id == uuid.UUID(creative_id)))
+            creative = result.scalar_one_or_none()
+            if not creative:
+                logger.error("creative_not_found", creative_id=creative_id)
+                return
+            
+            if (
+                requested_at
+                and creative.status == CreativeStatus.COMPLETED
+                and creative.analyzed_at
+                and creative.analyzed_at >= datetime.fromisoformat(requested_at)
+            ):
+                logger.info("analysis_already_done", creative_id=creative_id)
+                return
+            
+            creative.status = CreativeStatus.PROCESSING
+            await db.commit()
+            await bus.publish(channel, {"event": "processing"})
+            
+            # LLM calls queue fairly under the creative's owner
+            owner_id = await db.scalar(
+                select(Brand.user_id).join(Campaign).where(Campaign.id == creative.campaign_id)
+            )
+            set_llm_user(owner_id)
+            
+            # Run analysis in the creative's brand/campaign context
+            category, platform, funnel_stage = await load_scoring_context(db, creative)
+            async with get_storage().local_copy(media_url) as image_path:
+                orchestrator = AnalysisOrchestrator(
+                    progress=functools.partial(bus.publish, channel),
+                    progressive=settings.PROGRESS_PROVISIONAL_SCORES
+                )
+                analysis_result = await orchestrator.analyze_creative(
+                    image_path, category=category, platform=platform, funnel_stage=funnel_stage
+                )
+            
+            # Keep per-layer signals so context changes can be rescored cheaply
+            await save_layer_outputs(db, creative.id, analysis_result)
+            # Benchmarks sample each creative once, like a full rebuild does
+            first_analysis = creative.analyzed_at is None
+            apply_scores(creative, analysis_result)
+            if creative.status == CreativeStatus.COMPLETED:
+                await save_analysis_rows(db, creative.id, analysis_result)
+                # Similarity search only: a failed write must not cost the analysis
+                try:
+                    async with db.begin_nested():
+                        await save_embedding(db, creative.id, analysis_result.get("layer_outputs"))
+                except Exception as e:
+                    logger.warning("embedding_save_failed", creative_id=creative_id, error=str(e))
+            await db.commit()
+            if creative.status == CreativeStatus.COMPLETED and first_analysis:
+                get_benchmark_aggregator().record((category, platform, funnel_stage), analysis_result)
+            logger.info("creative_analysis_completed", creative_id=creative_id)
+            await bus.publish(channel, {
+                "event": creative.status.value,
+                "overall_score": creative.final_score,
+                "errors": analysis_result.get("errors", []),
+            })
+        
+        except Exception as e:
+            logger.error("creative_analysis_failed", creative_id=creative_id, error=str(e))
+            if creative:
+                # The failed flush leaves the session unusable until rolled back
+                await db.rollback()
+                creative.status = CreativeStatus.FAILED
+                await db.commit()
+                await bus.publish(channel, {"event": "failed", "errors": [str(e)]})
+            raise
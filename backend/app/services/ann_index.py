@@ -0,0 +1,243 @@
+"""
+ANN Index - Inverted-file (IVF) nearest-neighbour search in NumPy.
+Unit vectors are clustered by spherical k-means into about sqrt(n) lists
+and stored grouped by list. A query scores the list centroids, then only
+the vectors of the `nprobe` closest lists, so a search over a million
+vectors reads a few percent of them. The arrays are .npy files opened as
+memory maps: loading is instant, the OS page cache is shared by every
+process on the host, and the index may exceed RAM.
+
+Each vector has an owner; a search can be restricted to one owner, and
+small owners are searched exactly instead of through the lists.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Files of an index directory
+VECTORS, IDS, OWNERS, CENTROIDS, OFFSETS, META = (
+    "vectors.npy", "ids.npy", "owners.npy", "centroids.npy", "offsets.npy", "meta.json"
+)
+
+# Owners with at most this many vectors are searched exhaustively
+EXACT_SEARCH_LIMIT = 20000
+KMEANS_ITERATIONS = 8
+# Vectors per list the k-means sample is drawn for
+KMEANS_SAMPLE_PER_LIST = 40
+# Rows per matrix product when assigning vectors to lists
+ASSIGN_BATCH = 65536
+
+Match = Tuple[uuid.UUID, float]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid (highest dot product) of every vector."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        out[start:start + ASSIGN_BATCH] = np.argmax(vectors[start:start + ASSIGN_BATCH] @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means: centroids are renormalised means of their members."""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _assign(sample, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids[filled] = sums / np.where(norms > 0, norms, 1)
+        # Empty lists restart from random members
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IVFIndex:
+    """An IVF index over unit vectors; immutable once built or loaded."""
+    
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        owners: np.ndarray,
+        owner_keys: List[str],
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        meta: Optional[Dict] = None
+    ):
+        self.vectors = vectors  # (n, dim) float32, grouped by list
+        self.ids = ids  # (n, 16) uint8 UUID bytes
+        self.owners = owners  # (n,) int32 index into owner_keys
+        self.owner_keys = owner_keys
+        self.centroids = centroids  # (nlist, dim) float32
+        self.offsets = offsets  # (nlist + 1,) list boundaries in vectors
+        self.meta = meta or {}
+        self._owner_codes = {key: code for code, key in enumerate(owner_keys)}
+        self._owner_rows: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._sorted_ids: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self.vectors)
+    
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+    
+    # ---- build / persist ----
+    
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        ids: Sequence[uuid.UUID],
+        owners: Sequence[str],
+        nlist: Optional[int] = None,
+        seed: int = 0,
+        meta: Optional[Dict] = None
+    ) -> "IVFIndex":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        nlist = max(1, min(n, nlist or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        
+        sample = vectors
+        if n > nlist * KMEANS_SAMPLE_PER_LIST:
+            sample = vectors[np.sort(rng.choice(n, nlist * KMEANS_SAMPLE_PER_LIST, replace=False))]
+        centroids = _kmeans(sample, nlist, rng) if n else np.zeros((0, vectors.shape[1]), np.float32)
+        
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        
+        owner_keys = sorted(set(owners))
+        codes = {key: code for code, key in enumerate(owner_keys)}
+        owner_codes = np.fromiter((codes[o] for o in owners), dtype=np.int32, count=n)
+        id_bytes = np.frombuffer(b"".join(i.bytes for i in ids), dtype=np.uint8).reshape(n, 16)
+        
+        return cls(
+            vectors[order], id_bytes[order], owner_codes[order], owner_keys,
+            centroids.astype(np.float32), offsets, {**(meta or {}), "built_at": time.time()}
+        )
+    
+    def save(self, directory: str):
+        """Write the index to a new directory (renamed into place when complete)."""
+        tmp = f"{directory}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        try:
+            for name, array in (
+                (VECTORS, self.vectors), (IDS, self.ids), (OWNERS, self.owners),
+                (CENTROIDS, self.centroids), (OFFSETS, self.offsets),
+            ):
+                np.save(os.path.join(tmp, name), array)
+            with open(os.path.join(tmp, META), "w") as f:
+                json.dump({**self.meta, "count": len(self), "owner_keys": self.owner_keys}, f)
+            os.rename(tmp, directory)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    
+    @classmethod
+    def load(cls, directory: str) -> "IVFIndex":
+        """Open a saved index; vectors and ids stay on disk (memory-mapped)."""
+        with open(os.path.join(directory, META)) as f:
+            meta = json.load(f)
+        owner_keys = meta.pop("owner_keys")
+        return cls(
+            np.load(os.path.join(directory, VECTORS), mmap_mode="r"),
+            np.load(os.path.join(directory, IDS), mmap_mode="r"),
+            np.load(os.path.join(directory, OWNERS)),
+            owner_keys,
+            np.load(os.path.join(directory, CENTROIDS)),
+            np.load(os.path.join(directory, OFFSETS)),
+            meta
+        )
+    
+    # ---- search ----
+    
+    def __contains__(self, id: uuid.UUID) -> bool:
+        if self._sorted_ids is None:
+            self._sorted_ids = np.sort(np.ascontiguousarray(self.ids).view("V16").ravel())
+        key = np.void(id.bytes)
+        i = np.searchsorted(self._sorted_ids, key)
+        return i < len(self._sorted_ids) and self._sorted_ids[i] == key
+    
+    def _rows_of(self, code: int) -> np.ndarray:
+        """Positions of an owner's vectors, ascending."""
+        if self._owner_rows is None:
+            order = np.argsort(self.owners, kind="stable")
+            self._owner_rows = (order, self.owners[order])
+        order, sorted_codes = self._owner_rows
+        return order[np.searchsorted(sorted_codes, code, "left"):np.searchsorted(sorted_codes, code, "right")]
+    
+    def search(
+        self, query: np.ndarray, k: int, owner: Optional[str] = None, nprobe: int = 16
+    ) -> List[Match]:
+        """Up to k (id, cosine similarity) pairs, best first."""
+        if not len(self):
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        
+        code = None
+        if owner is not None:
+            code = self._owner_codes.get(owner)
+            if code is None:
+                return []
+            rows = self._rows_of(code)
+            if len(rows) <= EXACT_SEARCH_LIMIT:
+                scores = self.vectors[rows] @ query
+                top = _top_k(scores, k)
+                return self._matches(rows[top], scores[top])
+        
+        lists = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        positions, scores = [], []
+        for l in lists:
+            start, end = int(self.offsets[l]), int(self.offsets[l + 1])
+            if start == end:
+                continue
+            block = self.vectors[start:end] @ query
+            if code is not None:
+                block = np.where(self.owners[start:end] == code, block, -np.inf)
+            top = _top_k(block, k)
+            positions.append(top + start)
+            scores.append(block[top])
+        if not positions:
+            return []
+        positions, scores = np.concatenate(positions), np.concatenate(scores)
+        top = _top_k(scores, k)
+        keep = np.isfinite(scores[top])
+        return self._matches(positions[top][keep], scores[top][keep])
+    
+    def _matches(self, positions: np.ndarray, scores: np.ndarray) -> List[Match]:
+        return [
+            (uuid.UUID(bytes=self.ids[p].tobytes()), float(s))
+            for p, s in zip(positions, scores)
+        ]
+
+
+def exact_search(
+    vectors: np.ndarray, ids: Sequence[uuid.UUID], query: np.ndarray, k: int
+) -> List[Match]:
+    """Brute-force top k over a small in-memory set."""
+    if not len(ids):
+        return []
+    scores = vectors @ np.asarray(query, dtype=np.float32)
+    return [(ids[i], float(scores[i])) for i in _top_k(scores, k)]
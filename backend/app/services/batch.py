@@ -0,0 +1,356 @@
+"""
+Batch Analysis - Fan a campaign's creatives out over a bounded worker pool.
+CPU-bound Layer 1 stages share a process pool, LLM calls share an async
+semaphore, and each creative's result is published as soon as it completes.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.services.progress import get_progress_bus, batch_channel
+from app.services.storage.media_storage import UploadTooLarge
+
+logger = structlog.get_logger()
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def is_image_name(filename: str) -> bool:
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class BatchTooLarge(Exception):
+    """Upload holds more creatives than a batch may; maps to HTTP 413."""
+    
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        super().__init__(f"Batch exceeds {max_items} creatives")
+
+
+def extract_zip(
+    zip_path: str,
+    target_dir: str,
+    max_member_bytes: int,
+    max_members: int,
+    max_total_bytes: int
+) -> List[Tuple[str, str, int]]:
+    """
+    Extract image members of a zip archive.
+    
+    Members are written under generated names, so archive paths can never
+    escape target_dir. Sizes are counted from the bytes actually
+    decompressed, not the archive headers: a member over max_member_bytes
+    or a running total over max_total_bytes raises UploadTooLarge as soon
+    as it is passed. More than max_members images raise BatchTooLarge
+    before anything is written. Returns (original filename, extracted
+    path, size) triples; the caller removes target_dir on failure.
+    """
+    extracted = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            m for m in archive.infolist()
+            if not m.is_dir() and not m.filename.startswith("__MACOSX/") and is_image_name(m.filename)
+        ]
+        if len(members) > max_members:
+            raise BatchTooLarge(max_members)
+        
+        for member in members:
+            name = member.filename
+            if member.file_size > max_member_bytes:
+                raise UploadTooLarge(name, max_member_bytes)
+            
+            ext = os.path.splitext(name)[1].lower()
+            path = os.path.join(target_dir, f"{uuid.uuid4()}{ext}")
+            size = 0
+            with archive.open(member) as src, open(path, "wb") as dst:
+                while chunk := src.read(settings.UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_member_bytes:
+                        raise UploadTooLarge(name, max_member_bytes)
+                    if total + size > max_total_bytes:
+                        raise UploadTooLarge("Batch upload", max_total_bytes)
+                    dst.write(chunk)
+            total += size
+            extracted.append((os.path.basename(name), path, size))
+    
+    return extracted
+
+
+def _percentile(values: List[int], pct: float) -> Optional[int]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@dataclass
+class BatchItem:
+    """One creative within a batch."""
+    index: int
+    filename: str
+    path: str
+    status: str = "queued"  # queued, processing, completed, failed
+    latency_ms: Optional[int] = None
+    tokens_used: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    
+    def summary(self) -> Dict[str, Any]:
+        score = (self.result or {}).get("score", {})
+        return {
+            "index": self.index,
+            "filename": self.filename,
+            "status": self.status,
+            "latency_ms": self.latency_ms,
+            "tokens_used": self.tokens_used,
+            "overall_score": score.get("overall_score"),
+            "error": self.error,
+        }
+
+
+@dataclass
+class BatchJob:
+    """A batch of creatives analysed in one shared context."""
+    id: str
+    user_id: str
+    category: str
+    platform: str
+    funnel_stage: str
+    token_budget: int
+    work_dir: str
+    items: List[BatchItem] = field(default_factory=list)
+    status: str = "queued"  # queued, processing, completed
+    tokens_used: int = 0
+    tokens_reserved: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    completion_order: List[int] = field(default_factory=list)
+    _changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    
+    @property
+    def done(self) -> bool:
+        return self.status == "completed"
+    
+    def status_dict(self) -> Dict[str, Any]:
+        """Job progress with throughput and per-item latency."""
+        finished = [i for i in self.items if i.status in ("completed", "failed")]
+        latencies = [i.latency_ms for i in finished if i.latency_ms is not None]
+        
+        elapsed = None
+        throughput = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0:
+                throughput = round(len(finished) / elapsed * 60, 2)
+        
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "context": {
+                "category": self.category,
+                "platform": self.platform,
+                "funnel_stage": self.funnel_stage,
+            },
+            "total": len(self.items),
+            "completed": sum(1 for i in self.items if i.status == "completed"),
+            "failed": sum(1 for i in self.items if i.status == "failed"),
+            "in_progress": sum(1 for i in self.items if i.status == "processing"),
+            "tokens_used": self.tokens_used,
+            "elapsed_ms": int(elapsed * 1000) if elapsed is not None else None,
+            "throughput_per_minute": throughput,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "max": max(latencies) if latencies else None,
+            },
+            "items": [i.summary() for i in self.items],
+        }
+    
+    def progress_dict(self, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """status_dict() without the per-item list, for progress events."""
+        stats = stats or self.status_dict()
+        return {k: v for k, v in stats.items() if k != "items"}
+    
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+    
+    async def stream_results(self) -> AsyncIterator[BatchItem]:
+        """Yield items in completion order, waiting for new ones until the job ends."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: len(self.completion_order) > sent or self.done
+                )
+                ready = self.completion_order[sent:]
+                finished = self.done
+            
+            for index in ready:
+                yield self.items[index]
+            sent += len(ready)
+            
+            if finished and sent >= len(self.completion_order):
+                return
+
+
+class BatchManager:
+    """
+    In-process registry and runner for batch jobs.
+    
+    Jobs live in memory of the API process that accepted them; finished jobs
+    are dropped after BATCH_JOB_TTL_SECONDS.
+    """
+    
+    def __init__(self):
+        self.jobs: Dict[str, BatchJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    def create_job(
+        self,
+        user_id: str,
+        category: str,
+        platform: str,
+        funnel_stage: str,
+        token_budget: int
+    ) -> BatchJob:
+        self._expire_jobs()
+        job = BatchJob(
+            id=str(uuid.uuid4()),
+            user_id=str(user_id),
+            category=category,
+            platform=platform,
+            funnel_stage=funnel_stage,
+            token_budget=token_budget,
+            work_dir=tempfile.mkdtemp(prefix="batch_"),
+        )
+        self.jobs[job.id] = job
+        return job
+    
+    def get_job(self, job_id: str, user_id: str) -> Optional[BatchJob]:
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != str(user_id):
+            return None
+        return job
+    
+    def discard(self, job: BatchJob):
+        """Drop a job that never started and remove its uploads."""
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.work_dir, ignore_errors=True)
+    
+    def add_item(self, job: BatchJob, filename: str, path: str):
+        job.items.append(BatchItem(index=len(job.items), filename=filename, path=path))
+    
+    def start(self, job: BatchJob):
+        """Run the job in the background on the current event loop."""
+        task = asyncio.create_task(self._run_job(job), name=f"batch:{job.id}")
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+    
+    async def _run_job(self, job: BatchJob):
+        from app.services.orchestrator import (
+            AnalysisOrchestrator, VISION_TOKEN_RESERVE, COPY_TOKEN_RESERVE
+        )
+        
+        job.status = "processing"
+        job.started_at = time.time()
+        logger.info("batch_started", job_id=job.id, items=len(job.items))
+        
+        bus = get_progress_bus()
+        channel = batch_channel(job.id)
+        
+        item_slots = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENT_ITEMS)
+        llm_semaphore = asyncio.Semaphore(settings.BATCH_LLM_CONCURRENCY)
+        
+        async def run_item(item: BatchItem):
+            async with item_slots:
+                item.status = "processing"
+                start = time.perf_counter()
+                await bus.publish(channel, {"event": "item_started", "index": item.index, "filename": item.filename})
+                
+                async def progress(event: Dict[str, Any]):
+                    await bus.publish(channel, {**event, "index": item.index})
+                
+                # Items run concurrently, so each is granted at most its
+                # worst-case LLM spend out of what the batch has left
+                grant = max(0, min(
+                    VISION_TOKEN_RESERVE + COPY_TOKEN_RESERVE,
+                    job.token_budget - job.tokens_used - job.tokens_reserved
+                ))
+                job.tokens_reserved += grant
+                try:
+                    orchestrator = AnalysisOrchestrator(llm_semaphore=llm_semaphore, progress=progress)
+                    result = await orchestrator.analyze_creative(
+                        image_path=item.path,
+                        category=job.category,
+                        platform=job.platform,
+                        funnel_stage=job.funnel_stage,
+                        user_token_budget=grant
+                    )
+                    item.result = result
+                    item.tokens_used = result.get("total_tokens_used", 0)
+                    item.status = "completed" if result.get("status") == "completed" else "failed"
+                    if item.status == "failed":
+                        item.error = "; ".join(result.get("errors", [])) or "analysis failed"
+                except Exception as e:
+                    item.status = "failed"
+                    item.error = str(e)
+                    logger.error("batch_item_failed", job_id=job.id, index=item.index, error=str(e))
+                finally:
+                    item.latency_ms = int((time.perf_counter() - start) * 1000)
+                    job.tokens_reserved -= grant
+                
+                job.tokens_used += item.tokens_used
+                await self._charge_tokens(job.user_id, item.tokens_used)
+                job.completion_order.append(item.index)
+                await job._notify()
+                await bus.publish(channel, {"event": "item_completed", **item.summary()})
+        
+        try:
+            await asyncio.gather(*(run_item(item) for item in job.items))
+        finally:
+            job.status = "completed"
+            job.finished_at = time.time()
+            await job._notify()
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+            
+            stats = job.status_dict()
+            await bus.publish(channel, {"event": "completed", **job.progress_dict(stats)})
+            logger.info("batch_complete",
+                       job_id=job.id,
+                       completed=stats["completed"],
+                       failed=stats["failed"],
+                       throughput_per_minute=stats["throughput_per_minute"],
+                       p95_ms=stats["latency_ms"]["p95"])
+    
+    async def _charge_tokens(self, user_id: str, tokens: int):
+        """Add an item's spend to the user as soon as it completes."""
+        from app.services.persistence import charge_tokens
+        
+        try:
+            await charge_tokens(uuid.UUID(user_id), tokens)
+        except Exception as e:
+            logger.error("batch_token_charge_failed", user_id=user_id, tokens=tokens, error=str(e))
+    
+    def _expire_jobs(self):
+        cutoff = time.time() - settings.BATCH_JOB_TTL_SECONDS
+        for job_id in [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at and job.finished_at < cutoff
+        ]:
+            del self.jobs[job_id]
+
+
+batch_manager = BatchManager()
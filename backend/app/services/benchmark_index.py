@@ -0,0 +1,267 @@
+"""
+Benchmark Index - Benchmark and pillar-weight tables held in memory.
+Each process loads the Benchmark and PillarWeight tables once into an
+immutable index and swaps in a fresh one when they change (a Redis pub/sub
+notification, or a periodic reload). Scoring resolves its (category,
+platform, funnel_stage) context against the current index with dict
+lookups only, never a database round trip.
+
+Resolution falls back from the exact context to any funnel stage, any
+platform, then both, first for the creative's category, then "general",
+then rows without a category. Benchmark rows named "pillar:<pillar>" hold
+that pillar's score distribution; PillarWeight rows replace a pillar's
+share before the weights are normalised. Benchmark rows are maintained by
+app.services.benchmark_stats.
+"""
+import asyncio
+import contextlib
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.services.scoring.three_layer_engine import pillar_weights
+
+logger = structlog.get_logger()
+
+# Published (by any process) after Benchmark or PillarWeight rows change
+CHANGE_CHANNEL = "benchmarks:changed"
+
+STAT_FIELDS = ("p25", "p50", "p75", "p90", "mean", "std_dev", "sample_size")
+
+Context = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+def _fallbacks(category: str, platform: str, funnel_stage: str) -> Iterator[Context]:
+    """Contexts to look in, most specific first."""
+    seen = set()
+    for c in (category, "general", None):
+        for p, f in ((platform, funnel_stage), (platform, None), (None, funnel_stage), (None, None)):
+            if (c, p, f) not in seen:
+                seen.add((c, p, f))
+                yield c, p, f
+
+
+@dataclass(frozen=True)
+class ScoringReference:
+    """What scoring needs from the reference tables in one context."""
+    benchmarks: Dict[str, Dict[str, Any]]  # signal or pillar -> p25 ... sample_size
+    pillar_weights: Dict[str, float]  # normalised
+    version: str  # of this context's benchmarks and weights
+
+
+class BenchmarkIndex:
+    """
+    Immutable snapshot of the Benchmark and PillarWeight tables.
+    
+    Contexts are resolved on first use and memoised; the set of contexts is
+    bounded by the categories, platforms and funnel stages in use.
+    """
+    
+    def __init__(
+        self,
+        benchmarks: Dict[Context, Dict[str, Dict[str, Any]]],
+        weights: Dict[Context, Dict[str, float]],
+        loaded_at: Optional[float] = None
+    ):
+        self._benchmarks = benchmarks
+        self._weights = weights
+        self._resolved: Dict[Tuple[str, str, str], ScoringReference] = {}
+        self.loaded_at = loaded_at
+        
+        digest = hashlib.sha256()
+        for table in (benchmarks, weights):
+            for context in sorted(table, key=repr):
+                digest.update(repr((context, sorted(table[context].items()))).encode())
+        self.version = digest.hexdigest()[:12] if benchmarks or weights else "builtin"
+    
+    @classmethod
+    def empty(cls) -> "BenchmarkIndex":
+        """Nothing loaded: built-in weights and benchmarks only."""
+        return cls({}, {})
+    
+    @classmethod
+    def from_rows(cls, benchmark_rows: Iterable[Any], weight_rows: Iterable[Any]) -> "BenchmarkIndex":
+        benchmarks: Dict[Context, Dict[str, Dict[str, Any]]] = {}
+        for row in benchmark_rows:
+            context = (row.category, row.platform, row.funnel_stage)
+            benchmarks.setdefault(context, {})[row.signal_name] = {
+                field: getattr(row, field) for field in STAT_FIELDS
+            }
+        weights: Dict[Context, Dict[str, float]] = {}
+        for row in weight_rows:
+            context = (row.category, row.platform, row.funnel_stage)
+            weights.setdefault(context, {})[row.pillar_name] = row.weight
+        return cls(benchmarks, weights, loaded_at=time.time())
+    
+    def resolve(self, category: str, platform: str, funnel_stage: str) -> ScoringReference:
+        """Benchmarks and pillar weights for a scoring context."""
+        key = (category, platform, funnel_stage)
+        reference = self._resolved.get(key)
+        if reference is None:
+            reference = self._resolve(*key)
+            self._resolved[key] = reference
+        return reference
+    
+    def _resolve(self, category: str, platform: str, funnel_stage: str) -> ScoringReference:
+        contexts = list(_fallbacks(category, platform, funnel_stage))
+        
+        # Least specific first, so more specific rows overwrite
+        benchmarks: Dict[str, Dict[str, Any]] = {}
+        overrides: Dict[str, float] = {}
+        for context in reversed(contexts):
+            benchmarks.update(self._benchmarks.get(context, {}))
+            overrides.update(self._weights.get(context, {}))
+        
+        weights = pillar_weights(funnel_stage, platform)
+        if overrides:
+            weights.update({pillar: w for pillar, w in overrides.items() if pillar in weights})
+            total = sum(weights.values())
+            weights = {pillar: w / total for pillar, w in weights.items()}
+        
+        # Changes only with what this context scores against, not with every
+        # row of the index
+        if benchmarks or overrides:
+            digest = hashlib.sha256(repr((sorted(benchmarks.items()), sorted(weights.items()))).encode())
+            version = digest.hexdigest()[:12]
+        else:
+            version = "builtin"
+        return ScoringReference(benchmarks=benchmarks, pillar_weights=weights, version=version)
+    
+    def rows(self, category: str, platform: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Stored benchmark rows of a category (and platform), as the benchmarks endpoint lists them."""
+        return [
+            {"platform": p, "funnel_stage": f, "signal_name": name, **stats}
+            for (c, p, f), signals in self._benchmarks.items()
+            if c == category and (platform is None or p == platform)
+            for name, stats in signals.items()
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "benchmark_rows": sum(len(signals) for signals in self._benchmarks.values()),
+            "pillar_weight_rows": sum(len(pillars) for pillars in self._weights.values()),
+            "resolved_contexts": len(self._resolved),
+        }
+
+
+_index = BenchmarkIndex.empty()
+_listener: Optional[asyncio.Task] = None
+
+
+def get_benchmark_index() -> BenchmarkIndex:
+    """The current index; swapped as a whole, so callers holding one see a consistent snapshot."""
+    return _index
+
+
+async def load_benchmark_index() -> BenchmarkIndex:
+    from sqlalchemy import select
+    from app.core.database import AsyncSessionLocal
+    from app.models.models import Benchmark, PillarWeight
+    
+    async with AsyncSessionLocal() as db:
+        benchmark_rows = (await db.execute(select(Benchmark))).scalars().all()
+        weight_rows = (await db.execute(select(PillarWeight))).scalars().all()
+    return BenchmarkIndex.from_rows(benchmark_rows, weight_rows)
+
+
+async def refresh_benchmark_index() -> BenchmarkIndex:
+    """Reload from the database and swap the new index in."""
+    global _index
+    index = await load_benchmark_index()
+    if index.version != _index.version:
+        logger.info("benchmark_index_loaded", **index.stats())
+    _index = index
+    return index
+
+
+async def notify_benchmarks_changed():
+    """
+    Call after writing Benchmark or PillarWeight rows. With the Redis backend
+    every process reloads; otherwise only this one does.
+    """
+    if settings.BENCHMARK_INDEX_BACKEND.lower() != "redis":
+        await refresh_benchmark_index()
+        return
+    
+    import redis.asyncio as aioredis
+    client = aioredis.from_url(settings.REDIS_URL)
+    try:
+        await client.publish(CHANGE_CHANNEL, str(time.time()))
+    finally:
+        await client.aclose()
+
+
+async def start_benchmark_index():
+    """Load the index and keep it current in the background on this event loop."""
+    global _listener
+    
+    backend_name = settings.BENCHMARK_INDEX_BACKEND.lower()
+    if backend_name not in ("local", "redis"):
+        raise ValueError(f"Unknown BENCHMARK_INDEX_BACKEND: {settings.BENCHMARK_INDEX_BACKEND}")
+    
+    try:
+        await refresh_benchmark_index()
+    except Exception as e:
+        # Scoring falls back to the built-in weights until a reload succeeds
+        logger.warning("benchmark_index_load_failed", error=str(e))
+    
+    if _listener is None or _listener.done():
+        follow = _follow_redis if backend_name == "redis" else _follow_local
+        _listener = asyncio.create_task(follow(), name="benchmark-index")
+
+
+async def stop_benchmark_index():
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _listener
+        _listener = None
+
+
+async def _reload_quietly():
+    try:
+        await refresh_benchmark_index()
+    except Exception as e:
+        logger.warning("benchmark_index_load_failed", error=str(e))
+
+
+async def _follow_local():
+    while True:
+        await asyncio.sleep(settings.BENCHMARK_INDEX_REFRESH_SECONDS)
+        await _reload_quietly()
+
+
+async def _follow_redis():
+    """Reload on change notifications, and periodically in case one was missed."""
+    import redis.asyncio as aioredis
+    
+    while True:
+        client = aioredis.from_url(settings.REDIS_URL)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CHANGE_CHANNEL)
+            # Changes made while (re)connecting went unnoticed
+            await _reload_quietly()
+            last_reload = time.monotonic()
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                due = time.monotonic() - last_reload > settings.BENCHMARK_INDEX_REFRESH_SECONDS
+                if (message and message["type"] == "message") or due:
+                    await _reload_quietly()
+                    last_reload = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("benchmark_index_listener_failed", error=str(e))
+            await asyncio.sleep(5.0)
+        finally:
+            with contextlib.suppress(Exception):
+                await pubsub.aclose()
+                await client.aclose()
@@ -0,0 +1,364 @@
+"""
+Benchmark Statistics - Benchmark rows kept current from analysis output.
+A creative's first completed analysis adds its numeric signals (booleans
+on the scoring engine's 0/100 scale) and pillar scores to per-process
+t-digests keyed by (category, platform, funnel_stage, signal_name), for the
+exact context and its rollups to any funnel stage, any platform, or both.
+Reanalyses, forced or not, are not recorded again, so every creative is
+one sample. A periodic flush merges the digests into the stored
+BenchmarkSketch rows, republishes p25-p90, mean, std_dev and sample_size on
+Benchmark once a context has BENCHMARK_MIN_SAMPLES, and notifies the
+benchmark index. No flush scans micro_signals.
+
+A full rebuild recomputes the sketches from stored MicroSignal and
+ScorePillar rows, one sample per creative from its latest analysis. Signal
+names are split into disjoint partitions by hash, and each partition is
+rebuilt by its own Celery task (worker process):
+    enqueue_benchmark_rebuild(partitions=8)
+Samples flushed while a partition rebuilds may be counted twice; a rebuild
+is for backfills and repair, not routine upkeep.
+"""
+import asyncio
+import contextlib
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import select, delete, update, func, null, false
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import (
+    Benchmark, BenchmarkSketch, Brand, Campaign, Creative, CreativeStatus, MicroSignal, ScorePillar
+)
+from app.services.benchmark_index import notify_benchmarks_changed
+from app.services.persistence import micro_signal_rows
+from app.services.quantile_sketch import TDigest
+from app.services.scoring.three_layer_engine import pillar_benchmark_name
+
+logger = structlog.get_logger()
+
+SketchKey = Tuple[str, Optional[str], Optional[str], str]  # category, platform, funnel_stage, signal
+
+# Transaction-level advisory lock (PostgreSQL) held while sketches are written
+BENCHMARK_LOCK_ID = 0x62656e63
+
+# Rows fetched per round trip while rebuilding
+REBUILD_FETCH_SIZE = 20000
+# Names per IN (...) clause
+NAME_CHUNK = 500
+
+
+def rollup_contexts(category: str, platform: str, funnel_stage: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """The contexts a sample counts towards, as the benchmark index falls back through them."""
+    return [
+        (category, platform, funnel_stage),
+        (category, platform, None),
+        (category, None, funnel_stage),
+        (category, None, None),
+    ]
+
+
+def scoring_value(value: float, unit: Optional[str]) -> float:
+    """A stored signal value on the scale scoring compares it at."""
+    return value * 100 if unit == "boolean" else value
+
+
+def analysis_samples(result: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """(benchmark name, value) pairs from an analysis result: numeric signals, then pillar scores."""
+    samples = [
+        (row["signal_name"], scoring_value(row["signal_value"], row["signal_unit"]))
+        for row in micro_signal_rows(None, result.get("signals") or {})
+    ]
+    samples.extend(
+        (pillar_benchmark_name(pillar["name"]), float(pillar["score"]))
+        for pillar in (result.get("score") or {}).get("pillars") or []
+    )
+    return samples
+
+
+def _new_digest() -> TDigest:
+    return TDigest(settings.BENCHMARK_SKETCH_COMPRESSION)
+
+
+def _key(row: Any) -> SketchKey:
+    return row.category, row.platform, row.funnel_stage, row.signal_name
+
+
+def _chunks(items: List[str], size: int = NAME_CHUNK) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def lock_benchmarks(db: AsyncSession):
+    """
+    Serialise writers of BenchmarkSketch and Benchmark rows until the
+    transaction ends. Row locks would not cover rows that do not exist yet,
+    and the unique indexes treat the rollups' NULL platform and funnel stage
+    as distinct, so two processes could each insert the same new sketch.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(BENCHMARK_LOCK_ID)))
+    elif dialect == "sqlite":
+        # A write statement takes SQLite's database write lock up front
+        await db.execute(
+            update(BenchmarkSketch).where(false()).values(sample_size=BenchmarkSketch.sample_size)
+        )
+
+
+async def merge_sketches(db: AsyncSession, sketches: Dict[SketchKey, TDigest]) -> int:
+    """
+    Merge sketches into the stored BenchmarkSketch rows and publish their
+    statistics on Benchmark; returns the Benchmark rows written. Nothing is
+    committed here.
+    
+    A published row is rewritten only once its sample has grown by
+    BENCHMARK_REPUBLISH_GROWTH, so scoring references (and the result cache
+    keyed on them) stay put while a context's statistics barely move.
+    """
+    names = sorted({key[3] for key in sketches})
+    categories = sorted({key[0] for key in sketches})
+    
+    await lock_benchmarks(db)
+    stored: Dict[SketchKey, BenchmarkSketch] = {}
+    published: Dict[SketchKey, Benchmark] = {}
+    for chunk in _chunks(names):
+        sketch_rows = await db.execute(
+            select(BenchmarkSketch)
+            .where(BenchmarkSketch.signal_name.in_(chunk), BenchmarkSketch.category.in_(categories))
+        )
+        stored.update((_key(row), row) for row in sketch_rows.scalars())
+        benchmark_rows = await db.execute(
+            select(Benchmark).where(Benchmark.signal_name.in_(chunk), Benchmark.category.in_(categories))
+        )
+        published.update((_key(row), row) for row in benchmark_rows.scalars())
+    
+    now = datetime.utcnow()
+    written = 0
+    for key, digest in sketches.items():
+        category, platform, funnel_stage, name = key
+        row = stored.get(key)
+        if row is None:
+            row = BenchmarkSketch(category=category, platform=platform, funnel_stage=funnel_stage, signal_name=name)
+            db.add(row)
+            merged = digest
+        else:
+            merged = TDigest.from_dict(row.digest)
+            merged.merge(digest)
+        row.digest = merged.to_dict()
+        row.sample_size = merged.count
+        
+        if merged.count < settings.BENCHMARK_MIN_SAMPLES:
+            continue
+        benchmark = published.get(key)
+        if benchmark is None:
+            benchmark = Benchmark(category=category, platform=platform, funnel_stage=funnel_stage, signal_name=name)
+            db.add(benchmark)
+        elif benchmark.sample_size and merged.count < benchmark.sample_size * (1 + settings.BENCHMARK_REPUBLISH_GROWTH):
+            continue
+        benchmark.p25 = round(merged.quantile(0.25), 4)
+        benchmark.p50 = round(merged.quantile(0.50), 4)
+        benchmark.p75 = round(merged.quantile(0.75), 4)
+        benchmark.p90 = round(merged.quantile(0.90), 4)
+        benchmark.mean = round(merged.mean, 4)
+        benchmark.std_dev = round(merged.std_dev, 4)
+        benchmark.sample_size = merged.count
+        benchmark.updated_at = now
+        written += 1
+    return written
+
+
+class BenchmarkAggregator:
+    """Sketches of the analyses completed in this process since the last flush."""
+    
+    def __init__(self):
+        self._pending: Dict[SketchKey, TDigest] = {}
+    
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+    
+    def record(self, context: Tuple[str, str, str], result: Dict[str, Any]):
+        """Add a completed analysis in its (category, platform, funnel_stage) context."""
+        if not settings.BENCHMARK_AGGREGATION:
+            return
+        samples = analysis_samples(result)
+        for category, platform, funnel_stage in rollup_contexts(*context):
+            for name, value in samples:
+                key = (category, platform, funnel_stage, name)
+                digest = self._pending.get(key)
+                if digest is None:
+                    digest = self._pending[key] = _new_digest()
+                digest.add(value)
+    
+    async def flush(self) -> int:
+        """Merge pending sketches into the database; returns the sketches flushed."""
+        from app.core.database import AsyncSessionLocal
+        
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            async with AsyncSessionLocal() as db:
+                written = await merge_sketches(db, pending)
+                await db.commit()
+        except BaseException:
+            # Keep the samples for the next flush
+            for key, digest in pending.items():
+                if key in self._pending:
+                    digest.merge(self._pending[key])
+                self._pending[key] = digest
+            raise
+        
+        logger.info("benchmark_sketches_flushed", sketches=len(pending), benchmarks=written)
+        if written:
+            await notify_benchmarks_changed()
+        return len(pending)
+
+
+_aggregator = BenchmarkAggregator()
+_flusher: Optional[asyncio.Task] = None
+
+
+def get_benchmark_aggregator() -> BenchmarkAggregator:
+    return _aggregator
+
+
+async def _flush_quietly():
+    try:
+        await _aggregator.flush()
+    except Exception as e:
+        logger.warning("benchmark_flush_failed", error=str(e), pending=_aggregator.pending)
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(settings.BENCHMARK_FLUSH_SECONDS)
+        await _flush_quietly()
+
+
+async def start_benchmark_aggregation():
+    """Flush this process's sketches every BENCHMARK_FLUSH_SECONDS on this event loop."""
+    global _flusher
+    if settings.BENCHMARK_AGGREGATION and (_flusher is None or _flusher.done()):
+        _flusher = asyncio.create_task(_flush_periodically(), name="benchmark-flush")
+
+
+async def stop_benchmark_aggregation():
+    """Stop the periodic flush and flush what is left."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _flusher
+        _flusher = None
+    await _flush_quietly()
+
+
+# ============== FULL REBUILD ==============
+
+def partition_of(name: str, partitions: int) -> int:
+    """Stable partition of a benchmark name (same in every process)."""
+    return zlib.crc32(name.encode()) % partitions
+
+
+async def _stream_into(db: AsyncSession, query, sketches: Dict[SketchKey, TDigest], name_of=None):
+    """Add (name, value, unit, category, platform, funnel_stage) rows to exact-context sketches."""
+    result = await db.stream(query.execution_options(yield_per=REBUILD_FETCH_SIZE))
+    async for rows in result.partitions():
+        values: Dict[SketchKey, List[float]] = defaultdict(list)
+        for name, value, unit, category, platform, funnel_stage in rows:
+            if name_of is not None:
+                name = name_of(name)
+            values[(category, platform, funnel_stage, name)].append(scoring_value(value, unit))
+        for key, batch in values.items():
+            digest = sketches.get(key)
+            if digest is None:
+                digest = sketches[key] = _new_digest()
+            digest.update(batch)
+
+
+async def rebuild_benchmarks(partition: int = 0, partitions: int = 1) -> int:
+    """
+    Recompute the sketches and Benchmark rows of one partition of signal
+    and pillar names from stored analyses; returns the sketches written.
+    """
+    from app.core.database import AsyncSessionLocal
+    
+    context = (
+        func.coalesce(Brand.category, "general"),
+        func.coalesce(Campaign.platform, "general"),
+        func.coalesce(Campaign.funnel_stage, "awareness"),
+    )
+    
+    async with AsyncSessionLocal() as db:
+        signal_names = [
+            name for name in (await db.execute(select(MicroSignal.signal_name).distinct())).scalars()
+            if partition_of(name, partitions) == partition
+        ]
+        pillar_names = [
+            name for name in (await db.execute(select(ScorePillar.pillar_name).distinct())).scalars()
+            if partition_of(pillar_benchmark_name(name), partitions) == partition
+        ]
+        
+        exact: Dict[SketchKey, TDigest] = {}
+        for chunk in _chunks(signal_names):
+            await _stream_into(db, (
+                select(MicroSignal.signal_name, MicroSignal.signal_value, MicroSignal.signal_unit, *context)
+                .join(Creative, Creative.id == MicroSignal.creative_id)
+                .join(Campaign, Campaign.id == Creative.campaign_id)
+                .join(Brand, Brand.id == Campaign.brand_id)
+                .where(MicroSignal.signal_name.in_(chunk), Creative.status == CreativeStatus.COMPLETED)
+            ), exact)
+        for chunk in _chunks(pillar_names):
+            await _stream_into(db, (
+                select(ScorePillar.pillar_name, ScorePillar.score, null(), *context)
+                .join(Creative, Creative.id == ScorePillar.creative_id)
+                .join(Campaign, Campaign.id == Creative.campaign_id)
+                .join(Brand, Brand.id == Campaign.brand_id)
+                .where(ScorePillar.pillar_name.in_(chunk), Creative.status == CreativeStatus.COMPLETED)
+            ), exact, name_of=pillar_benchmark_name)
+        
+        # Rollups are merged from the exact-context sketches, not rescanned
+        sketches: Dict[SketchKey, TDigest] = {}
+        for (category, platform, funnel_stage, name), digest in exact.items():
+            for rollup in rollup_contexts(category, platform, funnel_stage):
+                key = (*rollup, name)
+                if key in sketches:
+                    sketches[key].merge(digest)
+                else:
+                    sketches[key] = TDigest.from_dict(digest.to_dict())
+        
+        names = signal_names + [pillar_benchmark_name(name) for name in pillar_names]
+        await lock_benchmarks(db)
+        for chunk in _chunks(names):
+            await db.execute(delete(BenchmarkSketch).where(BenchmarkSketch.signal_name.in_(chunk)))
+            await db.execute(delete(Benchmark).where(Benchmark.signal_name.in_(chunk)))
+        written = await merge_sketches(db, sketches) if sketches else 0
+        await db.commit()
+    
+    logger.info(
+        "benchmarks_rebuilt", partition=partition, partitions=partitions,
+        names=len(names), sketches=len(sketches), benchmarks=written
+    )
+    await notify_benchmarks_changed()
+    return len(sketches)
+
+
+async def enqueue_benchmark_rebuild(partitions: Optional[int] = None):
+    """
+    Rebuild every partition: one Celery task each, or one after another in
+    this process with the inline analysis queue backend.
+    """
+    partitions = partitions or settings.BENCHMARK_REBUILD_PARTITIONS
+    if settings.ANALYSIS_QUEUE_BACKEND.lower() == "inline":
+        for partition in range(partitions):
+            await rebuild_benchmarks(partition, partitions)
+        return
+    
+    from app.workers.tasks import rebuild_benchmarks_task
+    for partition in range(partitions):
+        rebuild_benchmarks_task.delay(partition, partitions)
@@ -0,0 +1 @@
+"""Cache services package."""
@@ -0,0 +1,298 @@
+"""
+Analysis Result Cache - Content-addressed cache in front of the orchestrator.
+Identical creatives analysed in the same context are served from cache
+instead of re-running OpenCV, OCR and the paid LLM layers.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class ImageFingerprint:
+    """Content identity of a decoded image."""
+    sha256: str  # exact pixels after normalization
+
+
+def fingerprint_pixels(bgr: np.ndarray) -> ImageFingerprint:
+    """
+    Fingerprint decoded pixels independent of container details.
+    
+    OpenCV decodes with EXIF rotation applied, so the same creative
+    re-exported with different metadata maps to the same key.
+    """
+    h, w = bgr.shape[:2]
+    digest = hashlib.sha256()
+    digest.update(f"{w}x{h}".encode())
+    digest.update(np.ascontiguousarray(bgr).data)
+    return ImageFingerprint(sha256=digest.hexdigest())
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize numpy values that leak out of the OpenCV layer."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# ============== BACKENDS ==============
+
+class CacheBackend(ABC):
+    """Storage for serialized analysis results."""
+    
+    name = "base"
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+    
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl_seconds: int):
+        ...
+    
+    async def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    One JSON file per entry on local disk.
+    
+    Expiry is checked on read. Reads refresh the file's mtime. Writes keep an
+    in-memory entry count, and once it exceeds max_entries one directory scan
+    evicts the least recently used files down to EVICT_TO of max_entries, so
+    the scan is paid once per batch of writes rather than on every write.
+    """
+    
+    name = "disk"
+    EVICT_TO = 0.9
+    
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None  # estimate; other processes may share the directory
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+    
+    def _get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                expires_at, payload = f.readline(), f.read()
+        except FileNotFoundError:
+            return None
+        
+        if float(expires_at) < time.time():
+            if self._remove(path):
+                self._adjust_count(-1)
+            return None
+        
+        os.utime(path)  # mark as recently used
+        return payload
+    
+    async def set(self, key: str, value: str, ttl_seconds: int):
+        await asyncio.to_thread(self._set, key, value, ttl_seconds)
+    
+    def _set(self, key: str, value: str, ttl_seconds: int):
+        path = self._path(key)
+        existed = os.path.exists(path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{time.time() + ttl_seconds}\n")
+            f.write(value)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            if self._count is None:
+                self._count = self._scan_count()
+            elif not existed:
+                self._count += 1
+            if self._count <= self.max_entries:
+                return
+            self._evict()
+    
+    def _adjust_count(self, delta: int):
+        with self._lock:
+            if self._count is not None:
+                self._count = max(0, self._count + delta)
+    
+    def _scan_count(self) -> int:
+        return sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json"))
+    
+    def _evict(self):
+        """Remove the least recently used entries down to EVICT_TO; caller holds the lock."""
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        overflow = len(entries) - int(self.max_entries * self.EVICT_TO)
+        removed = 0
+        if overflow > 0:
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            removed = sum(self._remove(entry.path) for entry in entries[:overflow])
+        self._count = len(entries) - removed
+    
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    async def stats(self) -> Dict[str, Any]:
+        count = await asyncio.to_thread(self._scan_count)
+        return {"entries": count, "max_entries": self.max_entries}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis-backed store shared by API and worker processes.
+    
+    Every hit re-arms the TTL, so idle entries age out first; size-based LRU
+    eviction is delegated to Redis (maxmemory-policy allkeys-lru).
+    """
+    
+    name = "redis"
+    COUNTER_KEY = "analysis_cache:counters"
+    
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(url)
+    
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(key)
+        if value is None:
+            await self.client.hincrby(self.COUNTER_KEY, "misses", 1)
+            return None
+        
+        ttl = await self.client.ttl(key)
+        if ttl and ttl > 0:
+            await self.client.expire(key, settings.RESULT_CACHE_TTL_SECONDS)
+        await self.client.hincrby(self.COUNTER_KEY, "hits", 1)
+        return value.decode() if isinstance(value, bytes) else value
+    
+    async def set(self, key: str, value: str, ttl_seconds: int):
+        await self.client.set(key, value, ex=ttl_seconds)
+    
+    async def stats(self) -> Dict[str, Any]:
+        counters = await self.client.hgetall(self.COUNTER_KEY)
+        return {
+            "cluster_hits": int(counters.get(b"hits", 0)),
+            "cluster_misses": int(counters.get(b"misses", 0)),
+        }
+
+
+# ============== CACHE ==============
+
+class ResultCache:
+    """Content-addressed analysis cache with hit/miss accounting."""
+    
+    KEY_PREFIX = "analysis:"
+    
+    def __init__(self, backend: CacheBackend, ttl_seconds: int):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    @staticmethod
+    def make_key(
+        fingerprint: ImageFingerprint,
+        category: str,
+        platform: str,
+        funnel_stage: str,
+        pipeline_version: str
+    ) -> str:
+        """Cache key: image identity + scoring context + pipeline version."""
+        material = "|".join([
+            fingerprint.sha256, category or "", platform or "", funnel_stage or "", pipeline_version
+        ])
+        return ResultCache.KEY_PREFIX + hashlib.sha256(material.encode()).hexdigest()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result; backend failures count as misses."""
+        try:
+            payload = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("result_cache_get_failed", backend=self.backend.name, error=str(e))
+            payload = None
+        
+        if payload is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return json.loads(payload)
+    
+    async def set(self, key: str, result: Dict[str, Any]):
+        """Store a result; failures are logged and never fail the analysis."""
+        try:
+            payload = json.dumps(result, default=_json_default)
+            await self.backend.set(key, payload, self.ttl_seconds)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("result_cache_set_failed", backend=self.backend.name, error=str(e))
+    
+    async def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+        }
+        try:
+            stats.update(await self.backend.stats())
+        except Exception as e:
+            logger.warning("result_cache_stats_failed", backend=self.backend.name, error=str(e))
+        return stats
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide cache built from settings; None when caching is disabled."""
+    global _result_cache
+    
+    backend_name = settings.RESULT_CACHE_BACKEND.lower()
+    if backend_name == "none":
+        return None
+    
+    if _result_cache is None:
+        if backend_name == "redis":
+            backend = RedisCacheBackend(settings.REDIS_URL)
+        elif backend_name == "disk":
+            directory = settings.RESULT_CACHE_DIR or os.path.join(
+                tempfile.gettempdir(), "creative_intel_cache"
+            )
+            backend = DiskCacheBackend(directory, settings.RESULT_CACHE_MAX_ENTRIES)
+        else:
+            raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {settings.RESULT_CACHE_BACKEND}")
+        
+        _result_cache = ResultCache(backend, settings.RESULT_CACHE_TTL_SECONDS)
+    
+    return _result_cache
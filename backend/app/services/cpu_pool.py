@@ -0,0 +1,205 @@
+"""
+CPU Pool - Managed process pool for CPU-bound Layer 1 work (OpenCV, OCR).
+Keeps heavy image processing off the event loop thread, reports queue depth,
+and rejects new analyses with 503 when the backlog is already too deep.
+"""
+import asyncio
+import functools
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable, Optional
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class CPUPoolSaturated(Exception):
+    """Raised when the CPU pool backlog is at its limit; maps to HTTP 503."""
+    
+    def __init__(self, queue_depth: int, retry_after: int):
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        super().__init__(f"CPU pool saturated ({queue_depth} jobs queued)")
+
+
+def warm_worker_imports():
+    """Process initializer: import heavy modules and warm OCR once per worker, not per job."""
+    import cv2  # noqa: F401
+    import numpy  # noqa: F401
+    import app.services.vision.opencv_analyzer  # noqa: F401
+    import app.services.ocr.ocr_service  # noqa: F401
+    from app.services.ocr.engines import get_ocr_engine
+    
+    # Tesseract language data is loaded here, not by the first OCR job
+    try:
+        get_ocr_engine().warm()
+    except Exception as e:
+        logger.warning("ocr_engine_warm_failed", error=str(e))
+
+
+def _noop() -> None:
+    return None
+
+
+def _timed_call(fn: Callable, args: tuple, submitted_at: float):
+    """Runs in the worker; reports how long the job waited in the queue."""
+    started_at = time.time()
+    try:
+        return fn(*args), started_at - submitted_at
+    except Exception as e:
+        # An exception the parent cannot unpickle (e.g. TesseractNotFoundError)
+        # would take down the whole pool, so send those back as RuntimeError
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+        raise
+
+
+class CPUPool:
+    """
+    Process pool sized from CPU_POOL_WORKERS with admission control.
+    
+    Queue depth counts every job submitted and not yet finished. Callers check
+    `ensure_capacity()` before starting new work; jobs belonging to work that
+    was already admitted are always accepted so it can finish.
+    
+    With CPU_POOL_WORKERS=0, or inside a daemonic process (e.g. a Celery
+    prefork child, which cannot spawn children), a thread pool is used instead.
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.kind = "process"
+        self._executor: Optional[Executor] = None
+        
+        self.queue_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0  # caller stopped waiting, e.g. a sibling stage failed
+        self.rejected = 0
+        self._wait_ms_total = 0.0
+        self._run_ms_total = 0.0
+    
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers <= 0 or multiprocessing.current_process().daemon:
+                self.kind = "thread"
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers or None, thread_name_prefix="cpu"
+                )
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_worker_imports,
+                )
+        return self._executor
+    
+    @property
+    def uses_processes(self) -> bool:
+        """True when jobs run in other processes (arguments are pickled)."""
+        return self.executor is not None and self.kind == "process"
+    
+    async def start(self):
+        """Spawn and warm every worker up front so the first requests don't pay for it."""
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        if self.kind == "process":
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, _noop) for _ in range(self.workers)
+            ))
+        logger.info("cpu_pool_started", kind=self.kind, workers=self.workers)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    @property
+    def saturated(self) -> bool:
+        return self.queue_depth >= self.max_queue
+    
+    def ensure_capacity(self):
+        """Admission check for new analyses; raises CPUPoolSaturated when full."""
+        if self.saturated:
+            self.rejected += 1
+            # Rough time to drain the backlog at the observed job rate
+            avg_run_s = (self._run_ms_total / self.completed / 1000) if self.completed else 1.0
+            retry_after = max(1, int(avg_run_s * self.queue_depth / max(self.workers, 1)))
+            logger.warning("cpu_pool_saturated", queue_depth=self.queue_depth, retry_after=retry_after)
+            raise CPUPoolSaturated(self.queue_depth, retry_after)
+    
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) in the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        self.queue_depth += 1
+        self.submitted += 1
+        start = time.perf_counter()
+        try:
+            result, waited_s = await loop.run_in_executor(
+                self.executor, functools.partial(_timed_call, fn, args, time.time())
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool so later jobs can run
+            self.failed += 1
+            logger.error("cpu_pool_broken", kind=self.kind)
+            self.shutdown()
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.queue_depth -= 1
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.completed += 1
+        self._wait_ms_total += waited_s * 1000
+        self._run_ms_total += elapsed_ms - waited_s * 1000
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "saturated": self.saturated,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._wait_ms_total / self.completed, 1) if self.completed else None,
+            "avg_run_ms": round(self._run_ms_total / self.completed, 1) if self.completed else None,
+        }
+
+
+_cpu_pool: Optional[CPUPool] = None
+
+
+def get_cpu_pool() -> CPUPool:
+    """Process-wide CPU pool built from settings."""
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = CPUPool(settings.CPU_POOL_WORKERS, settings.CPU_POOL_MAX_QUEUE)
+    return _cpu_pool
+
+
+def shutdown_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown()
+        _cpu_pool = None
@@ -0,0 +1,83 @@
+"""
+Embeddings - Fixed-length vectors for visual similarity search.
+A creative's embedding concatenates its OpenCV appearance descriptors
+(colour histogram, edge-orientation and saliency layouts, perceptual hash)
+and, optionally, a hashed bag of its OCR words. Each block is scaled to unit
+length and weighted, and the whole vector is normalised, so cosine
+similarity is a dot product. Nothing here needs the image: embeddings are
+built from the layer outputs stored with every analysis.
+"""
+import re
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.models import EMBEDDING_DIM
+
+# Bump when the layout or weights change: searches ignore rows of another
+# version until app.services.similarity.enqueue_embedding_backfill rebuilds them
+EMBEDDING_VERSION = "1"
+EMBEDDING_TYPE = "combined"
+
+# (block, dimensions, weight); dimensions must add up to EMBEDDING_DIM
+BLOCKS = (
+    ("color_histogram", 80, 1.0),
+    ("edge_orientations", 64, 0.8),
+    ("saliency_grid", 16, 0.5),
+    ("phash", 64, 0.7),
+    ("text", 32, 0.5),
+)
+assert sum(dims for _, dims, _ in BLOCKS) == EMBEDDING_DIM
+
+_WORD = re.compile(r"[a-z0-9]{2,}")
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _block(name: str, dims: int, descriptors: Dict[str, Any], text: str) -> np.ndarray:
+    if name == "phash":
+        bits = int(descriptors.get("phash") or "0", 16)
+        return np.array([1.0 if bits >> i & 1 else -1.0 for i in range(dims)])
+    if name == "text":
+        return text_vector(text, dims)
+    
+    # Histograms compare by Hellinger distance: unit-length square roots
+    values = np.asarray(descriptors.get(name) or [], dtype=np.float64)
+    if values.shape != (dims,):
+        return np.zeros(dims)
+    return np.sqrt(np.clip(values, 0, None))
+
+
+def text_vector(text: str, dims: int) -> np.ndarray:
+    """Signed feature hashing of the lower-cased words (zero when there is no text)."""
+    vector = np.zeros(dims)
+    for word in _WORD.findall((text or "").lower()):
+        h = zlib.crc32(word.encode())
+        vector[h % dims] += 1.0 if h >> 31 else -1.0
+    return vector
+
+
+def build_embedding(descriptors: Dict[str, Any], text: str = "") -> np.ndarray:
+    """Unit float32 vector of EMBEDDING_DIM from descriptors and OCR text."""
+    parts = [weight * _unit(_block(name, dims, descriptors, text)) for name, dims, weight in BLOCKS]
+    return _unit(np.concatenate(parts)).astype(np.float32)
+
+
+def embedding_from_layers(layers: Dict[str, Dict[str, Any]]) -> Optional[np.ndarray]:
+    """
+    Embedding from per-layer outputs ({source: {"raw_output": ...}}, as in an
+    analysis result's layer_outputs or load_layer_outputs); None when the
+    OpenCV layer has no descriptors.
+    """
+    descriptors = ((layers.get("opencv") or {}).get("raw_output") or {}).get("descriptors")
+    if not descriptors:
+        return None
+    text = ""
+    if settings.EMBEDDING_OCR_TEXT:
+        text = ((layers.get("ocr") or {}).get("raw_output") or {}).get("full_text") or ""
+    return build_embedding(descriptors, text)
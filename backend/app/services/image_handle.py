@@ -0,0 +1,196 @@
+"""
+Image Handle - One decode per analysis, shared by every stage.
+The orchestrator reads and decodes the creative once; OpenCV, OCR and the
+Vision payload all work from the same read-only BGR buffer and derived
+grayscale, and the original bytes are kept for the LLM. Nothing is written
+to temp files. Across a process pool the buffers travel through shared
+memory instead of being pickled.
+"""
+import io
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import cached_property
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+SUPPORTED_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    arr.flags.writeable = False
+    return arr
+
+
+def fit_to(img: np.ndarray, max_side: int) -> np.ndarray:
+    """Downscale so the longer side is at most `max_side`; never upscales."""
+    h, w = img.shape[:2]
+    if max(h, w) <= max_side:
+        return img
+    ratio = max_side / max(h, w)
+    return cv2.resize(img, (max(1, round(w * ratio)), max(1, round(h * ratio))), interpolation=cv2.INTER_AREA)
+
+
+class ImageHandle:
+    """
+    A decoded creative: BGR pixels (downscaled to the analysis resolution),
+    lazily derived grayscale and edge maps, and the original file bytes.
+    
+    Arrays are read-only; stages that need to modify pixels take a copy.
+    """
+    
+    def __init__(
+        self,
+        bgr: np.ndarray,
+        data: Optional[bytes] = None,
+        format: Optional[str] = None,
+        source_size: Optional[Tuple[int, int]] = None,
+        gray: Optional[np.ndarray] = None,
+        path: Optional[str] = None,
+        fingerprint=None
+    ):
+        self.bgr = _read_only(bgr)
+        self.data = data
+        self.format = format
+        self.path = path
+        # (width, height) of the file before any downscale
+        self.source_size = source_size or (bgr.shape[1], bgr.shape[0])
+        # ImageFingerprint of the full-resolution pixels, when requested
+        self.fingerprint = fingerprint
+        if gray is not None:
+            self.__dict__["gray"] = _read_only(gray)
+        self._shared: Optional[shared_memory.SharedMemory] = None
+    
+    @classmethod
+    def load(cls, path: str, max_side: Optional[int] = None, fingerprint: bool = False) -> "ImageHandle":
+        """
+        Read and decode `path` once. Raises ValueError for missing, invalid
+        or unsupported images. With `fingerprint`, the result cache
+        fingerprint is taken from the full-resolution pixels on the way.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Image not found: {path}")
+        
+        try:
+            # Header only; the pixels are decoded by OpenCV below
+            with Image.open(io.BytesIO(data)) as img:
+                image_format = (img.format or "").upper()
+        except Exception as e:
+            raise ValueError(f"Invalid image: {e}")
+        if image_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Invalid image: Unsupported format: {image_format or 'unknown'}")
+        
+        full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if full is None:
+            raise ValueError(f"Invalid image: could not decode {path}")
+        
+        fp = None
+        if fingerprint:
+            from app.services.cache.result_cache import fingerprint_pixels
+            fp = fingerprint_pixels(full)
+        
+        bgr = fit_to(full, max_side) if max_side else full
+        return cls(
+            bgr,
+            data=data,
+            format=image_format,
+            source_size=(full.shape[1], full.shape[0]),
+            path=path,
+            fingerprint=fp,
+        )
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.bgr.shape[:2]
+    
+    @property
+    def resized(self) -> bool:
+        """True when `bgr` is smaller than the file's own pixels."""
+        return self.source_size != (self.bgr.shape[1], self.bgr.shape[0])
+    
+    @property
+    def media_type(self) -> str:
+        return SUPPORTED_FORMATS.get(self.format, "image/jpeg")
+    
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return _read_only(cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+    
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """Canny edge map, shared by the OpenCV signals and OCR text regions."""
+        return _read_only(cv2.Canny(self.gray, 50, 150))
+    
+    def shared(self) -> "SharedImage":
+        """
+        Copy the pixels (BGR and grayscale) into one shared memory segment,
+        once, and return a picklable reference process-pool workers can map.
+        Released by close().
+        """
+        if self._shared is None:
+            gray = self.gray
+            shm = shared_memory.SharedMemory(create=True, size=self.bgr.nbytes + gray.nbytes)
+            np.ndarray(self.bgr.shape, np.uint8, buffer=shm.buf)[:] = self.bgr
+            np.ndarray(gray.shape, np.uint8, buffer=shm.buf, offset=self.bgr.nbytes)[:] = gray
+            self._shared = shm
+        h, w = self.shape
+        return SharedImage(name=self._shared.name, height=h, width=w)
+    
+    def release(self):
+        """Drop the pixel buffers (views into shared memory must not outlive it)."""
+        self.bgr = None
+        self.__dict__.pop("gray", None)
+        self.__dict__.pop("edges", None)
+    
+    def close(self):
+        """Release the shared memory segment, if one was created."""
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+
+@dataclass(frozen=True)
+class SharedImage:
+    """Reference to an ImageHandle's pixels in shared memory."""
+    name: str
+    height: int
+    width: int
+    
+    @contextmanager
+    def attach(self) -> Iterator[ImageHandle]:
+        """Map the segment read-only as an ImageHandle (no copy) for the duration of the block."""
+        # Spawned pool workers share the parent's resource tracker, so
+        # attaching here does not hand ownership of the segment over
+        shm = shared_memory.SharedMemory(name=self.name)
+        bgr = np.ndarray((self.height, self.width, 3), np.uint8, buffer=shm.buf)
+        gray = np.ndarray((self.height, self.width), np.uint8, buffer=shm.buf, offset=bgr.nbytes)
+        handle = ImageHandle(bgr, gray=gray)
+        del bgr, gray
+        try:
+            yield handle
+        finally:
+            # The mapping can only be closed once no array views remain
+            handle.release()
+            shm.close()
+
+
+ImageSource = Union[str, ImageHandle, SharedImage]
+
+
+@contextmanager
+def open_image(source: ImageSource) -> Iterator[ImageHandle]:
+    """An ImageHandle for a path, an existing handle or a shared-memory reference."""
+    if isinstance(source, SharedImage):
+        with source.attach() as handle:
+            yield handle
+    elif isinstance(source, ImageHandle):
+        yield source
+    else:
+        yield ImageHandle.load(source)
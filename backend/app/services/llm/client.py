@@ -0,0 +1,76 @@
+"""
+Shared LLM Client - Process-wide async OpenAI client.
+One pooled HTTP connection set per event loop, so concurrent analyses reuse
+keep-alive (HTTP/2 when available) connections instead of paying a TLS
+handshake per call, and never block the loop while waiting on the API.
+"""
+import asyncio
+import weakref
+from typing import Optional
+
+import httpx
+import openai
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# httpx clients are bound to the loop they first run on, so one per loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> openai.AsyncOpenAI:
+    http2 = settings.OPENAI_HTTP2 and _http2_available()
+    if settings.OPENAI_HTTP2 and not http2:
+        logger.warning("llm_client_http2_unavailable", hint="install httpx[http2]")
+    
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=10.0),
+    )
+    
+    logger.info("llm_client_created",
+               http2=http2,
+               max_connections=settings.OPENAI_MAX_CONNECTIONS,
+               base_url=settings.OPENAI_BASE_URL or "default")
+    
+    # Retries are handled by the services (tenacity), not stacked here
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+        max_retries=0,
+    )
+
+
+def get_llm_client() -> openai.AsyncOpenAI:
+    """Shared async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _build_client()
+        _clients[loop] = client
+    return client
+
+
+async def close_llm_client():
+    """Close the running loop's client and its pooled connections."""
+    client: Optional[openai.AsyncOpenAI] = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -8,6 +8,9 @@ import structlog
 import json
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.services.llm.client import get_llm_client
+from app.services.llm.rate_limiter import create_chat_completion
+
 logger = structlog.get_logger()
 
 
@@ -54,13 +57,13 @@ Return ONLY valid JSON:
   "improvement_areas": ["list"]
 }}"""
 
-    def __init__(self, api_key: str, model: str = "gpt-4-turbo-preview"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None, model: str = "gpt-4-turbo-preview"):
+        self.client = client or get_llm_client()
         self.model = model
         self.max_tokens = 2500
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def analyze(
+    async def analyze(
         self, 
         ocr_text: str, 
         visual_summary: str = "",
@@ -79,7 +82,8 @@ Return ONLY valid JSON:
             funnel_stage=funnel_stage
         )
         
-        response = self.client.chat.completions.create(
+        response = await create_chat_completion(
+            self.client,
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=self.max_tokens,
@@ -0,0 +1,359 @@
+"""
+LLM Rate Limiter - Token-aware admission control for LLM calls.
+Every chat completion first takes one request and its estimated tokens from
+shared requests/min and tokens/min buckets (Redis-backed across API and
+worker processes). Callers wait their turn, round-robin per user, instead
+of bursting into 429s and retry storms.
+"""
+import asyncio
+import contextvars
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+import openai
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# Fairness key for the calls made in this context (set by the API/worker entry points)
+llm_user: contextvars.ContextVar[str] = contextvars.ContextVar("llm_user", default="anonymous")
+
+# Rough per-image prompt cost: a 1024px image at detail=high is 4 tiles + base
+IMAGE_TOKENS_HIGH = 765
+IMAGE_TOKENS_LOW = 85
+# Longest single sleep before a waiting caller re-checks the bucket
+MAX_POLL_SECONDS = 1.0
+# Fallback pause when a 429 carries no Retry-After
+DEFAULT_429_PAUSE_SECONDS = 5.0
+
+_encoding = None
+_encoding_failed = False
+
+
+def set_llm_user(user_id: Any):
+    """Queue this context's LLM calls under the given user."""
+    llm_user.set(str(user_id))
+
+
+def count_text_tokens(text: str) -> int:
+    """tiktoken count, or ~4 characters per token when the encoding can't be loaded."""
+    global _encoding, _encoding_failed
+    
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The BPE file is downloaded on first use; offline hosts fall back
+            _encoding_failed = True
+            logger.warning("tiktoken_unavailable", error=str(e))
+    
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Prompt tokens for chat messages, counting images at their detail level."""
+    tokens = 3
+    for message in messages:
+        tokens += 4
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += count_text_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += count_text_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                detail = (part.get("image_url") or {}).get("detail", "high")
+                tokens += IMAGE_TOKENS_LOW if detail == "low" else IMAGE_TOKENS_HIGH
+    return tokens
+
+
+# ============== BACKENDS ==============
+
+class BucketBackend(ABC):
+    """Requests/min and tokens/min buckets, refilled continuously."""
+    
+    name = "base"
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+    
+    @abstractmethod
+    async def take(self, requests: int, tokens: int, force: bool = False, pause_seconds: float = 0) -> float:
+        """
+        Take from both buckets; returns 0 when granted, else seconds to wait.
+        
+        force=True always applies (negative amounts refund); pause_seconds
+        blocks every caller for that long (provider 429).
+        """
+        ...
+
+
+class LocalBucketBackend(BucketBackend):
+    """Buckets in process memory; limits apply per process."""
+    
+    name = "local"
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+    
+    async def take(self, requests: int, tokens: int, force: bool = False, pause_seconds: float = 0) -> float:
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        
+        if pause_seconds > 0:
+            self.paused_until = max(self.paused_until, now + pause_seconds)
+        
+        if force:
+            self.requests = min(self.rpm, self.requests - requests)
+            self.tokens = min(self.tpm, self.tokens - tokens)
+            return 0.0
+        
+        if self.paused_until > now:
+            return self.paused_until - now
+        
+        wait = 0.0
+        if self.requests < requests:
+            wait = max(wait, (requests - self.requests) * 60 / self.rpm)
+        if self.tokens < tokens:
+            wait = max(wait, (tokens - self.tokens) * 60 / self.tpm)
+        if wait == 0:
+            self.requests -= requests
+            self.tokens -= tokens
+        return wait
+
+
+class RedisBucketBackend(BucketBackend):
+    """Buckets in one Redis hash, updated atomically, shared by every process."""
+    
+    name = "redis"
+    KEY = "llm_rate_limit:bucket"
+    
+    # Mirrors LocalBucketBackend.take(); Redis server time keeps hosts in step
+    TAKE_SCRIPT = """
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local need_r, need_t = tonumber(ARGV[3]), tonumber(ARGV[4])
+local force, pause = ARGV[5] == '1', tonumber(ARGV[6])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'r', 't', 'ts', 'paused')
+local r = tonumber(b[1]) or rpm
+local tk = tonumber(b[2]) or tpm
+local ts = tonumber(b[3]) or now
+local paused = tonumber(b[4]) or 0
+local dt = math.max(0, now - ts)
+r = math.min(rpm, r + dt * rpm / 60)
+tk = math.min(tpm, tk + dt * tpm / 60)
+if pause > 0 then paused = math.max(paused, now + pause) end
+local wait = 0
+if force then
+  r = math.min(rpm, r - need_r)
+  tk = math.min(tpm, tk - need_t)
+elseif paused > now then
+  wait = paused - now
+else
+  if r < need_r then wait = math.max(wait, (need_r - r) * 60 / rpm) end
+  if tk < need_t then wait = math.max(wait, (need_t - tk) * 60 / tpm) end
+  if wait == 0 then
+    r = r - need_r
+    tk = tk - need_t
+  end
+end
+redis.call('HSET', KEYS[1], 'r', r, 't', tk, 'ts', now, 'paused', paused)
+redis.call('EXPIRE', KEYS[1], 300)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str, requests_per_minute: int, tokens_per_minute: int):
+        super().__init__(requests_per_minute, tokens_per_minute)
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(url)
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+    
+    async def take(self, requests: int, tokens: int, force: bool = False, pause_seconds: float = 0) -> float:
+        wait = await self._take(
+            keys=[self.KEY],
+            args=[self.rpm, self.tpm, requests, tokens, "1" if force else "0", pause_seconds]
+        )
+        return float(wait)
+
+
+# ============== LIMITER ==============
+
+class LLMRateLimiter:
+    """
+    Fair admission queue in front of a bucket backend.
+    
+    Waiting calls are grouped by user and granted round-robin, so one user's
+    burst queues behind everyone else's next call instead of in front of it.
+    Only the head of the rotation polls the bucket; the rest wait in memory.
+    """
+    
+    def __init__(self, backend: BucketBackend):
+        self.backend = backend
+        self._queues: "OrderedDict[str, Deque[tuple[int, asyncio.Future, float]]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._waits_ms: Deque[float] = deque(maxlen=1000)
+        
+        self.granted = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.tokens_estimated = 0
+        self.tokens_used = 0
+    
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+    
+    async def acquire(self, tokens: int, user: Optional[str] = None):
+        """Wait until one request and `tokens` are available for this call."""
+        # A request larger than the whole bucket would never fit
+        tokens = min(tokens, self.backend.tpm)
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user or llm_user.get(), deque()).append((tokens, future, time.perf_counter()))
+        
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+    
+    async def _dispatch(self):
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            tokens, future, enqueued_at = queue[0]
+            
+            if not future.done():
+                try:
+                    wait = await self.backend.take(1, tokens)
+                except Exception as e:
+                    # Limiter outage must not block LLM calls
+                    logger.warning("llm_rate_limiter_backend_failed", error=str(e))
+                    wait = 0
+                if wait > 0:
+                    await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+                    continue
+                
+                waited_ms = (time.perf_counter() - enqueued_at) * 1000
+                self._waits_ms.append(waited_ms)
+                self.granted += 1
+                self.tokens_estimated += tokens
+                if waited_ms >= 1:
+                    self.throttled += 1
+                future.set_result(None)
+            
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+    
+    async def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage is known."""
+        self.tokens_used += actual
+        if actual != estimated:
+            try:
+                await self.backend.take(0, actual - estimated, force=True)
+            except Exception as e:
+                logger.warning("llm_rate_limiter_backend_failed", error=str(e))
+    
+    async def pause(self, seconds: float):
+        """Provider said slow down: hold every caller for `seconds`."""
+        self.rate_limited += 1
+        try:
+            await self.backend.take(0, 0, force=True, pause_seconds=seconds)
+        except Exception as e:
+            logger.warning("llm_rate_limiter_backend_failed", error=str(e))
+    
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        return {
+            "backend": self.backend.name,
+            "requests_per_minute": self.backend.rpm,
+            "tokens_per_minute": self.backend.tpm,
+            "queued": self.queued,
+            "queued_users": len(self._queues),
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "rate_limited_429": self.rate_limited,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits), 1) if waits else None,
+                "p95": round(waits[int(0.95 * (len(waits) - 1))], 1) if waits else None,
+                "max": round(waits[-1], 1) if waits else None,
+            },
+            "tokens_estimated": self.tokens_estimated,
+            "tokens_used": self.tokens_used,
+        }
+
+
+# Futures and the Redis client are loop-bound, so one limiter per event loop
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMRateLimiter]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_rate_limiter() -> Optional[LLMRateLimiter]:
+    """Limiter for the running event loop from settings; None when disabled."""
+    backend_name = settings.LLM_RATE_LIMIT_BACKEND.lower()
+    if backend_name == "none":
+        return None
+    
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        rpm, tpm = settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE
+        if backend_name == "redis":
+            backend = RedisBucketBackend(settings.REDIS_URL, rpm, tpm)
+        elif backend_name == "local":
+            backend = LocalBucketBackend(rpm, tpm)
+        else:
+            raise ValueError(f"Unknown LLM_RATE_LIMIT_BACKEND: {settings.LLM_RATE_LIMIT_BACKEND}")
+        limiter = LLMRateLimiter(backend)
+        _limiters[loop] = limiter
+    return limiter
+
+
+def _retry_after(error: openai.RateLimitError) -> float:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else DEFAULT_429_PAUSE_SECONDS
+    except ValueError:
+        return DEFAULT_429_PAUSE_SECONDS
+
+
+async def create_chat_completion(client: openai.AsyncOpenAI, **kwargs):
+    """client.chat.completions.create() behind the shared rate limiter."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return await client.chat.completions.create(**kwargs)
+    
+    # Providers count max_tokens against the minute budget up front
+    estimated = estimate_prompt_tokens(kwargs["messages"]) + kwargs.get("max_tokens", 0)
+    await limiter.acquire(estimated)
+    
+    try:
+        response = await client.chat.completions.create(**kwargs)
+    except Exception as e:
+        if isinstance(e, openai.RateLimitError):
+            await limiter.pause(_retry_after(e))
+        await limiter.settle(estimated, 0)
+        raise
+    
+    actual = response.usage.total_tokens if response.usage else estimated
+    await limiter.settle(estimated, actual)
+    return response
@@ -0,0 +1,208 @@
+"""
+Vision Batcher - Micro-batching of Vision requests.
+Requests arriving within a short window are sent as one chat completion with
+several images and one JSON object per image, then split back to each caller.
+The instructions and schema are paid for once per batch instead of once per
+creative, and the request rate drops by the batch size. Batches never mix
+users: each holds one LLM user's images and is sent, rate limited and
+charged as that user.
+"""
+import asyncio
+import time
+import weakref
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import structlog
+
+from app.core.config import settings
+from app.services.image_handle import ImageHandle
+from app.services.llm.rate_limiter import create_chat_completion, llm_user
+from app.services.llm.vision_service import OpenAIVisionService
+
+logger = structlog.get_logger()
+
+
+class VisionBatcher:
+    """
+    Collects `analyze()` calls for up to `window_ms` (or until `max_images`
+    are waiting) and dispatches them as one multi-image request, separately
+    for each LLM user (the rate limiter's `llm_user` of the calling context).
+    
+    The batched request is tried once. Images its reply does not cover, and
+    every image of a batch whose request fails, go one by one through the
+    plain service, which does the retrying. With max_images <= 1 every call
+    goes straight to the service.
+    """
+    
+    BATCH_PROMPT = """Analyze each of these {count} advertising creatives for effectiveness.
+The images are numbered image_1 to image_{count} in the order given. Judge each
+one independently.
+
+Return ONLY valid JSON with one key per image ("image_1" ... "image_{count}"),
+each holding this exact structure:
+{schema}
+
+Be precise. Only report what you see with high confidence."""
+
+    def __init__(
+        self,
+        service: Optional[OpenAIVisionService] = None,
+        max_images: int = 4,
+        window_ms: int = 50
+    ):
+        self.service = service or OpenAIVisionService()
+        self.max_images = max_images
+        self.window_s = window_ms / 1000
+        # Per LLM user: waiting (image, future) pairs and their flush timer
+        self._pending: Dict[str, List[Tuple[Union[str, ImageHandle], asyncio.Future]]] = {}
+        self._flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        
+        self.requests = 0
+        self.images = 0
+        self.fallbacks = 0
+        self.tokens_used = 0
+        self._started_at = time.time()
+    
+    async def analyze(self, image: Union[str, ImageHandle]) -> Dict[str, Any]:
+        """Same arguments and result shape as OpenAIVisionService.analyze()."""
+        if self.max_images <= 1:
+            return await self._analyze_single(image)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        user = llm_user.get()
+        pending = self._pending.setdefault(user, [])
+        pending.append((image, future))
+        
+        if len(pending) >= self.max_images:
+            self._flush(user)
+        elif user not in self._flush_handles:
+            self._flush_handles[user] = loop.call_later(self.window_s, self._flush, user)
+        
+        return await future
+    
+    def _flush(self, user: str):
+        handle = self._flush_handles.pop(user, None)
+        if handle is not None:
+            handle.cancel()
+        
+        batch = self._pending.pop(user, [])
+        if batch:
+            task = asyncio.create_task(self._dispatch(user, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, user: str, batch: List[Tuple[Union[str, ImageHandle], asyncio.Future]]):
+        # The task runs in its own context copy: queue and charge the calls to the batch's user
+        llm_user.set(user)
+        
+        # Callers that gave up (cancelled) are dropped before sending
+        batch = [(image, future) for image, future in batch if not future.done()]
+        if not batch:
+            return
+        
+        results: Dict[int, Dict[str, Any]] = {}
+        if len(batch) > 1:
+            try:
+                results = await self._analyze_batch([image for image, _ in batch])
+            except Exception as e:
+                logger.warning("vision_batch_failed", images=len(batch), error=str(e))
+        
+        async def resolve(index: int, image, future: asyncio.Future):
+            try:
+                result = results.get(index)
+                if result is None:
+                    if len(batch) > 1:
+                        self.fallbacks += 1
+                    result = await self._analyze_single(image)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+        
+        await asyncio.gather(*(
+            resolve(index, image, future) for index, (image, future) in enumerate(batch)
+        ))
+    
+    async def _analyze_single(self, image: Union[str, ImageHandle]) -> Dict[str, Any]:
+        result = await self.service.analyze(image)
+        self.requests += 1
+        self.images += 1
+        self.tokens_used += result.get("tokens_used", 0)
+        return result
+    
+    async def _analyze_batch(self, images: List[Union[str, ImageHandle]]) -> Dict[int, Dict[str, Any]]:
+        """One request for several images; returns results by batch index."""
+        count = len(images)
+        payloads = await asyncio.gather(*(self.service.prepare_payload(i) for i in images))
+        prompt = self.BATCH_PROMPT.format(count=count, schema=self.service.VISION_SCHEMA)
+        
+        response = await create_chat_completion(
+            self.service.client,
+            model=self.service.model,
+            messages=[{
+                "role": "user",
+                "content": [{"type": "text", "text": prompt}, *(p.content_part() for p in payloads)]
+            }],
+            max_tokens=self.service.max_tokens * count,
+            temperature=0
+        )
+        
+        content = response.choices[0].message.content
+        tokens_used = response.usage.total_tokens if response.usage else 0
+        replies = self.service.parse_json(content)
+        
+        self.requests += 1
+        self.tokens_used += tokens_used
+        
+        results = {}
+        for index in range(count):
+            perception = replies.get(f"image_{index + 1}")
+            if not isinstance(perception, dict):
+                continue
+            results[index] = {
+                "perception": perception,
+                "signals": self.service._extract_signals(perception),
+                # Shared prompt cost is split evenly across the batch
+                "tokens_used": tokens_used // count + (1 if index < tokens_used % count else 0),
+                "payload": payloads[index].summary(),
+            }
+        self.images += len(results)
+        
+        logger.info("vision_batch_complete", images=count, parsed=len(results), tokens=tokens_used)
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        elapsed_min = max(time.time() - self._started_at, 1e-9) / 60
+        return {
+            "max_images": self.max_images,
+            "window_ms": int(self.window_s * 1000),
+            "images": self.images,
+            "requests": self.requests,
+            "requests_saved": self.images - self.requests,
+            "avg_batch_size": round(self.images / self.requests, 2) if self.requests else None,
+            "fallbacks": self.fallbacks,
+            "tokens_per_image": round(self.tokens_used / self.images, 1) if self.images else None,
+            "requests_per_minute": round(self.requests / elapsed_min, 1),
+        }
+
+
+# Futures and timers are loop-bound, so one batcher per event loop
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, VisionBatcher]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_vision_batcher() -> VisionBatcher:
+    """Shared batcher for the running event loop, configured from settings."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = VisionBatcher(
+            max_images=settings.VISION_BATCH_MAX_IMAGES,
+            window_ms=settings.VISION_BATCH_WINDOW_MS,
+        )
+        _batchers[loop] = batcher
+    return batcher
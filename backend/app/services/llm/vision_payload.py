@@ -0,0 +1,173 @@
+"""
+Vision Payload - Smallest image that keeps the detail Vision needs.
+The image is tried at increasing resolution/detail tiers; each candidate is
+scaled back up and compared with the reference for structural similarity
+(edges, text strokes). The first tier within tolerance is encoded as an
+in-memory JPEG, so flat or simple creatives cost a fraction of the image
+tokens of a full-detail upload.
+"""
+import base64
+import math
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.image_handle import ImageHandle, fit_to
+
+# Reference resolution detail retention is measured against
+REFERENCE_MAX_SIDE = 1024
+JPEG_QUALITY = 85
+
+
+@dataclass(frozen=True)
+class PayloadTier:
+    name: str
+    max_side: int
+    detail: str  # "low" or "high"
+
+
+# Cheapest first
+TIERS: List[PayloadTier] = [
+    PayloadTier("low-512", 512, "low"),
+    PayloadTier("high-768", 768, "high"),
+    PayloadTier("high-1024", 1024, "high"),
+]
+
+
+@dataclass
+class VisionPayload:
+    """Encoded image plus the tier it was sent at."""
+    base64_data: str
+    media_type: str
+    tier: str
+    detail: str
+    width: int
+    height: int
+    size_bytes: int
+    image_tokens: int
+    detail_retention: Optional[float]
+    
+    def content_part(self) -> Dict[str, Any]:
+        """Chat message content part for this image."""
+        return {"type": "image_url", "image_url": {
+            "url": f"data:{self.media_type};base64,{self.base64_data}",
+            "detail": self.detail
+        }}
+    
+    def summary(self) -> Dict[str, Any]:
+        info = asdict(self)
+        del info["base64_data"]
+        return info
+
+
+def image_tokens(width: int, height: int, detail: str) -> int:
+    """Provider-side image token cost (fit in 2048, short side to 768, 512px tiles)."""
+    if detail == "low":
+        return 85
+    
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _blur(img: np.ndarray) -> np.ndarray:
+    return cv2.GaussianBlur(img, (7, 7), 1.5)
+
+
+def detail_retention(reference_gray: np.ndarray, max_side: int) -> float:
+    """
+    Mean SSIM between the reference and its round trip through `max_side`
+    (1.0 = nothing lost).
+    """
+    h, w = reference_gray.shape
+    reduced = fit_to(reference_gray, max_side)
+    if reduced.shape == reference_gray.shape:
+        return 1.0
+    
+    a = reference_gray
+    b = cv2.resize(reduced, (w, h), interpolation=cv2.INTER_LINEAR)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_a, mu_b = _blur(a), _blur(b)
+    mu_ab = mu_a * mu_b
+    mu_a *= mu_a
+    mu_b *= mu_b
+    var_sum = _blur(a * a + b * b) - mu_a - mu_b
+    cov = _blur(a * b) - mu_ab
+    numerator = (2 * mu_ab + c1) * (2 * cov + c2)
+    denominator = (mu_a + mu_b + c1) * (var_sum + c2)
+    return float(np.clip(np.mean(numerator / denominator), 0.0, 1.0))
+
+
+def prepare_vision_payload(image: ImageHandle, tolerance: float) -> VisionPayload:
+    """
+    Encode the image at the cheapest tier whose detail retention is at
+    least `tolerance`; the largest tier is the fallback.
+    """
+    reference = fit_to(image.bgr, REFERENCE_MAX_SIDE)
+    reference_gray = fit_to(image.gray, REFERENCE_MAX_SIDE).astype(np.float32)
+    
+    def tier_tokens(tier: PayloadTier) -> int:
+        h, w = fit_to(reference_gray, tier.max_side).shape
+        return image_tokens(w, h, tier.detail)
+    
+    chosen, retention = TIERS[-1], None
+    full_tokens = tier_tokens(chosen)
+    for tier in TIERS[:-1]:
+        # A smaller tier that costs the same tokens isn't worth any loss
+        if tier_tokens(tier) >= full_tokens:
+            continue
+        retention = detail_retention(reference_gray, tier.max_side)
+        if retention >= tolerance:
+            chosen = tier
+            break
+    else:
+        retention = detail_retention(reference_gray, chosen.max_side)
+    
+    encoded_img = fit_to(reference, chosen.max_side)
+    ok, encoded = cv2.imencode(".jpg", encoded_img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"Could not encode image: {image.path}")
+    
+    h, w = encoded_img.shape[:2]
+    return VisionPayload(
+        base64_data=base64.b64encode(encoded.tobytes()).decode("ascii"),
+        media_type="image/jpeg",
+        tier=chosen.name,
+        detail=chosen.detail,
+        width=w,
+        height=h,
+        size_bytes=len(encoded),
+        image_tokens=image_tokens(w, h, chosen.detail),
+        detail_retention=round(retention, 3) if retention is not None else None,
+    )
+
+
+def original_payload(image: ImageHandle) -> VisionPayload:
+    """
+    The file's own bytes at detail=high (adaptive payloads disabled); an
+    image downscaled to the analysis resolution is sent as that JPEG.
+    """
+    h, w = image.shape
+    if image.data is not None and not image.resized:
+        data, media_type = image.data, image.media_type
+    else:
+        ok, encoded = cv2.imencode(".jpg", image.bgr, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            raise ValueError(f"Could not encode image: {image.path}")
+        data, media_type = encoded.tobytes(), "image/jpeg"
+    
+    return VisionPayload(
+        base64_data=base64.b64encode(data).decode("ascii"),
+        media_type=media_type,
+        tier="original",
+        detail="high",
+        width=w,
+        height=h,
+        size_bytes=len(data),
+        image_tokens=image_tokens(w, h, "high"),
+        detail_retention=None,
+    )
@@ -2,23 +2,28 @@
 OpenAI Vision Service - Mission 6: AI Perception Layer
 Uses GPT-4 Vision to understand visual content.
 """
+import asyncio
 import openai
-import base64
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 import structlog
 import json
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.core.config import settings
+from app.services.llm.client import get_llm_client
+from app.services.llm.rate_limiter import create_chat_completion
+from app.services.image_handle import ImageHandle
+from app.services.llm.vision_payload import (
+    REFERENCE_MAX_SIDE, VisionPayload, prepare_vision_payload, original_payload
+)
+
 logger = structlog.get_logger()
 
 
 class OpenAIVisionService:
     """OpenAI Vision API for creative perception."""
     
-    VISION_PROMPT = """Analyze this advertising creative for effectiveness.
-
-Return ONLY valid JSON with this exact structure:
-{
+    VISION_SCHEMA = """{
   "objects": [{"name": "string", "prominence": 0-100, "position": "string"}],
   "people": {"count": 0, "expressions": ["string"], "demographics": "string"},
   "scene": {"type": "string", "setting": "string", "mood": "string"},
@@ -26,36 +31,33 @@ Return ONLY valid JSON with this exact structure:
   "product": {"visible": true/false, "prominence": 0-100, "clarity": "string"},
   "storytelling": {"narrative_present": true/false, "story_clarity": 0-100},
   "visual_quality": {"professional_grade": 0-100, "issues": ["string"]}
-}
+}"""
+
+    VISION_PROMPT = f"""Analyze this advertising creative for effectiveness.
+
+Return ONLY valid JSON with this exact structure:
+{VISION_SCHEMA}
 
 Be precise. Only report what you see with high confidence."""
 
-    def __init__(self, api_key: str, model: str = "gpt-4-vision-preview"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None, model: str = "gpt-4-vision-preview"):
+        self.client = client or get_llm_client()
         self.model = model
         self.max_tokens = 2000
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def analyze(self, image_path: str) -> Dict[str, Any]:
-        """Analyze image using GPT-4 Vision."""
-        # Encode image to base64
-        with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Determine image type
-        ext = image_path.lower().split('.')[-1]
-        media_type = "image/jpeg" if ext in ["jpg", "jpeg"] else f"image/{ext}"
+    async def analyze(self, image: Union[str, ImageHandle]) -> Dict[str, Any]:
+        """Analyze image (a path or an already decoded ImageHandle) using GPT-4 Vision."""
+        payload = await self.prepare_payload(image)
         
-        response = self.client.chat.completions.create(
+        response = await create_chat_completion(
+            self.client,
             model=self.model,
             messages=[{
                 "role": "user",
                 "content": [
                     {"type": "text", "text": self.VISION_PROMPT},
-                    {"type": "image_url", "image_url": {
-                        "url": f"data:{media_type};base64,{image_data}",
-                        "detail": "high"
-                    }}
+                    payload.content_part()
                 ]
             }],
             max_tokens=self.max_tokens,
@@ -65,23 +67,46 @@ Be precise. Only report what you see with high confidence."""
         # Parse response
         content = response.choices[0].message.content
         tokens_used = response.usage.total_tokens if response.usage else 0
+        perception = self.parse_json(content)
+        
+        # Convert to signals
+        signals = self._extract_signals(perception)
         
+        logger.info("vision_analysis_complete", tokens=tokens_used, tier=payload.tier)
+        return {
+            "perception": perception,
+            "signals": signals,
+            "tokens_used": tokens_used,
+            "payload": payload.summary()
+        }
+    
+    async def prepare_payload(self, image: Union[str, ImageHandle]) -> VisionPayload:
+        """
+        Image as sent to the model: the cheapest resolution/detail tier that
+        keeps VISION_DETAIL_TOLERANCE of the detail, or the original file when
+        adaptive payloads are off. Decode and encode run off the loop.
+        """
+        return await asyncio.to_thread(self._payload, image)
+    
+    @staticmethod
+    def _payload(image: Union[str, ImageHandle]) -> VisionPayload:
+        if isinstance(image, str):
+            image = ImageHandle.load(image, REFERENCE_MAX_SIDE)
+        if settings.VISION_ADAPTIVE_PAYLOAD:
+            return prepare_vision_payload(image, settings.VISION_DETAIL_TOLERANCE)
+        return original_payload(image)
+    
+    @staticmethod
+    def parse_json(content: str) -> Dict[str, Any]:
+        """Extract the JSON object from a model reply."""
         try:
-            # Extract JSON from response
             json_start = content.find('{')
             json_end = content.rfind('}') + 1
             if json_start >= 0 and json_end > json_start:
-                perception = json.loads(content[json_start:json_end])
-            else:
-                perception = {"error": "Could not parse JSON", "raw": content}
+                return json.loads(content[json_start:json_end])
+            return {"error": "Could not parse JSON", "raw": content}
         except json.JSONDecodeError:
-            perception = {"error": "Invalid JSON", "raw": content}
-        
-        # Convert to signals
-        signals = self._extract_signals(perception)
-        
-        logger.info("vision_analysis_complete", tokens=tokens_used)
-        return {"perception": perception, "signals": signals, "tokens_used": tokens_used}
+            return {"error": "Invalid JSON", "raw": content}
     
     def _extract_signals(self, perception: Dict[str, Any]) -> Dict[str, Any]:
         """Convert perception to scored signals."""
@@ -0,0 +1,208 @@
+"""
+OCR Engines - Tesseract behind one interface, kept warm per process.
+The tesserocr engine holds initialised TessBaseAPI handles (language data
+loaded once) in a small per-process pool and recognises text regions in
+place with SetRectangle. The pytesseract engine shells out to a new
+tesseract process per call and is the fallback when tesserocr is not
+installed.
+"""
+import queue
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# (x, y, width, height) in image pixels
+Region = Tuple[int, int, int, int]
+
+# Tesseract page segmentation modes
+PSM_SINGLE_BLOCK = 6
+PSM_SPARSE_TEXT = 11
+
+
+@dataclass
+class OCRWord:
+    text: str
+    confidence: float  # 0-100
+    left: int
+    top: int
+    width: int
+    height: int
+
+
+class OCREngine(ABC):
+    """Recognises words in a binarised grayscale image."""
+    
+    name = "base"
+    
+    @abstractmethod
+    def recognize(self, binary: np.ndarray, regions: Optional[List[Region]] = None) -> List[OCRWord]:
+        """
+        Words in `binary`. With `regions`, only those areas are read;
+        without, the whole image is read as sparse text.
+        """
+    
+    def warm(self):
+        """Load whatever the first call would otherwise pay for."""
+
+
+class PytesseractEngine(OCREngine):
+    """One tesseract process per call; nothing to keep warm."""
+    
+    name = "pytesseract"
+    
+    def __init__(self, lang: str):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+    
+    def recognize(self, binary: np.ndarray, regions: Optional[List[Region]] = None) -> List[OCRWord]:
+        if regions is not None:
+            # Still a single process: everything outside the regions is blanked
+            # out, so tesseract skips background texture instead of reading it
+            masked = np.full_like(binary, 255)
+            for x, y, w, h in regions:
+                masked[y:y + h, x:x + w] = binary[y:y + h, x:x + w]
+            binary = masked
+        
+        data = self._pytesseract.image_to_data(
+            binary,
+            lang=self.lang,
+            output_type=self._pytesseract.Output.DICT,
+            config=f"--psm {PSM_SPARSE_TEXT}"
+        )
+        return [
+            OCRWord(
+                text=data["text"][i],
+                confidence=float(data["conf"][i]),
+                left=data["left"][i],
+                top=data["top"][i],
+                width=data["width"][i],
+                height=data["height"][i],
+            )
+            for i in range(len(data["text"]))
+        ]
+
+
+class TesserocrEngine(OCREngine):
+    """
+    In-process Tesseract through tesserocr.
+    
+    A TessBaseAPI handle is not thread-safe, so each call checks one out of
+    the pool; handles are created on demand up to `pool_size` and then
+    callers wait. Process-pool workers run one job at a time and only ever
+    create one.
+    """
+    
+    name = "tesserocr"
+    
+    def __init__(self, lang: str, pool_size: int):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.pool_size = max(1, pool_size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _new_api(self):
+        api = self._tesserocr.PyTessBaseAPI(lang=self.lang, psm=PSM_SPARSE_TEXT)
+        logger.debug("tesseract_api_created", lang=self.lang, pool_size=self.pool_size)
+        return api
+    
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if not create:
+            return self._idle.get()
+        try:
+            return self._new_api()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+    
+    def warm(self):
+        self._idle.put(self._checkout())
+    
+    def recognize(self, binary: np.ndarray, regions: Optional[List[Region]] = None) -> List[OCRWord]:
+        api = self._checkout()
+        try:
+            image = np.ascontiguousarray(binary)
+            h, w = image.shape
+            api.SetImageBytes(image.tobytes(), w, h, 1, w)
+            if regions is None:
+                api.SetPageSegMode(PSM_SPARSE_TEXT)
+                return self._words(api)
+            
+            api.SetPageSegMode(PSM_SINGLE_BLOCK)
+            words = []
+            for x, y, rw, rh in regions:
+                # Boxes come back in full-image coordinates
+                api.SetRectangle(x, y, rw, rh)
+                words.extend(self._words(api))
+            return words
+        finally:
+            api.Clear()
+            self._idle.put(api)
+    
+    def _words(self, api) -> List[OCRWord]:
+        api.Recognize()
+        level = self._tesserocr.RIL.WORD
+        words = []
+        for word in self._tesserocr.iterate_level(api.GetIterator(), level):
+            box = word.BoundingBox(level)
+            if box is None:
+                continue
+            x1, y1, x2, y2 = box
+            words.append(OCRWord(
+                text=word.GetUTF8Text(level) or "",
+                confidence=word.Confidence(level),
+                left=x1,
+                top=y1,
+                width=x2 - x1,
+                height=y2 - y1,
+            ))
+        return words
+
+
+_engine: Optional[OCREngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> OCREngine:
+    """Process-wide OCR engine from OCR_ENGINE (auto prefers tesserocr when installed)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _build_engine(settings.OCR_ENGINE.lower())
+                logger.info("ocr_engine_ready", engine=_engine.name)
+    return _engine
+
+
+def _build_engine(name: str) -> OCREngine:
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrEngine(settings.OCR_LANG, settings.OCR_ENGINE_POOL_SIZE)
+        except ImportError:
+            if name == "tesserocr":
+                raise
+    elif name != "pytesseract":
+        raise ValueError(f"Unknown OCR_ENGINE: {settings.OCR_ENGINE}")
+    return PytesseractEngine(settings.OCR_LANG)
@@ -1,15 +1,17 @@
 """
 OCR Service - Mission 5: Extract text with bounding boxes.
 """
-import pytesseract
-from PIL import Image
 import cv2
-import numpy as np
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, field
 import re
 import structlog
 
+from app.core.config import settings
+from app.services.image_handle import ImageSource, open_image
+from app.services.ocr.engines import get_ocr_engine
+from app.services.ocr.text_regions import detect_text_regions, region_coverage
+
 logger = structlog.get_logger()
 
 
@@ -37,36 +39,42 @@ class OCRService:
     CTA_PATTERNS = [r'\b(shop|buy|order|get|try|start|join|subscribe|download|learn more)\b']
     PRICE_PATTERNS = [r'₹\s*[\d,]+', r'\$\s*[\d,]+', r'\d+%\s*off']
     
-    def extract(self, image_path: str, brand_names: List[str] = None) -> OCRResult:
-        img_cv = cv2.imread(image_path)
-        if img_cv is None:
-            raise ValueError(f"Could not load image: {image_path}")
-        
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    def extract(self, image: ImageSource, brand_names: List[str] = None) -> OCRResult:
+        with open_image(image) as handle:
+            img_h, img_w = handle.shape
+            binary = cv2.adaptiveThreshold(
+                handle.gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+            )
+            regions = detect_text_regions(handle.edges) if settings.OCR_TEXT_REGIONS else None
         
-        ocr_data = pytesseract.image_to_data(binary, output_type=pytesseract.Output.DICT, config='--psm 11')
+        # Text-heavy creatives are read whole; region-by-region would not save anything
+        if regions and region_coverage(regions, binary.shape) > settings.OCR_REGION_MAX_COVERAGE:
+            regions = None
+        # No candidate region is no proof of no text (low contrast, display
+        # type, text on gradients escape the edge heuristic): read it whole
+        if regions == []:
+            regions = None
+        words = get_ocr_engine().recognize(binary, regions)
         
         text_blocks = []
-        for i in range(len(ocr_data['text'])):
-            text = ocr_data['text'][i].strip()
-            conf = int(ocr_data['conf'][i])
+        for word in words:
+            text = word.text.strip()
+            conf = int(word.confidence)
             if not text or conf < 30:
                 continue
             
             block = TextBlock(
                 text=text,
                 confidence=conf / 100.0,
-                bounding_box={'x': ocr_data['left'][i], 'y': ocr_data['top'][i], 
-                              'width': ocr_data['width'][i], 'height': ocr_data['height'][i]},
-                font_size_estimate=ocr_data['height'][i] * 0.75,
+                bounding_box={'x': word.left, 'y': word.top, 
+                              'width': word.width, 'height': word.height},
+                font_size_estimate=word.height * 0.75,
                 is_cta=any(re.search(p, text.lower()) for p in self.CTA_PATTERNS),
                 is_price=any(re.search(p, text) for p in self.PRICE_PATTERNS)
             )
             text_blocks.append(block)
         
         full_text = ' '.join([b.text for b in text_blocks])
-        img_h, img_w = img_cv.shape[:2]
         text_area = sum(b.bounding_box['width'] * b.bounding_box['height'] for b in text_blocks)
         
         signals = {
@@ -81,8 +89,8 @@ class OCRService:
                         word_count=len(full_text.split()), signals=signals)
 
 
-def extract_text(image_path: str, brand_names: List[str] = None) -> Dict[str, Any]:
-    result = OCRService().extract(image_path, brand_names)
+def extract_text(image: ImageSource, brand_names: List[str] = None) -> Dict[str, Any]:
+    result = OCRService().extract(image, brand_names)
     return {'full_text': result.full_text, 'word_count': result.word_count, 
             'signals': result.signals, 'text_blocks': [{'text': b.text, 'confidence': b.confidence, 
             'bounding_box': b.bounding_box} for b in result.text_blocks]}
@@ -0,0 +1,98 @@
+"""
+Text Regions - Where OCR is worth running.
+Glyphs show up in the Canny edge map as short, dense edge clusters sitting
+on a line; a wide horizontal closing joins each line into one component.
+Components with text-like size and edge density become candidate regions,
+padded and merged into lines and blocks, so Tesseract reads a few strips
+instead of the whole creative (and none of its photographic texture).
+Finding no region is not taken as finding no text: OCRService then reads
+the whole creative.
+"""
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.ocr.engines import Region
+
+# Text line height bounds
+MIN_LINE_HEIGHT = 6  # px
+MAX_LINE_HEIGHT_RATIO = 0.35
+# Glyph strokes cross each column a few times whatever the font size, so
+# edge pixels per column (not per area) separates text from smooth shapes;
+# above the density cap it is texture
+MIN_EDGES_PER_COLUMN = 2.5
+MAX_EDGE_DENSITY = 0.6
+# Components narrower than this share of their height are not glyphs or lines
+MIN_ASPECT = 0.5
+# Edge map this busy (noise, foliage, fabric) hides text from the detector
+MAX_IMAGE_EDGE_DENSITY = 0.2
+
+
+def _merge(boxes: List[List[int]]) -> List[List[int]]:
+    """
+    Union boxes (x1, y1, x2, y2) until none overlap. Boxes on the same line
+    also merge across a gap of up to one line height (word spacing).
+    """
+    def joins(a: List[int], b: List[int]) -> bool:
+        same_line = min(a[3], b[3]) - max(a[1], b[1]) > 0.5 * min(a[3] - a[1], b[3] - b[1])
+        gap = min(a[3] - a[1], b[3] - b[1]) if same_line else 0
+        return a[0] <= b[2] + gap and b[0] <= a[2] + gap and a[1] <= b[3] and b[1] <= a[3]
+    
+    merged = True
+    while merged:
+        merged = False
+        out: List[List[int]] = []
+        for box in boxes:
+            for other in out:
+                if joins(box, other):
+                    other[0], other[1] = min(other[0], box[0]), min(other[1], box[1])
+                    other[2], other[3] = max(other[2], box[2]), max(other[3], box[3])
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return boxes
+
+
+def detect_text_regions(edges: np.ndarray) -> Optional[List[Region]]:
+    """
+    Candidate text regions from a Canny edge map (ImageHandle.edges), as
+    (x, y, width, height) boxes; empty when nothing looks like text, None
+    when the image is too textured to tell (read all of it).
+    """
+    img_h, img_w = edges.shape
+    if cv2.countNonZero(edges) > MAX_IMAGE_EDGE_DENSITY * img_h * img_w:
+        return None
+    
+    # Joins glyphs of a line (and words on it) without bridging lines
+    kernel_w = max(9, img_w // 80)
+    closed = cv2.morphologyEx(
+        edges, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_w, 3))
+    )
+    count, _, stats, _ = cv2.connectedComponentsWithStats(closed, connectivity=8)
+    
+    edge_sum = cv2.integral(edges // 255)
+    boxes: List[List[int]] = []
+    for x, y, w, h, _ in stats[1:count]:
+        if h < MIN_LINE_HEIGHT or h > img_h * MAX_LINE_HEIGHT_RATIO or w < h * MIN_ASPECT:
+            continue
+        edge_pixels = (
+            edge_sum[y + h, x + w] - edge_sum[y, x + w] - edge_sum[y + h, x] + edge_sum[y, x]
+        )
+        if edge_pixels / w < MIN_EDGES_PER_COLUMN or edge_pixels / (w * h) > MAX_EDGE_DENSITY:
+            continue
+        # Room for ascenders/descenders the edge map clipped
+        pad = max(2, h // 4)
+        boxes.append([
+            max(0, x - pad), max(0, y - pad), min(img_w, x + w + pad), min(img_h, y + h + pad)
+        ])
+    
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in _merge(boxes)]
+
+
+def region_coverage(regions: List[Region], shape) -> float:
+    """Share of the image the regions cover (merged regions never overlap)."""
+    img_h, img_w = shape[:2]
+    return sum(w * h for _, _, w, h in regions) / (img_h * img_w)
@@ -3,18 +3,34 @@ Antigravity Orchestrator - CMO-Grade Analysis Pipeline
 Central coordinator implementing three-layer scoring with all guardrails.
 """
 import asyncio
-from typing import Dict, Any, Optional
+import contextlib
+import functools
+import time
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 from datetime import datetime
 import uuid
 import structlog
-from PIL import Image
-import os
-import tempfile
 
 from app.core.config import settings
+from app.services.pipeline import PipelineExecutor, Stage
+from app.services.benchmark_index import get_benchmark_index
+from app.services.cache.result_cache import get_result_cache, ResultCache
+from app.services.cpu_pool import get_cpu_pool
+from app.services.image_handle import ImageHandle, ImageSource
 
 logger = structlog.get_logger()
 
+# Bump whenever a change alters analysis output, so cached results are not reused
+PIPELINE_VERSION = "4"
+
+# Worst-case token spend held against the budget while an LLM stage is in flight
+VISION_TOKEN_RESERVE = 2000
+COPY_TOKEN_RESERVE = 2500
+
+# Context-independent signal layers, persisted per creative and reused by rescore
+SIGNAL_LAYERS = ("opencv", "ocr", "vision", "copy")
+
 
 class AnalysisOrchestrator:
     """
@@ -22,18 +38,37 @@ class AnalysisOrchestrator:
     
     Pipeline:
     1. Validate & Prepare
-    2. Layer 1: Deterministic (OpenCV, OCR)
-    3. Layer 2: Perceptual (GPT-4 Vision)
-    4. Layer 3: Cognitive (LLM reasoning)
+    2. Layer 1: Deterministic (OpenCV, OCR)      } run concurrently as a
+    3. Layer 2: Perceptual (GPT-4 Vision)         } dependency graph, see
+    4. Layer 3: Cognitive (LLM reasoning)         } PipelineExecutor
     5. Validate signals (anti-hallucination)
     6. Three-layer scoring with confidence
     7. Differentiation analysis
     8. Generate recommendations
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        cpu_executor: Optional[Executor] = None,
+        llm_semaphore: Optional[asyncio.Semaphore] = None,
+        progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        progressive: bool = False
+    ):
         self.token_budget = settings.TOKEN_BUDGET_FREE
         self.tokens_used = 0
+        self.tokens_reserved = 0
+        self.budget_limited = False  # an LLM layer was skipped for budget
+        # Executor override for CPU-bound Layer 1 stages; None uses the shared CPU pool
+        self.cpu_executor = cpu_executor
+        # Shared limit on concurrent LLM calls (e.g. across a batch); None = unbounded
+        self.llm_semaphore = llm_semaphore
+        # Receives stage-level progress events (see app.services.progress)
+        self.progress = progress
+        # Publish provisional "score" revisions as signal layers arrive
+        self.progressive = progressive and progress is not None
+        self.revision = 0
+        # Benchmarks and pillar weights, one snapshot for the whole analysis
+        self.benchmark_index = get_benchmark_index()
     
     async def analyze_creative(
         self,
@@ -42,7 +77,8 @@ class AnalysisOrchestrator:
         platform: str = "general",
         funnel_stage: str = "awareness",
         brand_names: list = None,
-        user_token_budget: int = None
+        user_token_budget: int = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Run full CMO-grade analysis pipeline.
@@ -53,13 +89,40 @@ class AnalysisOrchestrator:
         - Differentiation analysis
         - Recommendations with impact estimates
         - Warnings and contradictions
+        
+        Results are served from the content-addressed result cache when the
+        same image was already analysed in the same context; cache hits
+        report zero tokens used.
         """
         start_time = datetime.utcnow()
         analysis_id = str(uuid.uuid4())
         
-        if user_token_budget:
+        if user_token_budget is not None:
             self.token_budget = user_token_budget
         
+        cache = get_result_cache() if use_cache else None
+        
+        # === PHASE 1: Validate & Decode (once, shared by every stage) ===
+        handle, load_error = None, None
+        try:
+            handle = await self._load_image(image_path, fingerprint=cache is not None)
+        except Exception as e:
+            load_error = e
+        
+        cache_key = None
+        if cache and handle:
+            # Copy output differs with and without the visual summary; the
+            # reference version changes only with this context's benchmarks
+            copy_mode = "vision" if settings.PIPELINE_COPY_AWAITS_VISION else "ocr"
+            reference = self.benchmark_index.resolve(category, platform, funnel_stage)
+            cache_key = ResultCache.make_key(
+                handle.fingerprint, category, platform, funnel_stage,
+                f"{PIPELINE_VERSION}.{copy_mode}.{reference.version}"
+            )
+            cached = await cache.get(cache_key)
+            if cached:
+                return self._serve_cached(cached, analysis_id, start_time)
+        
         logger.info("analysis_started", analysis_id=analysis_id, image=image_path)
         
         result = {
@@ -72,115 +135,277 @@ class AnalysisOrchestrator:
         }
         
         try:
-            # === PHASE 1: Validate & Prepare ===
-            validated_path = await self._validate_and_prepare(image_path)
-            
-            # === PHASE 2: LAYER 1 - Deterministic Analysis (OpenCV/OCR) ===
-            logger.info("layer_1_deterministic", analysis_id=analysis_id)
+            if load_error:
+                raise load_error
             
-            opencv_signals = await self._run_opencv(validated_path)
-            result["signals"]["opencv"] = opencv_signals
-            result["signals"]["layers"]["deterministic"] = list(opencv_signals.keys())
+            # === PHASES 2-4: Signal layers as a dependency graph ===
+            # OpenCV, OCR and Vision are independent and run concurrently; copy
+            # analysis waits for OCR text and, unless PIPELINE_COPY_AWAITS_VISION
+            # is off, the visual summary; cognitive simulation waits for the
+            # three signal sources it consumes.
+            copy_deps = ["ocr", "vision"] if settings.PIPELINE_COPY_AWAITS_VISION else ["ocr"]
+            stages = [
+                Stage("opencv", lambda deps: self._run_opencv(handle)),
+                Stage("ocr", lambda deps: self._run_ocr(handle, brand_names)),
+                Stage("descriptors", lambda deps: self._run_descriptors(handle)),
+                Stage("vision", lambda deps: self._vision_stage(handle, analysis_id)),
+                Stage(
+                    "copy",
+                    lambda deps: self._copy_stage(deps, category, funnel_stage, analysis_id),
+                    depends_on=copy_deps
+                ),
+                Stage(
+                    "cognitive",
+                    lambda deps: self._run_cognitive_sim(
+                        deps["opencv"],
+                        deps["ocr"].get("signals", {}),
+                        (deps["vision"] or {}).get("signals", {})
+                    ),
+                    depends_on=["opencv", "ocr", "vision"]
+                ),
+            ]
+            if self.progressive:
+                # Provisional scores: deterministic layers first, then with Vision
+                stages += [
+                    Stage(
+                        "preview_deterministic",
+                        lambda deps: self._score_preview(deps, category, platform, funnel_stage),
+                        depends_on=["opencv", "ocr"]
+                    ),
+                    Stage(
+                        "preview_perceptual",
+                        lambda deps: self._score_preview(deps, category, platform, funnel_stage),
+                        depends_on=["opencv", "ocr", "vision", "preview_deterministic"]
+                    ),
+                ]
+            executor = PipelineExecutor(stages, on_stage=self._report_stage)
+            try:
+                stage_results = await executor.run()
+            finally:
+                result["stage_timings_ms"] = dict(executor.timings_ms)
             
-            ocr_result = await self._run_ocr(validated_path, brand_names)
-            result["signals"]["ocr"] = ocr_result.get("signals", {})
-            result["signals"]["layers"]["deterministic"].extend(
-                list(ocr_result.get("signals", {}).keys())
+            result["layer_outputs"] = self._collect_layer_outputs(
+                stage_results, executor.timings_ms, category, funnel_stage
             )
-            ocr_text = ocr_result.get("full_text", "")
+            for source in ("vision", "copy"):
+                if stage_results[source] is not None:
+                    result["tokens_used"][source] = stage_results[source].get("tokens_used", 0)
             
-            # === PHASE 3: LAYER 2 - Perceptual Analysis (GPT-4 Vision) ===
-            if self._has_token_budget(2000):
-                logger.info("layer_2_perceptual", analysis_id=analysis_id)
-                
-                vision_result = await self._run_vision(validated_path)
-                result["signals"]["vision"] = vision_result.get("signals", {})
-                result["signals"]["layers"]["perceptual"] = list(
-                    vision_result.get("signals", {}).keys()
-                )
-                result["tokens_used"]["vision"] = vision_result.get("tokens_used", 0)
-                self.tokens_used += vision_result.get("tokens_used", 0)
-                visual_summary = str(vision_result.get("perception", {}))
-            else:
-                result["signals"]["vision"] = {}
-                result["signals"]["layers"]["perceptual"] = []
-                visual_summary = ""
-                result["warnings"].append("Vision analysis skipped: token budget exceeded")
+            layers = {
+                source: {"signals": self._layer_signals(source, stage_results[source])}
+                for source in SIGNAL_LAYERS
+                if stage_results[source] is not None
+            }
+            self._assemble_signals(result, layers, stage_results["cognitive"])
             
-            # === PHASE 4: LAYER 3 - Cognitive Analysis (LLM) ===
-            if self._has_token_budget(2500) and ocr_text:
-                logger.info("layer_3_cognitive", analysis_id=analysis_id)
-                
-                copy_result = await self._run_copy_analysis(
-                    ocr_text, visual_summary, category, funnel_stage
-                )
-                result["signals"]["copy"] = copy_result.get("signals", {})
-                result["signals"]["layers"]["cognitive"] = list(
-                    copy_result.get("signals", {}).keys()
-                )
-                result["tokens_used"]["copy"] = copy_result.get("tokens_used", 0)
-                self.tokens_used += copy_result.get("tokens_used", 0)
-            else:
-                result["signals"]["copy"] = {}
-                result["signals"]["layers"]["cognitive"] = []
-            
-            # Cognitive simulation
-            cognitive_result = await self._run_cognitive_sim(
-                result["signals"]["opencv"],
-                result["signals"]["ocr"],
-                result["signals"]["vision"]
-            )
-            result["signals"]["cognitive"] = cognitive_result.get("signals", {})
-            result["signals"]["layers"]["cognitive"].extend(
-                list(cognitive_result.get("signals", {}).keys())
-            )
-            
-            # === PHASE 5: Validate Signals (Anti-Hallucination) ===
-            validation = await self._validate_signals(result["signals"])
-            result["validation"] = validation
-            if validation.get("contradictions"):
-                result["warnings"].extend(validation["contradictions"])
+            # === PHASES 5-8: Context-dependent stages ===
+            ocr_text = stage_results["ocr"].get("full_text", "")
+            await self._report_stage("scoring", "started", None)
+            scoring_start = time.perf_counter()
+            await self._score_phases(result, ocr_text, category, platform, funnel_stage, analysis_id)
+            await self._report_stage("scoring", "completed", int((time.perf_counter() - scoring_start) * 1000))
+            if self.progressive:
+                layers = [name for name, signals in result["signals"]["layers"].items() if signals]
+                await self._publish_revision(result["score"], layers, final=True)
             
-            # === PHASE 6: Three-Layer CMO-Grade Scoring ===
-            logger.info("three_layer_scoring", analysis_id=analysis_id)
-            
-            scoring_result = await self._run_three_layer_scoring(
-                result["signals"], category, platform, funnel_stage
-            )
-            result["score"] = scoring_result
+            result["status"] = "completed"
             
-            # Add scoring warnings
-            if scoring_result.get("warnings"):
-                result["warnings"].extend(scoring_result["warnings"])
+        except Exception as e:
+            logger.error("analysis_failed", error=str(e), analysis_id=analysis_id)
+            result["status"] = "failed"
+            result["errors"].append(str(e))
+        finally:
+            if handle:
+                handle.close()
+        
+        self._finalize(result, start_time, analysis_id)
+        
+        # Only complete, unbudgeted results are reusable for other requests
+        if cache_key and result["status"] == "completed" and not self.budget_limited:
+            await cache.set(cache_key, result)
+        result["cache"] = {"hit": False}
+        
+        return result
+    
+    async def rescore(
+        self,
+        layers: Dict[str, Dict[str, Any]],
+        category: str = "general",
+        platform: str = "general",
+        funnel_stage: str = "awareness"
+    ) -> Dict[str, Any]:
+        """
+        Re-run only the context-dependent stages on stored layer signals.
+        
+        `layers` maps source (opencv, ocr, vision, copy) to
+        {"signals": ..., "raw_output": ...} as persisted after a full analysis.
+        There is no image I/O and no LLM call: cognitive simulation, validation,
+        scoring, differentiation and recommendations are recomputed. Copy
+        signals are reused as-is even though the copy prompt saw the original
+        category and funnel stage.
+        """
+        start_time = datetime.utcnow()
+        analysis_id = str(uuid.uuid4())
+        
+        result = {
+            "analysis_id": analysis_id,
+            "status": "processing",
+            "rescored": True,
+            "signals": {"layers": {}},
+            "tokens_used": {},
+            "errors": [],
+            "warnings": []
+        }
+        
+        try:
+            if "opencv" not in layers or "ocr" not in layers:
+                raise ValueError("Stored deterministic signals missing; full analysis required")
             
-            # === PHASE 7: Differentiation Analysis ===
-            differentiation = await self._run_differentiation(
-                ocr_text,
-                result["signals"].get("copy", {}),
-                result["signals"].get("vision", {}),
-                category
+            cognitive_result = await self._run_cognitive_sim(
+                layers["opencv"]["signals"],
+                layers["ocr"]["signals"],
+                layers.get("vision", {}).get("signals", {})
             )
-            result["differentiation"] = differentiation
-            
-            if differentiation.get("is_me_too"):
-                result["warnings"].append(
-                    "Creative shows low differentiation. Consider unique value proposition."
-                )
+            self._assemble_signals(result, layers, cognitive_result)
             
-            # === PHASE 8: Recommendations ===
-            recommendations = await self._run_recommendations(
-                result["signals"], scoring_result.get("pillars", [])
-            )
-            result["recommendations"] = recommendations
+            ocr_text = (layers["ocr"].get("raw_output") or {}).get("full_text", "")
+            await self._score_phases(result, ocr_text, category, platform, funnel_stage, analysis_id)
             
             result["status"] = "completed"
             
         except Exception as e:
-            logger.error("analysis_failed", error=str(e), analysis_id=analysis_id)
+            logger.error("rescore_failed", error=str(e), analysis_id=analysis_id)
             result["status"] = "failed"
             result["errors"].append(str(e))
         
-        # Finalize
+        self._finalize(result, start_time, analysis_id)
+        return result
+    
+    def _layer_signals(self, source: str, stage_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Signal dict of a layer stage result (OpenCV returns signals directly)."""
+        if source == "opencv":
+            return stage_result
+        return stage_result.get("signals", {})
+    
+    def _collect_layer_outputs(
+        self,
+        stage_results: Dict[str, Any],
+        timings_ms: Dict[str, int],
+        category: str,
+        funnel_stage: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Raw output per signal layer, kept next to the signals so a later
+        rescore can run without the image or the LLMs.
+        """
+        raw_outputs = {
+            # Appearance descriptors behind the creative's similarity embedding
+            "opencv": lambda r: {"descriptors": stage_results.get("descriptors") or {}},
+            "ocr": lambda r: {
+                "full_text": r.get("full_text", ""),
+                "word_count": r.get("word_count", 0),
+                "text_blocks": r.get("text_blocks", [])
+            },
+            "vision": lambda r: {"perception": r.get("perception", {}), "payload": r.get("payload")},
+            "copy": lambda r: {
+                "analysis": r.get("analysis", {}),
+                "category": category,
+                "funnel_stage": funnel_stage
+            },
+        }
+        
+        outputs = {}
+        for source in SIGNAL_LAYERS:
+            stage_result = stage_results[source]
+            if stage_result is None:
+                continue
+            outputs[source] = {
+                "raw_output": raw_outputs[source](stage_result),
+                "tokens_used": stage_result.get("tokens_used", 0) if source in ("vision", "copy") else 0,
+                "processing_time_ms": timings_ms.get(source)
+            }
+        return outputs
+    
+    def _assemble_signals(
+        self,
+        result: Dict[str, Any],
+        layers: Dict[str, Dict[str, Any]],
+        cognitive_result: Dict[str, Any]
+    ):
+        """Populate result["signals"] and the per-layer signal inventory."""
+        signals = result["signals"]
+        
+        # Layer 1: Deterministic (OpenCV/OCR)
+        signals["opencv"] = layers["opencv"]["signals"]
+        signals["ocr"] = layers["ocr"]["signals"]
+        signals["layers"]["deterministic"] = list(signals["opencv"].keys()) + list(signals["ocr"].keys())
+        
+        # Layer 2: Perceptual (GPT-4 Vision)
+        if "vision" in layers:
+            signals["vision"] = layers["vision"]["signals"]
+            signals["layers"]["perceptual"] = list(signals["vision"].keys())
+        else:
+            signals["vision"] = {}
+            signals["layers"]["perceptual"] = []
+            result["warnings"].append("Vision analysis skipped: token budget exceeded")
+        
+        # Layer 3: Cognitive (LLM + simulation)
+        signals["copy"] = layers["copy"]["signals"] if "copy" in layers else {}
+        signals["layers"]["cognitive"] = list(signals["copy"].keys())
+        
+        signals["cognitive"] = cognitive_result.get("signals", {})
+        signals["layers"]["cognitive"].extend(list(signals["cognitive"].keys()))
+    
+    async def _score_phases(
+        self,
+        result: Dict[str, Any],
+        ocr_text: str,
+        category: str,
+        platform: str,
+        funnel_stage: str,
+        analysis_id: str
+    ):
+        """Phases 5-8: the only stages that depend on category/platform/funnel."""
+        # === PHASE 5: Validate Signals (Anti-Hallucination) ===
+        validation = await self._validate_signals(result["signals"])
+        result["validation"] = validation
+        if validation.get("contradictions"):
+            result["warnings"].extend(validation["contradictions"])
+        
+        # === PHASE 6: Three-Layer CMO-Grade Scoring ===
+        logger.info("three_layer_scoring", analysis_id=analysis_id)
+        
+        scoring_result = await self._run_three_layer_scoring(
+            result["signals"], category, platform, funnel_stage
+        )
+        result["score"] = scoring_result
+        
+        # Add scoring warnings
+        if scoring_result.get("warnings"):
+            result["warnings"].extend(scoring_result["warnings"])
+        
+        # === PHASE 7: Differentiation Analysis ===
+        differentiation = await self._run_differentiation(
+            ocr_text,
+            result["signals"].get("copy", {}),
+            result["signals"].get("vision", {}),
+            category
+        )
+        result["differentiation"] = differentiation
+        
+        if differentiation.get("is_me_too"):
+            result["warnings"].append(
+                "Creative shows low differentiation. Consider unique value proposition."
+            )
+        
+        # === PHASE 8: Recommendations ===
+        recommendations = await self._run_recommendations(
+            result["signals"], scoring_result.get("pillars", []), category, platform, funnel_stage
+        )
+        result["recommendations"] = recommendations
+    
+    def _finalize(self, result: Dict[str, Any], start_time: datetime, analysis_id: str):
+        """Timing, token totals and layer summary shared by analyze and rescore."""
         end_time = datetime.utcnow()
         result["processing_time_ms"] = int((end_time - start_time).total_seconds() * 1000)
         result["total_tokens_used"] = self.tokens_used
@@ -198,61 +423,192 @@ class AnalysisOrchestrator:
                    overall_score=result.get("score", {}).get("overall_score"),
                    confidence=result.get("score", {}).get("confidence"),
                    time_ms=result["processing_time_ms"])
+    
+    def _serve_cached(
+        self, cached: Dict[str, Any], analysis_id: str, start_time: datetime
+    ) -> Dict[str, Any]:
+        """Re-issue a cached result as a new analysis that consumed no tokens."""
+        result = dict(cached)
+        result["cache"] = {"hit": True, "source_analysis_id": cached.get("analysis_id")}
+        result["analysis_id"] = analysis_id
+        result["tokens_used"] = {}
+        result["total_tokens_used"] = 0
+        result["stage_timings_ms"] = {}
+        result["processing_time_ms"] = int((datetime.utcnow() - start_time).total_seconds() * 1000)
         
+        logger.info("analysis_cache_hit",
+                   analysis_id=analysis_id,
+                   source_analysis_id=cached.get("analysis_id"),
+                   time_ms=result["processing_time_ms"])
         return result
     
-    async def _validate_and_prepare(self, image_path: str) -> str:
-        """Validate image and resize for analysis."""
-        if not os.path.exists(image_path):
-            raise ValueError(f"Image not found: {image_path}")
+    async def _load_image(self, image_path: str, fingerprint: bool) -> ImageHandle:
+        """Read, validate and decode the image once, off the loop, at ANALYSIS_RESOLUTION."""
+        return await self._run_in_executor(
+            None, ImageHandle.load, image_path, max(settings.ANALYSIS_RESOLUTION), fingerprint
+        )
+    
+    def _has_token_budget(self, required: int) -> bool:
+        """Check if we have enough token budget."""
+        return (self.tokens_used + self.tokens_reserved + required) <= self.token_budget
+    
+    def _reserve_tokens(self, required: int) -> bool:
+        """
+        Reserve budget for an LLM stage.
+        
+        Stages run concurrently, so budget is held for in-flight calls until
+        their actual usage is known; otherwise two stages could both pass the
+        check against the same remaining budget.
+        """
+        if not self._has_token_budget(required):
+            return False
+        self.tokens_reserved += required
+        return True
+    
+    def _settle_tokens(self, reserved: int, actual: int):
+        """Release a reservation and record the tokens actually spent."""
+        self.tokens_reserved -= reserved
+        self.tokens_used += actual
+    
+    async def _vision_stage(self, handle: ImageHandle, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Layer 2 stage: returns None when the token budget does not allow it."""
+        if not self._reserve_tokens(VISION_TOKEN_RESERVE):
+            self.budget_limited = True
+            return None
+        
+        logger.info("layer_2_perceptual", analysis_id=analysis_id)
+        vision_result = {}
+        try:
+            async with self._llm_slot():
+                vision_result = await self._run_vision(handle)
+        finally:
+            self._settle_tokens(VISION_TOKEN_RESERVE, vision_result.get("tokens_used", 0))
+        return vision_result
+    
+    async def _copy_stage(
+        self, deps: Dict[str, Any], category: str, funnel_stage: str, analysis_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Layer 3 stage: returns None when there is no text or no budget."""
+        ocr_text = deps["ocr"].get("full_text", "")
+        if not ocr_text:
+            return None
+        if not self._reserve_tokens(COPY_TOKEN_RESERVE):
+            self.budget_limited = True
+            return None
+        
+        vision_result = deps.get("vision") or {}
+        visual_summary = str(vision_result.get("perception", "")) if vision_result else ""
+        
+        logger.info("layer_3_cognitive", analysis_id=analysis_id)
+        copy_result = {}
+        try:
+            async with self._llm_slot():
+                copy_result = await self._run_copy_analysis(
+                    ocr_text, visual_summary, category, funnel_stage
+                )
+        finally:
+            self._settle_tokens(COPY_TOKEN_RESERVE, copy_result.get("tokens_used", 0))
+        return copy_result
+    
+    async def _score_preview(
+        self, deps: Dict[str, Any], category: str, platform: str, funnel_stage: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Score the signal layers finished so far and publish it as a
+        provisional revision. The engine lowers confidence for the missing
+        layers by itself. Never fails the analysis.
+        """
+        signals = {"opencv": deps["opencv"], "ocr": deps["ocr"].get("signals", {})}
+        if "vision" in deps:
+            if deps["vision"] is None:
+                return None  # skipped for budget: nothing new to score
+            signals["vision"] = deps["vision"].get("signals", {})
         
         try:
-            img = Image.open(image_path)
-            if img.format and img.format.upper() not in ["JPEG", "JPG", "PNG", "WEBP"]:
-                raise ValueError(f"Unsupported format: {img.format}")
+            score = await self._run_three_layer_scoring(signals, category, platform, funnel_stage)
         except Exception as e:
-            raise ValueError(f"Invalid image: {e}")
-        
-        # Resize if needed
-        max_dim = max(settings.ANALYSIS_RESOLUTION)
-        if max(img.size) > max_dim:
-            ratio = max_dim / max(img.size)
-            new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            temp_path = os.path.join(tempfile.gettempdir(), f"analysis_{uuid.uuid4()}.jpg")
-            img.save(temp_path, "JPEG", quality=85)
-            return temp_path
+            logger.warning("preview_scoring_failed", error=str(e))
+            return None
         
-        return image_path
+        layers = ["deterministic", "perceptual"] if "vision" in signals else ["deterministic"]
+        await self._publish_revision(score, layers, final=False)
+        return score
     
-    def _has_token_budget(self, required: int) -> bool:
-        """Check if we have enough token budget."""
-        return (self.tokens_used + required) <= self.token_budget
+    async def _publish_revision(self, score: Dict[str, Any], layers: List[str], final: bool):
+        """Emit a versioned "score" event; revisions count up from 1 per analysis."""
+        self.revision += 1
+        await self.progress({
+            "event": "score",
+            "revision": self.revision,
+            "final": final,
+            "layers": layers,
+            "overall_score": score.get("overall_score"),
+            "confidence": score.get("confidence"),
+            "score": score
+        })
+    
+    async def _report_stage(self, stage: str, state: str, duration_ms: Optional[int]):
+        if self.progress is not None:
+            await self.progress({"event": "stage", "stage": stage, "state": state, "duration_ms": duration_ms})
     
-    async def _run_opencv(self, image_path: str) -> Dict[str, Any]:
+    def _llm_slot(self):
+        """Context manager holding one slot of the shared LLM limit, if any."""
+        return self.llm_semaphore or contextlib.nullcontext()
+    
+    async def _run_in_executor(self, executor, fn, *args):
+        """Run a blocking call off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args))
+    
+    async def _run_cpu(self, fn, *args):
+        """Run a CPU-bound Layer 1 job in the shared CPU pool (or the override executor)."""
+        if self.cpu_executor is not None:
+            return await self._run_in_executor(self.cpu_executor, fn, *args)
+        return await get_cpu_pool().run(fn, *args)
+    
+    def _cpu_image(self, handle: ImageHandle) -> ImageSource:
+        """
+        What a Layer 1 job receives: the handle itself when the job runs in
+        this process, a shared-memory reference when it crosses into a worker.
+        """
+        if self.cpu_executor is None and get_cpu_pool().uses_processes:
+            return handle.shared()
+        return handle
+    
+    async def _run_opencv(self, handle: ImageHandle) -> Dict[str, Any]:
         """Run OpenCV deterministic analysis."""
         from app.services.vision.opencv_analyzer import analyze_image
-        return analyze_image(image_path)
+        return await self._run_cpu(analyze_image, self._cpu_image(handle))
+    
+    async def _run_descriptors(self, handle: ImageHandle) -> Optional[Dict[str, Any]]:
+        """
+        Appearance descriptors for similarity search. They are not scored, so
+        a failure here costs the creative its embedding, not its analysis.
+        """
+        from app.services.vision.opencv_analyzer import describe_image
+        try:
+            return await self._run_cpu(describe_image, self._cpu_image(handle))
+        except Exception as e:
+            logger.warning("descriptors_failed", error=str(e))
+            return None
     
-    async def _run_ocr(self, image_path: str, brand_names: list = None) -> Dict[str, Any]:
+    async def _run_ocr(self, handle: ImageHandle, brand_names: list = None) -> Dict[str, Any]:
         """Run OCR extraction."""
         from app.services.ocr.ocr_service import extract_text
-        return extract_text(image_path, brand_names)
+        return await self._run_cpu(extract_text, self._cpu_image(handle), brand_names)
     
-    async def _run_vision(self, image_path: str) -> Dict[str, Any]:
-        """Run OpenAI Vision analysis."""
-        from app.services.llm.vision_service import OpenAIVisionService
-        service = OpenAIVisionService(api_key=settings.OPENAI_API_KEY)
-        return service.analyze(image_path)
+    async def _run_vision(self, handle: ImageHandle) -> Dict[str, Any]:
+        """Run OpenAI Vision analysis (micro-batched when VISION_BATCH_MAX_IMAGES > 1)."""
+        from app.services.llm.vision_batcher import get_vision_batcher
+        return await get_vision_batcher().analyze(handle)
     
     async def _run_copy_analysis(
         self, ocr_text: str, visual_summary: str, category: str, funnel_stage: str
     ) -> Dict[str, Any]:
         """Run LLM copy analysis."""
         from app.services.llm.copy_analysis import CopyAnalysisService
-        service = CopyAnalysisService(api_key=settings.OPENAI_API_KEY)
-        return service.analyze(ocr_text, visual_summary, category, funnel_stage)
+        service = CopyAnalysisService()
+        return await service.analyze(ocr_text, visual_summary, category, funnel_stage)
     
     async def _run_cognitive_sim(
         self, opencv: Dict, ocr: Dict, vision: Dict
@@ -271,7 +627,11 @@ class AnalysisOrchestrator:
     ) -> Dict[str, Any]:
         """Run three-layer CMO-grade scoring."""
         from app.services.scoring.three_layer_engine import score_creative_three_layer
-        return score_creative_three_layer(all_signals, category, platform, funnel_stage)
+        reference = self.benchmark_index.resolve(category, platform, funnel_stage)
+        return score_creative_three_layer(
+            all_signals, category, platform, funnel_stage,
+            benchmarks=reference.benchmarks, weights=reference.pillar_weights
+        )
     
     async def _run_differentiation(
         self, ocr_text: str, copy_signals: Dict, vision_signals: Dict, category: str
@@ -281,11 +641,12 @@ class AnalysisOrchestrator:
         return analyze_differentiation(ocr_text, copy_signals, vision_signals, category)
     
     async def _run_recommendations(
-        self, all_signals: Dict, pillars: list
+        self, all_signals: Dict, pillars: list, category: str, platform: str, funnel_stage: str
     ) -> list:
         """Generate recommendations."""
         from app.services.scoring.recommendation_engine import generate_recommendations
-        return generate_recommendations(all_signals, pillars)
+        reference = self.benchmark_index.resolve(category, platform, funnel_stage)
+        return generate_recommendations(all_signals, pillars, benchmarks=reference.benchmarks)
 
 
 # Convenience function
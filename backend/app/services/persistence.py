@@ -0,0 +1,302 @@
+"""
+Analysis Persistence - Storing and reloading per-creative analysis output.
+Layer signals are kept in CreativeAnalysis so context changes can be rescored
+without re-running image analysis or LLM calls; micro-signals, pillars and
+recommendations are written as bulk inserts in the caller's transaction.
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import uuid
+from sqlalchemy import select, delete, insert, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from app.models.models import (
+    Creative, CreativeAnalysis, CreativeEmbedding, Campaign, CreativeStatus,
+    MicroSignal, ScorePillar, Recommendation, AnalysisSource, User
+)
+from app.services.orchestrator import SIGNAL_LAYERS
+
+logger = structlog.get_logger()
+
+
+async def save_layer_outputs(db: AsyncSession, creative_id: uuid.UUID, result: Dict[str, Any]):
+    """
+    Replace the stored per-layer output of a creative with this analysis.
+    
+    One CreativeAnalysis row per layer that ran: raw_output holds the layer's
+    context-independent output, signals_extracted its signal dict.
+    """
+    layer_outputs = result.get("layer_outputs") or {}
+    if not layer_outputs:
+        return
+    
+    await db.execute(
+        delete(CreativeAnalysis).where(
+            CreativeAnalysis.creative_id == creative_id,
+            CreativeAnalysis.analysis_type.in_(SIGNAL_LAYERS)
+        )
+    )
+    
+    for source, output in layer_outputs.items():
+        db.add(CreativeAnalysis(
+            creative_id=creative_id,
+            analysis_type=source,
+            raw_output=output.get("raw_output") or {},
+            signals_extracted=result["signals"].get(source, {}),
+            tokens_used=output.get("tokens_used", 0),
+            processing_time_ms=output.get("processing_time_ms")
+        ))
+
+
+# Orchestrator signal groups -> MicroSignal.source
+SIGNAL_SOURCES = {
+    "opencv": AnalysisSource.OPENCV,
+    "ocr": AnalysisSource.OCR,
+    "vision": AnalysisSource.OPENAI_VISION,
+    "copy": AnalysisSource.OPENAI_LLM,
+    "cognitive": AnalysisSource.COGNITIVE_SIM,
+}
+
+
+def micro_signal_rows(
+    creative_id: uuid.UUID, signals: Dict[str, Any], percentiles: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    One row per numeric signal; categorical signals stay in CreativeAnalysis
+    only. `percentiles` is the score's signal_percentiles (vs benchmark).
+    """
+    percentiles = percentiles or {}
+    rows = []
+    for group, source in SIGNAL_SOURCES.items():
+        for name, signal in (signals.get(group) or {}).items():
+            value = signal.get("value") if isinstance(signal, dict) else signal
+            if isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, (int, float)):
+                continue
+            rows.append({
+                "creative_id": creative_id,
+                "signal_name": name[:100],
+                "signal_value": float(value),
+                "signal_unit": signal.get("unit") if isinstance(signal, dict) else None,
+                "source": source,
+                "confidence": float(signal.get("confidence", 1.0)) if isinstance(signal, dict) else 1.0,
+                "raw_data": signal.get("raw_data") if isinstance(signal, dict) else None,
+                "benchmark_percentile": percentiles.get(name),
+            })
+    return rows
+
+
+def score_pillar_rows(creative_id: uuid.UUID, score: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows from the three-layer pillar breakdown of a score result."""
+    rows = []
+    for pillar in score.get("pillars") or []:
+        explanation = pillar.get("explanation")
+        if isinstance(explanation, dict):
+            explanation = explanation.get("boardroom_summary")
+        rows.append({
+            "creative_id": creative_id,
+            "pillar_name": pillar["name"],
+            "score": float(pillar["score"]),
+            "confidence_lower": pillar.get("confidence_lower"),
+            "confidence_upper": pillar.get("confidence_upper"),
+            "weight": float(pillar.get("weight", 1.0)),
+            "explanation": explanation,
+            "contributing_signals": [
+                {"layer": layer, "points": points}
+                for layer, points in (pillar.get("layer_breakdown") or {}).items()
+            ],
+        })
+    return rows
+
+
+def recommendation_rows(creative_id: uuid.UUID, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows from the recommendation engine output."""
+    overall = (result.get("score") or {}).get("overall_score")
+    rows = []
+    for rec in result.get("recommendations") or []:
+        uplift = rec.get("uplift")
+        rows.append({
+            "creative_id": creative_id,
+            "priority": int(rec.get("priority", len(rows) + 1)),
+            "signal_source": rec.get("signal"),
+            "fix_category": rec.get("category"),
+            "fix_text": rec.get("fix") or "",
+            "example": rec.get("example"),
+            "impact_score": uplift,
+            "simulated_uplift": round(uplift / overall * 100, 1) if uplift is not None and overall else None,
+            "implementation_difficulty": rec.get("difficulty"),
+        })
+    return rows
+
+
+def signal_percentile_rows(creative_id: uuid.UUID, percentiles: Optional[Dict[str, float]]) -> List[Dict[str, Any]]:
+    """executemany parameters for update_signal_percentiles."""
+    return [
+        {"b_id": creative_id, "b_name": name[:100], "b_percentile": percentile}
+        for name, percentile in (percentiles or {}).items()
+    ]
+
+
+async def replace_rows(
+    db: AsyncSession, creative_ids: List[uuid.UUID], tables: List[Tuple[Any, List[Dict[str, Any]]]]
+) -> Dict[str, int]:
+    """Replace the creatives' rows of each (model, rows) pair: one DELETE and one INSERT per table."""
+    # Core statements on the session's connection skip ORM per-row bookkeeping
+    conn = await db.connection()
+    counts = {}
+    for model, rows in tables:
+        table = model.__table__
+        await conn.execute(delete(table).where(table.c.creative_id.in_(creative_ids)))
+        if rows:
+            await conn.execute(insert(table), rows)
+        counts[table.name] = len(rows)
+    return counts
+
+
+async def update_signal_percentiles(
+    db: AsyncSession, creative_ids: List[uuid.UUID], rows: List[Dict[str, Any]]
+):
+    """
+    Rewrite MicroSignal.benchmark_percentile of the creatives from
+    signal_percentile_rows; signals without a benchmark are reset to NULL.
+    """
+    table = MicroSignal.__table__
+    conn = await db.connection()
+    await conn.execute(
+        update(table).where(table.c.creative_id.in_(creative_ids)).values(benchmark_percentile=None)
+    )
+    if rows:
+        await conn.execute(
+            update(table)
+            .where(table.c.creative_id == bindparam("b_id"), table.c.signal_name == bindparam("b_name"))
+            .values(benchmark_percentile=bindparam("b_percentile")),
+            rows
+        )
+
+
+async def save_analysis_rows(
+    db: AsyncSession,
+    creative_id: uuid.UUID,
+    result: Dict[str, Any],
+    include_signals: bool = True
+) -> Dict[str, int]:
+    """
+    Replace a creative's MicroSignal, ScorePillar and Recommendation rows.
+    
+    Each table gets one DELETE and one executemany INSERT, which SQLAlchemy
+    sends as batched multi-row VALUES (SQLite) or a pipelined executemany
+    (asyncpg). Nothing is committed here, so the caller's commit makes the
+    rows visible together with the creative's scores.
+    
+    Rescoring passes include_signals=False: signal values do not change, so
+    MicroSignal rows keep them and only their benchmark percentiles are
+    rewritten.
+    """
+    score = result.get("score") or {}
+    tables = [
+        (ScorePillar, score_pillar_rows(creative_id, score)),
+        (Recommendation, recommendation_rows(creative_id, result)),
+    ]
+    if include_signals:
+        tables.insert(0, (MicroSignal, micro_signal_rows(
+            creative_id, result.get("signals") or {}, score.get("signal_percentiles")
+        )))
+    else:
+        await update_signal_percentiles(
+            db, [creative_id], signal_percentile_rows(creative_id, score.get("signal_percentiles"))
+        )
+    return await replace_rows(db, [creative_id], tables)
+
+
+async def save_embedding(db: AsyncSession, creative_id: uuid.UUID, layers: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    Replace the creative's similarity embedding with one built from these
+    layer outputs; False (nothing written) when they carry no descriptors.
+    """
+    from app.services.embeddings import EMBEDDING_TYPE, EMBEDDING_VERSION, embedding_from_layers
+    
+    vector = embedding_from_layers(layers or {})
+    if vector is None:
+        return False
+    
+    table = CreativeEmbedding.__table__
+    conn = await db.connection()
+    await conn.execute(delete(table).where(
+        table.c.creative_id == creative_id, table.c.embedding_type == EMBEDDING_TYPE
+    ))
+    await conn.execute(insert(table).values(
+        id=uuid.uuid4(),
+        creative_id=creative_id,
+        embedding_type=EMBEDDING_TYPE,
+        embedding_data=vector,
+        embedding_version=EMBEDDING_VERSION,
+        created_at=datetime.utcnow(),
+    ))
+    return True
+
+
+async def load_layer_outputs(db: AsyncSession, creative_id: uuid.UUID) -> Dict[str, Dict[str, Any]]:
+    """Stored layers as {source: {"signals": ..., "raw_output": ...}} for rescoring."""
+    result = await db.execute(
+        select(CreativeAnalysis).where(
+            CreativeAnalysis.creative_id == creative_id,
+            CreativeAnalysis.analysis_type.in_(SIGNAL_LAYERS)
+        )
+    )
+    return {
+        row.analysis_type: {
+            "signals": row.signals_extracted or {},
+            "raw_output": row.raw_output or {}
+        }
+        for row in result.scalars().all()
+    }
+
+
+def can_rescore(layers: Dict[str, Dict[str, Any]]) -> bool:
+    """Rescoring needs at least the deterministic layers."""
+    return "opencv" in layers and "ocr" in layers
+
+
+async def load_scoring_context(db: AsyncSession, creative: Creative) -> Tuple[str, str, str]:
+    """(category, platform, funnel_stage) from the creative's brand and campaign."""
+    result = await db.execute(
+        select(Campaign).where(Campaign.id == creative.campaign_id)
+    )
+    campaign = result.scalar_one_or_none()
+    if not campaign:
+        return "general", "general", "awareness"
+    
+    await db.refresh(campaign, ["brand"])
+    category = (campaign.brand.category if campaign.brand else None) or "general"
+    return category, campaign.platform or "general", campaign.funnel_stage or "awareness"
+
+
+def apply_scores(creative: Creative, result: Dict[str, Any]):
+    """Copy headline scores from an analysis result onto the creative."""
+    score = result.get("score")
+    if result.get("status") != "completed" or not score:
+        creative.status = CreativeStatus.FAILED
+        return
+    
+    creative.status = CreativeStatus.COMPLETED
+    creative.final_score = score.get("overall_score")
+    creative.score_confidence = (score.get("confidence_band") or [0, 0])[0]
+    creative.funnel_fit_score = score.get("funnel_fit_score")
+    creative.platform_fit_score = score.get("platform_fit_score")
+    creative.analyzed_at = datetime.utcnow()
+
+
+
+async def charge_tokens(user_id: uuid.UUID, tokens: int):
+    """Add LLM spend to the user in its own session, outside any request's transaction."""
+    if not tokens:
+        return
+    from app.core.database import AsyncSessionLocal
+    
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(User).where(User.id == user_id).values(tokens_used=User.tokens_used + tokens)
+        )
+        await db.commit()
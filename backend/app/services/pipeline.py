@@ -0,0 +1,114 @@
+"""
+Pipeline Executor - Dependency-graph scheduling for the analysis pipeline.
+Starts every stage as soon as the stages it depends on have finished, so
+independent layers (OpenCV, OCR, Vision) overlap instead of running in series.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class Stage:
+    """A single node in the pipeline graph.
+    
+    `run` receives a dict of dependency name -> dependency result.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    depends_on: List[str] = field(default_factory=list)
+
+
+class PipelineExecutor:
+    """
+    Runs a set of stages as a DAG on the current event loop.
+    
+    Stage results and wall-clock durations are collected per stage. The first
+    failing stage cancels everything still in flight and its exception is
+    re-raised to the caller.
+    
+    `on_stage(name, state, duration_ms)` is awaited as each stage starts
+    ("started", no duration) and ends ("completed" or "failed").
+    """
+    
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_stage: Optional[Callable[[str, str, Optional[int]], Awaitable[None]]] = None
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        self.timings_ms: Dict[str, int] = {}
+        self.on_stage = on_stage
+        self._validate()
+    
+    def _validate(self):
+        """Reject unknown dependencies and cycles before anything is scheduled."""
+        for stage in self.stages.values():
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        
+        visiting, done = set(), set()
+        
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline cycle detected at stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+        
+        for name in self.stages:
+            visit(name)
+    
+    async def _stage_ended(self, name: str, state: str, start: float):
+        self.timings_ms[name] = int((time.perf_counter() - start) * 1000)
+        if self.on_stage:
+            await self.on_stage(name, state, self.timings_ms[name])
+    
+    async def run(self) -> Dict[str, Any]:
+        """Execute all stages and return stage name -> result."""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def run_stage(stage: Stage) -> Any:
+            if stage.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in stage.depends_on))
+            
+            if self.on_stage:
+                await self.on_stage(stage.name, "started", None)
+            start = time.perf_counter()
+            try:
+                value = await stage.run({dep: results[dep] for dep in stage.depends_on})
+            except Exception:
+                await self._stage_ended(stage.name, "failed", start)
+                raise
+            except BaseException:
+                # Cancelled because a sibling failed: timed, not reported
+                self.timings_ms[stage.name] = int((time.perf_counter() - start) * 1000)
+                raise
+            
+            await self._stage_ended(stage.name, "completed", start)
+            results[stage.name] = value
+            return value
+        
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage), name=f"stage:{stage.name}")
+        
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        
+        logger.debug("pipeline_complete", timings_ms=self.timings_ms)
+        return results
@@ -0,0 +1,200 @@
+"""
+Progress Events - Stage-level progress for in-flight analyses.
+The orchestrator, analysis queue and batch runner publish small JSON events
+per creative or batch job; Server-Sent Events endpoints relay them to
+clients instead of clients polling the database. With the Redis backend,
+events cross from Celery workers to API processes through pub/sub, and each
+process shares one subscriber connection between all of its open streams.
+"""
+import asyncio
+import contextlib
+import json
+import time
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# Events after which a stream ends
+TERMINAL_EVENTS = ("completed", "failed")
+# Per-stream backlog; a reader this far behind loses its oldest events
+QUEUE_SIZE = 256
+
+# No caching, and no proxy buffering (nginx) of the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def creative_channel(creative_id: Any) -> str:
+    return f"progress:creative:{creative_id}"
+
+
+def batch_channel(job_id: Any) -> str:
+    return f"progress:batch:{job_id}"
+
+
+def rescore_channel(job_id: Any) -> str:
+    return f"progress:rescore:{job_id}"
+
+
+class ProgressBus:
+    """
+    Publish/subscribe for progress events, delivered in-process.
+    
+    This is the local backend: enough when the analysis runs in the API
+    process (ANALYSIS_QUEUE_BACKEND=inline, batch jobs). Publishing never
+    raises; progress is best effort and must not fail an analysis.
+    """
+    
+    name = "local"
+    
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+    
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        event = {**event, "ts": round(time.time(), 3)}
+        try:
+            await self._send(channel, event)
+        except Exception as e:
+            logger.warning("progress_publish_failed", channel=channel, error=str(e))
+    
+    async def _send(self, channel: str, event: Dict[str, Any]):
+        self._deliver(channel, event)
+    
+    def _deliver(self, channel: str, event: Dict[str, Any]):
+        for queue in self._queues.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+    
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """Queue receiving the channel's events while the block is open."""
+        queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        subscribers = self._queues.setdefault(channel, set())
+        subscribers.add(queue)
+        if len(subscribers) == 1:
+            await self._listen(channel)
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers and self._queues.get(channel) is subscribers:
+                del self._queues[channel]
+                await self._unlisten(channel)
+    
+    async def _listen(self, channel: str):
+        pass
+    
+    async def _unlisten(self, channel: str):
+        pass
+
+
+class RedisProgressBus(ProgressBus):
+    """Events go through Redis pub/sub, so any process can publish or subscribe."""
+    
+    name = "redis"
+    
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(url)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+        # Concurrent (un)subscribes would each open the pubsub connection
+        self._subscribe_lock = asyncio.Lock()
+    
+    async def _send(self, channel: str, event: Dict[str, Any]):
+        await self.client.publish(channel, json.dumps(event, default=str))
+    
+    async def _listen(self, channel: str):
+        async with self._subscribe_lock:
+            await self._pubsub.subscribe(channel)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read(), name="progress-reader")
+    
+    async def _unlisten(self, channel: str):
+        try:
+            async with self._subscribe_lock:
+                await self._pubsub.unsubscribe(channel)
+        except Exception as e:
+            logger.warning("progress_unsubscribe_failed", channel=channel, error=str(e))
+    
+    async def _read(self):
+        """Fan messages from the shared subscription out to local streams."""
+        while self._queues:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                logger.warning("progress_reader_failed", error=str(e))
+                await asyncio.sleep(1.0)
+                continue
+            if message and message["type"] == "message":
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                self._deliver(channel, json.loads(message["data"]))
+
+
+# Queues and the Redis connection are loop-bound, so one bus per event loop
+_buses: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ProgressBus]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_progress_bus() -> ProgressBus:
+    """Progress bus for the running event loop, from PROGRESS_BACKEND."""
+    loop = asyncio.get_running_loop()
+    bus = _buses.get(loop)
+    if bus is None:
+        backend_name = settings.PROGRESS_BACKEND.lower()
+        if backend_name == "redis":
+            bus = RedisProgressBus(settings.REDIS_URL)
+        elif backend_name == "local":
+            bus = ProgressBus()
+        else:
+            raise ValueError(f"Unknown PROGRESS_BACKEND: {settings.PROGRESS_BACKEND}")
+        _buses[loop] = bus
+    return bus
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_events(
+    channel: str,
+    snapshot: Callable[[], Awaitable[Dict[str, Any]]]
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events body for one channel.
+    
+    `snapshot` returns the current state as a "status" event with a `done`
+    flag. It is sent first (subscribing before reading it, so nothing falls
+    in between) and re-checked on every heartbeat, so a missed terminal
+    event cannot leave the stream open forever.
+    """
+    bus = get_progress_bus()
+    async with bus.subscribe(channel) as queue:
+        state = await snapshot()
+        yield format_sse("status", state)
+        if state.get("done"):
+            return
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.PROGRESS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                state = await snapshot()
+                if state.get("done"):
+                    yield format_sse("status", state)
+                    return
+                yield ": keepalive\n\n"
+                continue
+            
+            yield format_sse(event.get("event", "message"), event)
+            if event.get("event") in TERMINAL_EVENTS:
+                return
@@ -0,0 +1,162 @@
+"""
+Quantile Sketch - Mergeable t-digest for streaming percentiles.
+A digest keeps about a hundred weighted centroids, small near the tails and
+larger around the median, so p25-p90 stay accurate to a fraction of a
+percentile while memory stays constant. Digests built on different workers
+or partitions merge into one; count, mean and variance are tracked exactly
+alongside (Chan's parallel update).
+"""
+import math
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 200
+# Values are buffered and compressed in batches of this many x compression
+BUFFER_FACTOR = 5
+
+
+class TDigest:
+    """
+    Merging t-digest with the k1 (arcsine) scale function, compressed in
+    NumPy: sorted points are cut into centroids wherever the scale function
+    crosses an integer, so each centroid spans at most one unit of k.
+    """
+    
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer: List[float] = []
+        self._count = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    # ---- updates ----
+    
+    def add(self, value: float):
+        self._buffer.append(value)
+        if len(self._buffer) >= BUFFER_FACTOR * self.compression:
+            self._flush_buffer()
+    
+    def update(self, values: Iterable[float]):
+        values = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=float)
+        self._absorb(values, np.ones(len(values)))
+    
+    def merge(self, other: "TDigest"):
+        """Fold another digest into this one."""
+        other._flush_buffer()
+        self._flush_buffer()
+        if not other._count:
+            return
+        self._combine_moments(other._count, other._mean, other._m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self._means, other._means]), np.concatenate([self._weights, other._weights]))
+    
+    def _flush_buffer(self):
+        if self._buffer:
+            values = np.asarray(self._buffer, dtype=float)
+            self._buffer = []
+            self._absorb(values, np.ones(len(values)))
+    
+    def _absorb(self, values: np.ndarray, weights: np.ndarray):
+        finite = np.isfinite(values)
+        values, weights = values[finite], weights[finite]
+        if not len(values):
+            return
+        count = float(weights.sum())
+        mean = float(np.dot(values, weights) / count)
+        m2 = float(np.dot((values - mean) ** 2, weights))
+        self._combine_moments(count, mean, m2)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self._means, values]), np.concatenate([self._weights, weights]))
+    
+    def _combine_moments(self, count: float, mean: float, m2: float):
+        total = self._count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta * delta * self._count * count / total
+        self._count = total
+    
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        
+        self._weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / self._weights
+    
+    # ---- queries ----
+    
+    @property
+    def count(self) -> int:
+        self._flush_buffer()
+        return int(round(self._count))
+    
+    @property
+    def mean(self) -> float:
+        self._flush_buffer()
+        return self._mean
+    
+    @property
+    def std_dev(self) -> float:
+        self._flush_buffer()
+        return math.sqrt(self._m2 / self._count) if self._count else 0.0
+    
+    def _curve(self):
+        """(value, cumulative weight) knots the quantile function interpolates between."""
+        self._flush_buffer()
+        centers = np.cumsum(self._weights) - self._weights / 2
+        return np.r_[self.min, self._means, self.max], np.r_[0.0, centers, self._count]
+    
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0-1); nan when empty."""
+        if not self.count:
+            return math.nan
+        values, ranks = self._curve()
+        return float(np.interp(q * self._count, ranks, values))
+    
+    def cdf(self, value: float) -> float:
+        """Share of the data at or below value (0-1); nan when empty."""
+        if not self.count:
+            return math.nan
+        values, ranks = self._curve()
+        return float(np.interp(value, values, ranks) / self._count)
+    
+    def __len__(self) -> int:
+        return len(self._means) + len(self._buffer)
+    
+    # ---- serialisation (JSON-safe) ----
+    
+    def to_dict(self) -> Dict[str, Any]:
+        self._flush_buffer()
+        return {
+            "compression": self.compression,
+            "means": self._means.tolist(),
+            "weights": self._weights.tolist(),
+            "count": self._count,
+            "mean": self._mean,
+            "m2": self._m2,
+            "min": self.min if self._count else None,
+            "max": self.max if self._count else None,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        digest = cls(data.get("compression", DEFAULT_COMPRESSION))
+        digest._means = np.asarray(data.get("means") or [], dtype=float)
+        digest._weights = np.asarray(data.get("weights") or [], dtype=float)
+        digest._count = float(data.get("count") or 0)
+        digest._mean = float(data.get("mean") or 0)
+        digest._m2 = float(data.get("m2") or 0)
+        if digest._count:
+            digest.min, digest.max = float(data["min"]), float(data["max"])
+        return digest
@@ -0,0 +1,354 @@
+"""
+Bulk Rescore - Recompute stored scores of a whole brand or campaign.
+When pillar weights or benchmarks change, every analysed creative is
+rescored from the layer signals kept in CreativeAnalysis, without image
+analysis or LLM calls. Creatives are read in keyset-paginated chunks (by
+id) and scored with the compiled batch scorer. Creatives whose headline or
+pillar scores changed then go through the same scoring and recommendation
+stages as a per-creative rescore, and their scores, pillars,
+recommendations and signal percentiles are written back in bulk. Each
+chunk commits together with the job's checkpoint, so an interrupted job
+resumes where it stopped and never holds more than one chunk in memory.
+"""
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from fastapi import BackgroundTasks
+from sqlalchemy import select, update, func, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import (
+    Brand, Campaign, Creative, CreativeAnalysis, CreativeStatus, ScorePillar, Recommendation, RescoreJob
+)
+from app.services.benchmark_index import get_benchmark_index
+from app.services.orchestrator import SIGNAL_LAYERS
+from app.services.progress import get_progress_bus, rescore_channel
+
+logger = structlog.get_logger()
+
+# A processing job whose checkpoint has not moved for this long was interrupted
+STALE_AFTER = timedelta(minutes=5)
+
+
+def job_status(job: RescoreJob) -> Dict[str, Any]:
+    """Job progress with throughput."""
+    elapsed = None
+    throughput = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            throughput = round(job.processed / elapsed * 60, 2)
+    
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "scope": {
+            "brand_id": str(job.brand_id) if job.brand_id else None,
+            "campaign_id": str(job.campaign_id) if job.campaign_id else None,
+        },
+        "total": job.total,
+        "processed": job.processed,
+        "updated": job.updated,
+        "skipped": job.skipped,
+        "error": job.error,
+        "elapsed_ms": int(elapsed * 1000) if elapsed is not None else None,
+        "throughput_per_minute": throughput,
+    }
+
+
+def is_resumable(job: RescoreJob) -> bool:
+    """Failed jobs, and processing jobs whose runner went away."""
+    if job.status == "failed":
+        return True
+    last_progress = job.updated_at or job.created_at
+    return job.status in ("queued", "processing") and datetime.utcnow() - last_progress > STALE_AFTER
+
+
+def _scope_filter(job: RescoreJob):
+    if job.campaign_id:
+        return Creative.campaign_id == job.campaign_id
+    return Campaign.brand_id == job.brand_id
+
+
+async def create_rescore_job(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    brand_id: Optional[uuid.UUID] = None,
+    campaign_id: Optional[uuid.UUID] = None
+) -> RescoreJob:
+    """Record a job over the scope's analysed creatives; ownership is checked by the caller."""
+    job = RescoreJob(user_id=user_id, brand_id=brand_id, campaign_id=campaign_id, status="queued")
+    job.total = await db.scalar(
+        select(func.count(Creative.id))
+        .join(Campaign, Creative.campaign_id == Campaign.id)
+        .where(_scope_filter(job), Creative.status == CreativeStatus.COMPLETED)
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def enqueue_rescore(job: RescoreJob, background_tasks: Optional[BackgroundTasks] = None):
+    """Run the job on the bulk Celery queue, or in-process with ANALYSIS_QUEUE_BACKEND=inline."""
+    job_id = str(job.id)
+    if settings.ANALYSIS_QUEUE_BACKEND == "inline":
+        if background_tasks is None:
+            raise RuntimeError("Inline rescore needs BackgroundTasks")
+        background_tasks.add_task(_run_inline, job_id)
+    else:
+        from app.workers.tasks import rescore_job_task
+        await asyncio.to_thread(rescore_job_task.delay, job_id)
+    logger.info("rescore_queued", job_id=job_id, total=job.total)
+
+
+async def _run_inline(job_id: str):
+    # The job is already marked failed; log instead of surfacing a server error
+    try:
+        await run_rescore_job(job_id)
+    except Exception:
+        logger.exception("inline_rescore_failed", job_id=job_id)
+
+
+@dataclass
+class ChunkResult:
+    # Creatives whose scores changed: analyzed_at as read, and their new rows
+    rescored: Dict[uuid.UUID, Dict[str, Any]]
+    skipped: int
+
+
+def _rescored_rows(row: Any, signals: Dict[str, Dict], context: Tuple[str, str, str], reference: Any) -> Dict[str, Any]:
+    """The per-creative rescore's scoring and recommendation stages, as rows to write."""
+    from app.services.persistence import (
+        score_pillar_rows, recommendation_rows, signal_percentile_rows
+    )
+    from app.services.scoring.recommendation_engine import generate_recommendations
+    from app.services.scoring.three_layer_engine import score_creative_three_layer
+    
+    score = score_creative_three_layer(
+        signals, *context, benchmarks=reference.benchmarks, weights=reference.pillar_weights
+    )
+    result = {
+        "score": score,
+        "recommendations": generate_recommendations(signals, score.get("pillars", []), benchmarks=reference.benchmarks),
+    }
+    return {
+        "analyzed_at": row.analyzed_at,
+        "creative": {
+            "b_id": row.id,
+            "b_final_score": score.get("overall_score"),
+            "b_score_confidence": (score.get("confidence_band") or [0, 0])[0],
+            "b_funnel_fit_score": score.get("funnel_fit_score"),
+            "b_platform_fit_score": score.get("platform_fit_score"),
+        },
+        "pillars": score_pillar_rows(row.id, score),
+        "recommendations": recommendation_rows(row.id, result),
+        "percentiles": signal_percentile_rows(row.id, score.get("signal_percentiles")),
+    }
+
+
+def _score_chunk(
+    rows: List[Any],
+    layers: Dict[uuid.UUID, Dict[str, Dict]],
+    old_pillars: Dict[uuid.UUID, Dict[str, float]]
+) -> ChunkResult:
+    """
+    Score a chunk per (category, platform, funnel_stage) context with the
+    batch scorer and fully rescore the creatives whose scores changed.
+    CPU-bound; runs in a thread.
+    """
+    from app.services.scoring.batch_scoring import score_batch
+    from app.services.scoring.cognitive_sim import simulate_cognition
+    
+    index = get_benchmark_index()
+    by_context: Dict[Tuple[str, str, str], List[Tuple[Any, Dict[str, Dict]]]] = defaultdict(list)
+    skipped = 0
+    for row in rows:
+        stored = layers.get(row.id, {})
+        if "opencv" not in stored or "ocr" not in stored:
+            skipped += 1
+            continue
+        # Same sources, in the same order, as the orchestrator's rescore
+        all_signals = {source: stored.get(source, {}) for source in SIGNAL_LAYERS}
+        all_signals["cognitive"] = simulate_cognition(
+            all_signals["opencv"], all_signals["ocr"], all_signals["vision"]
+        ).get("signals", {})
+        context = (row.category or "general", row.platform or "general", row.funnel_stage or "awareness")
+        by_context[context].append((row, all_signals))
+    
+    rescored = {}
+    for context, members in by_context.items():
+        reference = index.resolve(*context)
+        scores = score_batch(
+            [signals for _, signals in members], *context,
+            benchmarks=reference.benchmarks, weights=reference.pillar_weights
+        )
+        for i, (row, signals) in enumerate(members):
+            pillars = {name: float(scores.pillar_scores[i, p]) for p, name in enumerate(scores.pillar_names)}
+            if (
+                float(scores.overall_score[i]) != row.final_score
+                or float(scores.confidence_band[i, 0]) != row.score_confidence
+                or pillars != old_pillars.get(row.id, {})
+            ):
+                rescored[row.id] = _rescored_rows(row, signals, context, reference)
+    
+    return ChunkResult(rescored=rescored, skipped=skipped)
+
+
+async def _next_chunk(db: AsyncSession, job: RescoreJob) -> List[Any]:
+    """The next page of analysed creatives after the checkpoint, in id order."""
+    query = (
+        select(
+            Creative.id, Creative.final_score, Creative.score_confidence, Creative.analyzed_at,
+            Brand.category, Campaign.platform, Campaign.funnel_stage
+        )
+        .join(Campaign, Creative.campaign_id == Campaign.id)
+        .join(Brand, Campaign.brand_id == Brand.id)
+        .where(_scope_filter(job), Creative.status == CreativeStatus.COMPLETED)
+        .order_by(Creative.id)
+        .limit(settings.RESCORE_CHUNK_SIZE)
+    )
+    if job.last_creative_id:
+        query = query.where(Creative.id > job.last_creative_id)
+    return (await db.execute(query)).all()
+
+
+async def _rescore_chunk(db: AsyncSession, rows: List[Any]) -> Tuple[int, int]:
+    """Score one chunk and write the changes in the session's transaction; returns (updated, skipped)."""
+    from app.services.persistence import replace_rows, update_signal_percentiles
+    
+    ids = [row.id for row in rows]
+    
+    layers: Dict[uuid.UUID, Dict[str, Dict]] = defaultdict(dict)
+    result = await db.execute(
+        select(CreativeAnalysis.creative_id, CreativeAnalysis.analysis_type, CreativeAnalysis.signals_extracted)
+        .where(CreativeAnalysis.creative_id.in_(ids), CreativeAnalysis.analysis_type.in_(SIGNAL_LAYERS))
+    )
+    for creative_id, source, signals in result:
+        layers[creative_id][source] = signals or {}
+    
+    old_pillars: Dict[uuid.UUID, Dict[str, float]] = defaultdict(dict)
+    result = await db.execute(
+        select(ScorePillar.creative_id, ScorePillar.pillar_name, ScorePillar.score)
+        .where(ScorePillar.creative_id.in_(ids))
+    )
+    for creative_id, name, score in result:
+        old_pillars[creative_id][name] = score
+    
+    chunk = await asyncio.to_thread(_score_chunk, rows, layers, old_pillars)
+    if not chunk.rescored:
+        return 0, chunk.skipped
+    
+    # A creative reanalysed since it was read keeps its new results; the row
+    # locks (PostgreSQL) hold off a reanalysis until this chunk commits
+    result = await db.execute(
+        select(Creative.id, Creative.analyzed_at)
+        .where(Creative.id.in_(list(chunk.rescored)))
+        .with_for_update()
+    )
+    current = [
+        chunk.rescored[creative_id] for creative_id, analyzed_at in result
+        if analyzed_at == chunk.rescored[creative_id]["analyzed_at"]
+    ]
+    if not current:
+        return 0, chunk.skipped
+    current_ids = [rescored["creative"]["b_id"] for rescored in current]
+    
+    creatives = Creative.__table__
+    conn = await db.connection()
+    await conn.execute(
+        update(creatives)
+        .where(creatives.c.id == bindparam("b_id"))
+        .values(
+            final_score=bindparam("b_final_score"),
+            score_confidence=bindparam("b_score_confidence"),
+            funnel_fit_score=bindparam("b_funnel_fit_score"),
+            platform_fit_score=bindparam("b_platform_fit_score"),
+        ),
+        [rescored["creative"] for rescored in current]
+    )
+    await replace_rows(db, current_ids, [
+        (ScorePillar, [r for rescored in current for r in rescored["pillars"]]),
+        (Recommendation, [r for rescored in current for r in rescored["recommendations"]]),
+    ])
+    await update_signal_percentiles(db, current_ids, [r for rescored in current for r in rescored["percentiles"]])
+    return len(current), chunk.skipped
+
+
+async def run_rescore_job(job_id: str, time_budget: Optional[float] = None) -> bool:
+    """
+    Rescore a job's creatives from its checkpoint on.
+    
+    Returns False when `time_budget` seconds ran out with creatives left;
+    calling again continues from the checkpoint.
+    """
+    from app.core.database import AsyncSessionLocal
+    
+    bus = get_progress_bus()
+    channel = rescore_channel(job_id)
+    started = time.monotonic()
+    
+    async with AsyncSessionLocal() as db:
+        job = await db.get(RescoreJob, uuid.UUID(job_id))
+        if job is None:
+            logger.error("rescore_job_not_found", job_id=job_id)
+            return True
+        if job.status == "completed":
+            return True
+        
+        job.status = "processing"
+        job.error = None
+        job.started_at = job.started_at or datetime.utcnow()
+        job.finished_at = None
+        await db.commit()
+        await bus.publish(channel, {"event": "processing", **job_status(job)})
+        
+        try:
+            while True:
+                rows = await _next_chunk(db, job)
+                if not rows:
+                    break
+                
+                updated, skipped = await _rescore_chunk(db, rows)
+                job.last_creative_id = rows[-1].id
+                job.processed += len(rows)
+                job.updated += updated
+                job.skipped += skipped
+                await db.commit()
+                await bus.publish(channel, {"event": "progress", **job_status(job)})
+                
+                if time_budget is not None and time.monotonic() - started > time_budget:
+                    logger.info("rescore_paused", job_id=job_id, processed=job.processed)
+                    return False
+            
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+        
+        except Exception as e:
+            logger.error("rescore_failed", job_id=job_id, error=str(e))
+            # Scores and checkpoint of the failed chunk roll back together
+            await db.rollback()
+            await db.refresh(job)
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            await bus.publish(channel, {"event": "failed", **job_status(job)})
+            raise
+        
+        stats = job_status(job)
+        await bus.publish(channel, {"event": "completed", **stats})
+        logger.info("rescore_complete",
+                   job_id=job_id,
+                   processed=stats["processed"],
+                   updated=stats["updated"],
+                   skipped=stats["skipped"],
+                   throughput_per_minute=stats["throughput_per_minute"])
+        return True
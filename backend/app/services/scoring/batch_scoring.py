@@ -0,0 +1,357 @@
+"""
+Batch Scoring - ThreeLayerScoringEngine compiled for whole libraries.
+PILLAR_DEFINITIONS are compiled once into a (signals x pillars) weight
+matrix with direction and layer masks, and creatives are scored as a
+(creatives x signals) matrix with NumPy: one vector operation per weighted
+signal instead of dicts and dataclasses per signal per creative. Sums are
+accumulated in the same order as the per-creative engine, so scores are
+bit-identical to score_creative_three_layer.
+
+Only the numbers are produced here; explanations, warnings and decision
+summaries remain per creative.
+"""
+import numbers
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.scoring.three_layer_engine import (
+    PILLAR_DEFINITIONS, SOURCE_LAYERS, EXPECTED_LAYER_SIGNALS,
+    SignalLayer, ConfidenceLevel, pillar_weights, pillar_category_average
+)
+
+LAYERS = list(SignalLayer)
+# Confidence codes 0/1/2 -> level
+CONFIDENCE_LEVELS = np.array([ConfidenceLevel.LOW.value, ConfidenceLevel.MEDIUM.value, ConfidenceLevel.HIGH.value])
+
+
+@dataclass(frozen=True)
+class CompiledPillars:
+    """PILLAR_DEFINITIONS as arrays; signals are the union of every pillar's targets."""
+    signal_names: Tuple[str, ...]
+    pillar_names: Tuple[str, ...]
+    weights: np.ndarray  # (signals, pillars), 0 where the pillar does not use the signal
+    negative: np.ndarray  # (signals, pillars), True where lower is better
+    layers: np.ndarray  # (signals, pillars), index into LAYERS the pillar files the signal under
+    targets: Tuple[Tuple[int, ...], ...]  # per pillar, signal indices in definition order
+    benchmarks: Tuple[Dict[str, float], ...]  # per pillar, category -> benchmark
+    
+    @property
+    def columns(self) -> Dict[str, int]:
+        return {name: i for i, name in enumerate(self.signal_names)}
+
+
+def compile_pillars(definitions: Dict[str, Dict] = None) -> CompiledPillars:
+    definitions = definitions or PILLAR_DEFINITIONS
+    signal_names: List[str] = []
+    for definition in definitions.values():
+        for name in definition["target_signals"]:
+            if name not in signal_names:
+                signal_names.append(name)
+    columns = {name: i for i, name in enumerate(signal_names)}
+    layer_index = {layer.value: i for i, layer in enumerate(LAYERS)}
+    
+    shape = (len(signal_names), len(definitions))
+    weights = np.zeros(shape)
+    negative = np.zeros(shape, dtype=bool)
+    layers = np.zeros(shape, dtype=np.int8)
+    targets = []
+    for p, definition in enumerate(definitions.values()):
+        indices = []
+        for name, config in definition["target_signals"].items():
+            s = columns[name]
+            weights[s, p] = config["weight"]
+            negative[s, p] = config.get("direction") == "negative"
+            layers[s, p] = layer_index[config["layer"]]
+            indices.append(s)
+        targets.append(tuple(indices))
+    
+    for arr in (weights, negative, layers):
+        arr.flags.writeable = False
+    return CompiledPillars(
+        signal_names=tuple(signal_names),
+        pillar_names=tuple(definitions),
+        weights=weights,
+        negative=negative,
+        layers=layers,
+        targets=tuple(targets),
+        benchmarks=tuple(dict(d.get("benchmarks", {})) for d in definitions.values()),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_compiled_pillars() -> CompiledPillars:
+    """PILLAR_DEFINITIONS, compiled once per process."""
+    return compile_pillars(PILLAR_DEFINITIONS)
+
+
+@dataclass
+class SignalMatrix:
+    """Scoreable signals of many creatives, flattened like ThreeLayerScoringEngine does."""
+    values: np.ndarray  # (creatives, signals), NaN where missing
+    confidence: np.ndarray  # (creatives, signals)
+    layer_counts: np.ndarray  # (creatives, layers), every scoreable signal, targeted or not
+    
+    @classmethod
+    def from_signals(
+        cls, signal_sets: Sequence[Dict[str, Dict]], compiled: CompiledPillars
+    ) -> "SignalMatrix":
+        """
+        One row per `all_signals` dict ({source: {name: signal}}). A name seen
+        in several sources keeps the last scoreable one, with that source's layer.
+        """
+        columns = compiled.columns
+        source_layers = {source: LAYERS.index(layer) for source, layer in SOURCE_LAYERS.items()}
+        default_layer = LAYERS.index(SignalLayer.DETERMINISTIC)
+        
+        n = len(signal_sets)
+        values = np.full((n, len(columns)), np.nan)
+        confidence = np.ones((n, len(columns)))
+        layer_counts = np.zeros((n, len(LAYERS)), dtype=np.int64)
+        
+        for row, all_signals in enumerate(signal_sets):
+            classified: Dict[str, int] = {}
+            for source, signals in all_signals.items():
+                layer = source_layers.get(source, default_layer)
+                for name, data in signals.items():
+                    if isinstance(data, dict):
+                        value = data.get("value", 0)
+                        if data.get("unit") == "boolean":
+                            value = value * 100 if value else 0
+                        signal_confidence = data.get("confidence", 1.0)
+                    else:
+                        value = data
+                        signal_confidence = 1.0
+                    if not isinstance(value, numbers.Real):
+                        continue
+                    
+                    classified[name] = layer
+                    col = columns.get(name)
+                    if col is not None:
+                        values[row, col] = value
+                        confidence[row, col] = signal_confidence
+            
+            for layer in classified.values():
+                layer_counts[row, layer] += 1
+        
+        return cls(values=values, confidence=confidence, layer_counts=layer_counts)
+
+
+@dataclass
+class BatchScores:
+    """Per-creative results of score_matrix, row-aligned with its input."""
+    pillar_names: Tuple[str, ...]
+    overall_score: np.ndarray  # (creatives,)
+    confidence: np.ndarray  # (creatives,) "high" / "medium" / "low"
+    confidence_band: np.ndarray  # (creatives, 2)
+    data_quality: np.ndarray  # (creatives,)
+    pillar_scores: np.ndarray  # (creatives, pillars)
+    pillar_confidence: np.ndarray  # (creatives, pillars)
+    vs_category_avg: np.ndarray  # (creatives, pillars)
+    contradictions: np.ndarray  # (creatives,) pillars whose layers diverge
+    
+    def __len__(self) -> int:
+        return len(self.overall_score)
+    
+    def row(self, i: int) -> Dict[str, Any]:
+        """The numeric part of score_creative_three_layer's result for creative `i`."""
+        return {
+            "overall_score": float(self.overall_score[i]),
+            "confidence": str(self.confidence[i]),
+            "confidence_band": (float(self.confidence_band[i, 0]), float(self.confidence_band[i, 1])),
+            "data_quality": float(self.data_quality[i]),
+            "pillars": [
+                {
+                    "name": name,
+                    "score": float(self.pillar_scores[i, p]),
+                    "confidence": str(self.pillar_confidence[i, p]),
+                    "vs_category_avg": float(self.vs_category_avg[i, p]),
+                }
+                for p, name in enumerate(self.pillar_names)
+            ]
+        }
+
+
+def _round(x: np.ndarray, digits: int) -> np.ndarray:
+    """
+    Python's round(x, digits) on floats, elementwise; np.round (what round()
+    does on NumPy scalars) differs on some ties.
+    """
+    out = np.round(x, digits)
+    scaled = x * 10 ** digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        out[near_tie] = [round(float(v), digits) for v in x[near_tie]]
+    return out
+
+
+def _row_means(compact: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    np.mean of each row's first `counts` values, summed in NumPy's order
+    (sequential below 8 values, 8-way pairwise from 8), so results match
+    np.mean over the same list exactly.
+    """
+    n_rows, width = compact.shape
+    sequential = np.zeros(n_rows)
+    for j in range(width):
+        sequential += np.where(j < counts, compact[:, j], 0.0)
+    if width < 8:
+        return sequential / np.maximum(counts, 1)
+    
+    unrolled_end = counts - counts % 8
+    partial = [compact[:, j].copy() for j in range(8)]
+    for i in range(8, width - 7, 8):
+        for j in range(8):
+            partial[j] += np.where(i + j < unrolled_end, compact[:, i + j], 0.0)
+    pairwise = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + (
+        (partial[4] + partial[5]) + (partial[6] + partial[7])
+    )
+    for i in range(8, width):
+        pairwise += np.where((i >= unrolled_end) & (i < counts), compact[:, i], 0.0)
+    return np.where(counts >= 8, pairwise, sequential) / np.maximum(counts, 1)
+
+
+def score_matrix(
+    matrix: SignalMatrix,
+    compiled: CompiledPillars = None,
+    category: str = "general",
+    platform: str = "general",
+    funnel_stage: str = "awareness",
+    benchmarks: Optional[Dict] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> BatchScores:
+    """
+    Three-layer scores for every row of `matrix` in one context;
+    `benchmarks` and `weights` as for ThreeLayerScoringEngine.
+    """
+    compiled = compiled or get_compiled_pillars()
+    n = matrix.values.shape[0]
+    n_pillars = len(compiled.pillar_names)
+    
+    present = ~np.isnan(matrix.values)
+    clipped = np.clip(np.nan_to_num(matrix.values), 0, 100)
+    
+    raw_scores = np.empty((n, n_pillars))
+    confidence_scores = np.empty((n, n_pillars))
+    completeness = np.empty((n, n_pillars))
+    contradiction_count = np.zeros(n, dtype=np.int64)
+    any_matched = np.zeros(n, dtype=bool)
+    
+    for p, targets in enumerate(compiled.targets):
+        layer_sums = np.zeros((len(LAYERS), n))
+        layer_hits = np.zeros((len(LAYERS), n), dtype=np.int64)
+        weight_sum = np.zeros(n)
+        matched = np.zeros(n, dtype=np.int64)
+        
+        for s in targets:
+            hit = present[:, s]
+            weight = compiled.weights[s, p]
+            value = 100 - clipped[:, s] if compiled.negative[s, p] else clipped[:, s]
+            layer = compiled.layers[s, p]
+            layer_sums[layer] += np.where(hit, value * weight, 0.0)
+            layer_hits[layer] += hit
+            weight_sum += np.where(hit, weight, 0.0)
+            matched += hit
+        
+        total = layer_sums[0] + layer_sums[1] + layer_sums[2]
+        raw_scores[:, p] = np.where(
+            matched > 0, total / np.where(weight_sum > 0, weight_sum, 1.0), 50.0
+        )
+        
+        # Pillar confidence: completeness, layers with data, mean signal confidence
+        completeness[:, p] = matched / len(targets)
+        layers_with_data = (layer_sums > 0).sum(axis=0)
+        hit_stack = present[:, targets]
+        order = np.argsort(~hit_stack, axis=1, kind="stable")
+        compact = np.take_along_axis(matrix.confidence[:, targets], order, axis=1)
+        mean_confidence = _row_means(compact, matched)
+        score = completeness[:, p] * 0.4
+        score += (layers_with_data / 3) * 0.3
+        confidence_scores[:, p] = np.where(matched > 0, score + mean_confidence * 0.3, score)
+        any_matched |= matched > 0
+        
+        # Deterministic vs AI divergence
+        det_n = layer_hits[0]
+        ai_n = layer_hits[1] + layer_hits[2]
+        both = (det_n > 0) & (ai_n > 0)
+        det_avg = layer_sums[0] / np.maximum(det_n, 1)
+        ai_avg = (layer_sums[1] + layer_sums[2]) / np.maximum(ai_n, 1)
+        contradiction_count += both & (np.abs(det_avg - ai_avg) > 25)
+    
+    pillar_scores = _round(raw_scores, 1)
+    pillar_levels = np.where(confidence_scores >= 0.75, 2, np.where(confidence_scores >= 0.5, 1, 0))
+    averages = np.array([
+        pillar_category_average(name, category, benchmarks or {}, defaults)
+        for name, defaults in zip(compiled.pillar_names, compiled.benchmarks)
+    ], dtype=float)
+    vs_category_avg = _round(raw_scores - averages, 1)
+    
+    # Weighted final score and confidence band, from the rounded pillar scores
+    weights = weights or pillar_weights(funnel_stage, platform)
+    overall = np.zeros(n)
+    lower = np.zeros(n)
+    upper = np.zeros(n)
+    for p, name in enumerate(compiled.pillar_names):
+        w = weights.get(name, 0.15)
+        uncertainty = (1 - confidence_scores[:, p]) * 10
+        overall += pillar_scores[:, p] * w
+        lower += (pillar_scores[:, p] - uncertainty) * w
+        upper += (pillar_scores[:, p] + uncertainty) * w
+    
+    # Data quality: layer coverage, pillar completeness, pillar confidence
+    coverage = np.zeros(n)
+    for i, layer in enumerate(LAYERS):
+        coverage += np.minimum(1.0, matrix.layer_counts[:, i] / EXPECTED_LAYER_SIGNALS.get(layer, 10))
+    mean_completeness = np.zeros(n)
+    mean_confidence = np.zeros(n)
+    for p in range(n_pillars):
+        mean_completeness += completeness[:, p]
+        mean_confidence += confidence_scores[:, p]
+    data_quality = (
+        coverage / len(LAYERS) * 0.4
+        + mean_completeness / n_pillars * 0.4
+        + mean_confidence / n_pillars * 0.2
+    )
+    
+    low_pillars = (pillar_levels == 0).sum(axis=1)
+    level = np.where(
+        low_pillars >= 3, 0,
+        np.where((data_quality >= 0.75) & (contradiction_count == 0), 2,
+                 np.where(data_quality >= 0.5, 1, 0))
+    )
+    
+    # The per-creative band is a NumPy scalar once any pillar has a mean
+    # signal confidence, and data quality always is; round() then rounds as
+    # np.round does
+    band = np.stack([np.maximum(0, lower), np.minimum(100, upper)], axis=1)
+    band = np.where(any_matched[:, None], np.round(band, 1), _round(band, 1))
+    
+    return BatchScores(
+        pillar_names=compiled.pillar_names,
+        overall_score=_round(overall, 1),
+        confidence=CONFIDENCE_LEVELS[level],
+        confidence_band=band,
+        data_quality=np.round(data_quality, 2),
+        pillar_scores=pillar_scores,
+        pillar_confidence=CONFIDENCE_LEVELS[pillar_levels],
+        vs_category_avg=vs_category_avg,
+        contradictions=contradiction_count,
+    )
+
+
+def score_batch(
+    signal_sets: Sequence[Dict[str, Dict]],
+    category: str = "general",
+    platform: str = "general",
+    funnel_stage: str = "awareness",
+    benchmarks: Optional[Dict] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> BatchScores:
+    """Score many creatives' `all_signals` dicts in one context."""
+    compiled = get_compiled_pillars()
+    return score_matrix(
+        SignalMatrix.from_signals(signal_sets, compiled), compiled,
+        category, platform, funnel_stage, benchmarks, weights
+    )
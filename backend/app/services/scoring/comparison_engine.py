@@ -17,6 +17,14 @@ class ComparisonResult:
     score_delta: float
 
 
+@dataclass
+class RankingResult:
+    ranking: List[Dict[str, Any]]  # best first: label, rank, overall_score, pillars
+    winner: str  # label, or 'tie' when the top two are within the threshold
+    pillar_leaders: Dict[str, str]  # pillar -> label or 'tie'
+    recommendation: str
+
+
 class ComparisonEngine:
     """Compare creatives and generate insights."""
     
@@ -84,6 +92,81 @@ class ComparisonEngine:
             score_delta=abs(score_delta)
         )
     
+    def rank(self, creatives: Dict[str, Dict[str, Any]]) -> RankingResult:
+        """
+        Rank any number of creative scores, keyed by variant label.
+        
+        Variants are ordered by overall score; a pillar is led by a variant
+        only when it beats the runner-up on that pillar by the significance
+        threshold.
+        """
+        ordered = sorted(
+            creatives.items(),
+            key=lambda item: item[1].get("overall_score", 0),
+            reverse=True
+        )
+        
+        ranking = []
+        for rank, (label, scores) in enumerate(ordered, start=1):
+            ranking.append({
+                "label": label,
+                "rank": rank,
+                "overall_score": scores.get("overall_score", 0),
+                "pillars": {p["name"]: p["score"] for p in scores.get("pillars", [])}
+            })
+        
+        # Pillar leaders
+        pillar_leaders = {}
+        all_pillars = set().union(*(entry["pillars"].keys() for entry in ranking))
+        for pillar in sorted(all_pillars):
+            by_pillar = sorted(
+                ((entry["pillars"].get(pillar, 50), entry["label"]) for entry in ranking),
+                reverse=True
+            )
+            if len(by_pillar) > 1 and by_pillar[0][0] - by_pillar[1][0] < self.SIGNIFICANCE_THRESHOLD:
+                pillar_leaders[pillar] = "tie"
+            else:
+                pillar_leaders[pillar] = by_pillar[0][1]
+        
+        # Overall winner
+        winner = ranking[0]["label"] if ranking else "tie"
+        if len(ranking) > 1:
+            if ranking[0]["overall_score"] - ranking[1]["overall_score"] < self.SIGNIFICANCE_THRESHOLD:
+                winner = "tie"
+        
+        recommendation = self._generate_ranking_recommendation(winner, ranking, pillar_leaders)
+        
+        return RankingResult(
+            ranking=ranking,
+            winner=winner,
+            pillar_leaders=pillar_leaders,
+            recommendation=recommendation
+        )
+    
+    def _generate_ranking_recommendation(
+        self, winner: str, ranking: List[Dict[str, Any]], pillar_leaders: Dict[str, str]
+    ) -> str:
+        """Generate actionable recommendation for a multi-variant ranking."""
+        if not ranking:
+            return "No variants to compare."
+        if len(ranking) == 1:
+            return f"Only Creative {ranking[0]['label']} was scored."
+        
+        if winner == "tie":
+            contenders = [
+                e["label"] for e in ranking
+                if ranking[0]["overall_score"] - e["overall_score"] < self.SIGNIFICANCE_THRESHOLD
+            ]
+            return (f"Variants {', '.join(contenders)} perform similarly. "
+                   f"Choose based on pillar strengths or test them live.")
+        
+        best = ranking[0]
+        led = [p for p, leader in pillar_leaders.items() if leader == winner]
+        advantage = f" Leads on {', '.join(p.replace('_', ' ') for p in led[:2])}." if led else ""
+        return (f"Select Creative {winner} (score: {best['overall_score']:.0f}), "
+               f"{best['overall_score'] - ranking[1]['overall_score']:.0f} points ahead of "
+               f"Creative {ranking[1]['label']}.{advantage}")
+    
     def _generate_recommendation(
         self, winner: str, pillar_winners: Dict, 
         score_a: float, score_b: float,
@@ -158,6 +241,18 @@ class ComparisonEngine:
         return results
 
 
+def rank_creatives(creatives: Dict[str, Dict]) -> Dict[str, Any]:
+    """Convenience function for ranking N variants (label -> score dict)."""
+    engine = ComparisonEngine()
+    result = engine.rank(creatives)
+    return {
+        "winner": result.winner,
+        "ranking": result.ranking,
+        "pillar_leaders": result.pillar_leaders,
+        "recommendation": result.recommendation
+    }
+
+
 def compare_creatives(a: Dict, b: Dict) -> Dict[str, Any]:
     """Convenience function for comparison."""
     engine = ComparisonEngine()
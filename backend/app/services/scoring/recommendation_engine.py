@@ -267,9 +267,11 @@ class RecommendationEngine:
         }
 
 
-def generate_recommendations(signals: Dict, pillars: List, max_recs: int = 5) -> List[Dict]:
+def generate_recommendations(
+    signals: Dict, pillars: List, max_recs: int = 5, benchmarks: Dict[str, Dict] = None
+) -> List[Dict]:
     """Convenience function for generating recommendations."""
-    engine = RecommendationEngine()
+    engine = RecommendationEngine(benchmarks)
     recs = engine.generate(signals, pillars, max_recs)
     return [{
         "priority": r.priority,
@@ -11,6 +11,7 @@ Scoring Philosophy:
 from typing import Dict, Any, List, Tuple, Optional
 from dataclasses import dataclass, field
 from enum import Enum
+import numbers
 import numpy as np
 import structlog
 
@@ -42,6 +43,7 @@ class MicroSignal:
     confidence: float = 1.0
     unit: str = "score"
     raw_data: Any = None
+    benchmark_percentile: Optional[float] = None
 
 
 @dataclass
@@ -81,6 +83,7 @@ class FinalScoreResult:
     warnings: List[str]
     contradictions: List[str]
     data_quality_score: float
+    signal_percentiles: Dict[str, float] = field(default_factory=dict)
 
 
 # ============== PILLAR DEFINITIONS (5-12 signals each) ==============
@@ -173,6 +176,104 @@ PILLAR_DEFINITIONS = {
 }
 
 
+# Layer of each signal source (unknown sources count as deterministic)
+SOURCE_LAYERS = {
+    "opencv": SignalLayer.DETERMINISTIC,
+    "ocr": SignalLayer.DETERMINISTIC,
+    "vision": SignalLayer.PERCEPTUAL,
+    "copy": SignalLayer.COGNITIVE,
+    "cognitive": SignalLayer.COGNITIVE,
+}
+
+# Signals per layer for full coverage
+EXPECTED_LAYER_SIGNALS = {
+    SignalLayer.DETERMINISTIC: 20,
+    SignalLayer.PERCEPTUAL: 10,
+    SignalLayer.COGNITIVE: 8
+}
+
+# Pillar weights in the final score, before context adjustments
+BASE_PILLAR_WEIGHTS = {
+    "attention_capture": 0.18,
+    "brand_presence": 0.15,
+    "message_clarity": 0.20,
+    "emotional_resonance": 0.15,
+    "cultural_relevance": 0.15,
+    "action_motivation": 0.17
+}
+
+# Funnel stage adjustments
+FUNNEL_WEIGHT_MODIFIERS = {
+    "awareness": {"attention_capture": 1.3, "action_motivation": 0.7},
+    "consideration": {"message_clarity": 1.2, "emotional_resonance": 1.2},
+    "conversion": {"action_motivation": 1.5, "message_clarity": 1.2, "attention_capture": 0.8}
+}
+
+# Platform adjustments
+PLATFORM_WEIGHT_MODIFIERS = {
+    "instagram": {"attention_capture": 1.3, "emotional_resonance": 1.2},
+    "youtube": {"emotional_resonance": 1.3, "brand_presence": 1.1},
+    "facebook": {"message_clarity": 1.2, "action_motivation": 1.1},
+    "search": {"message_clarity": 1.3, "action_motivation": 1.3, "emotional_resonance": 0.7}
+}
+
+
+def pillar_weights(funnel_stage: str, platform: str) -> Dict[str, float]:
+    """Normalized pillar weights for a funnel stage and platform."""
+    adjusted_weights = BASE_PILLAR_WEIGHTS.copy()
+    for pillar, mod in FUNNEL_WEIGHT_MODIFIERS.get(funnel_stage, {}).items():
+        if pillar in adjusted_weights:
+            adjusted_weights[pillar] *= mod
+    
+    for pillar, mod in PLATFORM_WEIGHT_MODIFIERS.get(platform, {}).items():
+        if pillar in adjusted_weights:
+            adjusted_weights[pillar] *= mod
+    
+    # Normalize
+    total_weight = sum(adjusted_weights.values())
+    return {k: v/total_weight for k, v in adjusted_weights.items()}
+
+
+def pillar_benchmark_name(pillar_name: str) -> str:
+    """Benchmark row holding a pillar's score distribution (pillars share names with signals)."""
+    return f"pillar:{pillar_name}"
+
+
+def pillar_category_average(
+    pillar_name: str, category: str, benchmarks: Dict, defaults: Dict[str, float]
+) -> float:
+    """A pillar's category average: its benchmark row, else the built-in one."""
+    stats = benchmarks.get(pillar_benchmark_name(pillar_name)) or {}
+    for field in ("mean", "p50"):
+        if stats.get(field) is not None:
+            return stats[field]
+    return defaults.get(category, 60)
+
+
+def benchmark_percentile(value: float, stats: Optional[Dict]) -> Optional[float]:
+    """
+    Where a value falls (0-100) in a benchmark's p25/p50/p75/p90, linear
+    between them and extended along the nearest segment beyond them.
+    """
+    if not stats:
+        return None
+    points = [(stats[f"p{q}"], q) for q in (25, 50, 75, 90) if stats.get(f"p{q}") is not None]
+    if len(points) < 2:
+        return None
+    xs, qs = [x for x, _ in points], [q for _, q in points]
+    
+    if value < xs[0]:
+        (x0, q0), (x1, q1) = points[0], points[1]
+    elif value > xs[-1]:
+        (x0, q0), (x1, q1) = points[-2], points[-1]
+    else:
+        return round(float(np.interp(value, xs, qs)), 1)
+    if x1 <= x0:
+        return 0.0 if value < x0 else 100.0
+    percentile = q0 + (value - x0) * (q1 - q0) / (x1 - x0)
+    return round(min(100.0, max(0.0, percentile)), 1)
+
+
 class ThreeLayerScoringEngine:
     """
     CMO-Grade scoring engine implementing the three-layer model:
@@ -181,9 +282,17 @@ class ThreeLayerScoringEngine:
     3. Cognitive (LLM) - marketing science reasoning
     """
     
-    def __init__(self, benchmarks: Dict = None, category: str = "general"):
+    def __init__(
+        self,
+        benchmarks: Dict = None,
+        category: str = "general",
+        weights: Optional[Dict[str, float]] = None
+    ):
+        # Signal/pillar name -> {"p50": ..., "mean": ...}, see app.services.benchmark_index
         self.benchmarks = benchmarks or {}
         self.category = category
+        # Normalised pillar weights; None derives them from funnel stage and platform
+        self.weights = weights
         self.warnings = []
         self.contradictions = []
     
@@ -241,23 +350,20 @@ class ThreeLayerScoringEngine:
             decision_summary=decision_summary,
             warnings=self.warnings,
             contradictions=self.contradictions,
-            data_quality_score=data_quality
+            data_quality_score=data_quality,
+            signal_percentiles={
+                name: signal.benchmark_percentile
+                for name, signal in classified_signals.items()
+                if signal.benchmark_percentile is not None
+            }
         )
     
     def _classify_signals(self, all_signals: Dict) -> Dict[str, MicroSignal]:
         """Flatten and classify signals by layer."""
         classified = {}
         
-        layer_mapping = {
-            "opencv": SignalLayer.DETERMINISTIC,
-            "ocr": SignalLayer.DETERMINISTIC,
-            "vision": SignalLayer.PERCEPTUAL,
-            "copy": SignalLayer.COGNITIVE,
-            "cognitive": SignalLayer.COGNITIVE,
-        }
-        
         for source, signals in all_signals.items():
-            layer = layer_mapping.get(source, SignalLayer.DETERMINISTIC)
+            layer = SOURCE_LAYERS.get(source, SignalLayer.DETERMINISTIC)
             
             for name, data in signals.items():
                 if isinstance(data, dict):
@@ -269,11 +375,16 @@ class ThreeLayerScoringEngine:
                     value = data
                     confidence = 1.0
                 
+                # Categorical signals (e.g. first_fixation_element) are not scoreable
+                if not isinstance(value, numbers.Real):
+                    continue
+                
                 classified[name] = MicroSignal(
                     name=name,
                     value=value,
                     layer=layer,
-                    confidence=confidence
+                    confidence=confidence,
+                    benchmark_percentile=benchmark_percentile(value, self.benchmarks.get(name))
                 )
         
         return classified
@@ -286,14 +397,8 @@ class ThreeLayerScoringEngine:
             layer_counts[signal.layer] += 1
         
         coverage = {}
-        expected = {
-            SignalLayer.DETERMINISTIC: 20,
-            SignalLayer.PERCEPTUAL: 10,
-            SignalLayer.COGNITIVE: 8
-        }
-        
         for layer, count in layer_counts.items():
-            coverage[layer.value] = min(1.0, count / expected.get(layer, 10))
+            coverage[layer.value] = min(1.0, count / EXPECTED_LAYER_SIGNALS.get(layer, 10))
         
         # Warn if any layer is low
         for layer, cov in coverage.items():
@@ -375,7 +480,9 @@ class ThreeLayerScoringEngine:
         )
         
         # Get benchmark comparison
-        benchmark = definition.get("benchmarks", {}).get(category, 60)
+        benchmark = pillar_category_average(
+            name, category, self.benchmarks, definition.get("benchmarks", {})
+        )
         vs_category_avg = score - benchmark
         
         # Generate explanation
@@ -393,7 +500,9 @@ class ThreeLayerScoringEngine:
             explanation=explanation,
             layer_breakdown=layer_breakdown,
             data_completeness=data_completeness,
-            benchmark_percentile=None,  # Would need benchmark data
+            benchmark_percentile=benchmark_percentile(
+                score, self.benchmarks.get(pillar_benchmark_name(name))
+            ),
             vs_category_avg=round(vs_category_avg, 1)
         )
     
@@ -521,44 +630,7 @@ class ThreeLayerScoringEngine:
     ) -> Tuple[float, Tuple[float, float]]:
         """Calculate weighted final score with context adjustments."""
         
-        # Base weights
-        weights = {
-            "attention_capture": 0.18,
-            "brand_presence": 0.15,
-            "message_clarity": 0.20,
-            "emotional_resonance": 0.15,
-            "cultural_relevance": 0.15,
-            "action_motivation": 0.17
-        }
-        
-        # Funnel stage adjustments
-        funnel_mods = {
-            "awareness": {"attention_capture": 1.3, "action_motivation": 0.7},
-            "consideration": {"message_clarity": 1.2, "emotional_resonance": 1.2},
-            "conversion": {"action_motivation": 1.5, "message_clarity": 1.2, "attention_capture": 0.8}
-        }
-        
-        # Platform adjustments
-        platform_mods = {
-            "instagram": {"attention_capture": 1.3, "emotional_resonance": 1.2},
-            "youtube": {"emotional_resonance": 1.3, "brand_presence": 1.1},
-            "facebook": {"message_clarity": 1.2, "action_motivation": 1.1},
-            "search": {"message_clarity": 1.3, "action_motivation": 1.3, "emotional_resonance": 0.7}
-        }
-        
-        # Apply adjustments
-        adjusted_weights = weights.copy()
-        for pillar, mod in funnel_mods.get(funnel_stage, {}).items():
-            if pillar in adjusted_weights:
-                adjusted_weights[pillar] *= mod
-        
-        for pillar, mod in platform_mods.get(platform, {}).items():
-            if pillar in adjusted_weights:
-                adjusted_weights[pillar] *= mod
-        
-        # Normalize
-        total_weight = sum(adjusted_weights.values())
-        adjusted_weights = {k: v/total_weight for k, v in adjusted_weights.items()}
+        adjusted_weights = self.weights or pillar_weights(funnel_stage, platform)
         
         # Calculate weighted score
         weighted_sum = 0
@@ -668,11 +740,13 @@ def score_creative_three_layer(
     all_signals: Dict,
     category: str = "general",
     platform: str = "general",
-    funnel_stage: str = "awareness"
+    funnel_stage: str = "awareness",
+    benchmarks: Optional[Dict] = None,
+    weights: Optional[Dict[str, float]] = None
 ) -> Dict[str, Any]:
     """Convenience function for three-layer scoring."""
     
-    engine = ThreeLayerScoringEngine(category=category)
+    engine = ThreeLayerScoringEngine(benchmarks=benchmarks, category=category, weights=weights)
     result = engine.score(all_signals, category, platform, funnel_stage)
     
     return {
@@ -683,12 +757,14 @@ def score_creative_three_layer(
         "decision_summary": result.decision_summary,
         "warnings": result.warnings,
         "contradictions": result.contradictions,
+        "signal_percentiles": result.signal_percentiles,
         "pillars": [{
             "name": p.name,
             "score": p.score,
             "confidence": p.confidence.value,
             "confidence_reason": p.confidence_reason,
             "vs_category_avg": p.vs_category_avg,
+            "benchmark_percentile": p.benchmark_percentile,
             "layer_breakdown": p.layer_breakdown,
             "explanation": {
                 "what_drove_this": p.explanation.what_drove_this,
@@ -0,0 +1,521 @@
+"""
+Similarity - "More like this" search over creative embeddings.
+Every completed analysis stores a unit embedding (app.services.embeddings)
+in CreativeEmbedding; a search returns the caller's creatives closest to
+one of them by cosine similarity.
+
+Backends (SIMILARITY_BACKEND; auto picks pgvector on PostgreSQL):
+- pgvector: an ORDER BY embedding <=> query filtered to the caller's
+  creatives first. Owners with up to EXACT_SEARCH_LIMIT embeddings are
+  scanned exactly; larger ones use the HNSW index with an iterative scan
+  (pgvector 0.8+), which keeps walking the graph until enough of their rows
+  pass the filter, and fall back to the exact scan if it stops short.
+- local: each API process serves an IVF index (app.services.ann_index)
+  memory-mapped from SIMILARITY_INDEX_DIR, plus an in-memory delta of the
+  embeddings written since it was built, read every
+  SIMILARITY_REFRESH_SECONDS. Once the delta passes
+  SIMILARITY_REBUILD_THRESHOLD one process rebuilds the index (under a
+  file lock) and points CURRENT at it; the others load it on their next
+  refresh.
+
+Searches only see embeddings of the current EMBEDDING_VERSION. After the
+version is bumped, or for creatives analysed before embeddings were stored,
+a backfill embeds every completed creative that lacks a current one, from
+its stored layer outputs (reading the image for OpenCV descriptors only
+when the stored layer has none), on the bulk Celery queue:
+    enqueue_embedding_backfill()
+"""
+import asyncio
+import contextlib
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import structlog
+from sqlalchemy import Float, and_, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Brand, Campaign, Creative, CreativeAnalysis, CreativeEmbedding, CreativeStatus
+from app.services.ann_index import EXACT_SEARCH_LIMIT, IVFIndex, Match, exact_search
+from app.services.embeddings import EMBEDDING_TYPE, EMBEDDING_VERSION
+
+logger = structlog.get_logger()
+
+SIMILARITY_BACKENDS = ("local", "pgvector")
+# File in SIMILARITY_INDEX_DIR naming the current index directory
+CURRENT = "CURRENT"
+LOCK = ".rebuild.lock"
+# Embeddings committed this long after their created_at are still picked up
+OVERLAP = timedelta(minutes=5)
+# Rows per round trip while reading embeddings
+FETCH_SIZE = 20000
+# Candidates fetched per result wanted: some belong to deleted creatives
+OVERFETCH = 2
+# HNSW candidate list per query, and the tuples an iterative scan may visit
+PGVECTOR_EF_SEARCH = 200
+PGVECTOR_MAX_SCAN_TUPLES = 1000000
+# Creatives per backfill transaction
+BACKFILL_CHUNK = 200
+
+
+def similarity_backend() -> str:
+    name = settings.SIMILARITY_BACKEND.lower()
+    if name == "auto":
+        return "pgvector" if "postgresql" in settings.DATABASE_URL else "local"
+    if name not in SIMILARITY_BACKENDS:
+        raise ValueError(f"Unknown SIMILARITY_BACKEND: {settings.SIMILARITY_BACKEND}")
+    return name
+
+
+def _index_dir() -> str:
+    return settings.SIMILARITY_INDEX_DIR or os.path.join(tempfile.gettempdir(), "creative_intel_similarity")
+
+
+def _current_embedding():
+    """Rows searches use: the combined embedding of the current version."""
+    return and_(
+        CreativeEmbedding.embedding_type == EMBEDDING_TYPE,
+        CreativeEmbedding.embedding_version == EMBEDDING_VERSION
+    )
+
+
+def _embedding_rows(since: Optional[datetime] = None):
+    """(creative_id, owner user_id, vector, created_at) of every current embedding."""
+    query = (
+        select(
+            CreativeEmbedding.creative_id, Brand.user_id,
+            CreativeEmbedding.embedding_data, CreativeEmbedding.created_at
+        )
+        .join(Creative, Creative.id == CreativeEmbedding.creative_id)
+        .join(Campaign, Campaign.id == Creative.campaign_id)
+        .join(Brand, Brand.id == Campaign.brand_id)
+        .where(_current_embedding())
+    )
+    if since is not None:
+        query = query.where(CreativeEmbedding.created_at > since)
+    return query.execution_options(yield_per=FETCH_SIZE)
+
+
+class LocalSimilarityIndex:
+    """The current IVF index of SIMILARITY_INDEX_DIR plus the embeddings written since."""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index: Optional[IVFIndex] = None
+        self._current: Optional[str] = None
+        self._watermark: Optional[datetime] = None  # newest embedding in the index
+        # creative_id -> (owner, vector, created_at); overrides the index
+        self._delta: Dict[uuid.UUID, Tuple[str, np.ndarray, datetime]] = {}
+        self._by_owner: Dict[str, Tuple[np.ndarray, List[uuid.UUID]]] = {}
+        self._since: Optional[datetime] = None
+        self._rebuild: Optional[asyncio.Task] = None
+        self.refreshed_at: Optional[float] = None
+    
+    # ---- keeping current ----
+    
+    def _load_current(self):
+        """Open the index CURRENT names, if it is not the one already open."""
+        try:
+            with open(os.path.join(self.directory, CURRENT)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return
+        if not name or name == self._current:
+            return
+        
+        index = IVFIndex.load(os.path.join(self.directory, name))
+        if index.meta.get("embedding_version") != EMBEDDING_VERSION:
+            # Built before a version bump; the next rebuild replaces it
+            logger.info("similarity_index_outdated", name=name, version=index.meta.get("embedding_version"))
+            return
+        watermark = datetime.fromisoformat(index.meta["watermark"]) if index.meta.get("watermark") else None
+        self.index, self._current, self._watermark = index, name, watermark
+        if watermark is not None:
+            self._delta = {cid: entry for cid, entry in self._delta.items() if entry[2] > watermark}
+            self._by_owner = {}
+            self._since = max(self._since or watermark, watermark)
+        logger.info("similarity_index_loaded", name=name, count=len(index), delta=len(self._delta))
+    
+    async def refresh(self):
+        """Pick up a newer index and read embeddings written since the last refresh."""
+        from app.core.database import AsyncSessionLocal
+        
+        self._load_current()
+        
+        async with AsyncSessionLocal() as db:
+            if self.index is None and self._since is None:
+                total = await db.scalar(
+                    select(func.count()).select_from(CreativeEmbedding).where(_current_embedding())
+                )
+                if total > settings.SIMILARITY_REBUILD_THRESHOLD:
+                    # Too many to hold as a delta; build the index first
+                    await self.rebuild()
+                    self.refreshed_at = time.time()
+                    return
+            
+            since = self._since - OVERLAP if self._since is not None else None
+            result = await db.stream(_embedding_rows(since))
+            async for creative_id, owner, vector, created_at in result:
+                if self._indexed(creative_id, created_at):
+                    continue
+                self._delta[creative_id] = (str(owner), vector, created_at)
+                self._by_owner.pop(str(owner), None)
+                if self._since is None or created_at > self._since:
+                    self._since = created_at
+        
+        self.refreshed_at = time.time()
+        if len(self._delta) > settings.SIMILARITY_REBUILD_THRESHOLD and (self._rebuild is None or self._rebuild.done()):
+            self._rebuild = asyncio.create_task(self._rebuild_quietly(), name="similarity-rebuild")
+    
+    def _indexed(self, creative_id: uuid.UUID, created_at: datetime) -> bool:
+        """Whether the index already holds this embedding (re-read in the overlap window)."""
+        return self._watermark is not None and created_at <= self._watermark and creative_id in self.index
+    
+    async def _rebuild_quietly(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.warning("similarity_rebuild_failed", error=str(e))
+    
+    async def rebuild(self) -> bool:
+        """
+        Build an index of every embedding and make it CURRENT. Returns False
+        when another process holds the rebuild lock (its index is loaded on
+        a later refresh).
+        """
+        from app.core.database import AsyncSessionLocal
+        
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, LOCK), "w")
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            
+            start = time.perf_counter()
+            ids: List[uuid.UUID] = []
+            owners: List[str] = []
+            chunks: List[np.ndarray] = []
+            watermark: Optional[datetime] = None
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(_embedding_rows())
+                async for rows in result.partitions():
+                    ids.extend(row[0] for row in rows)
+                    owners.extend(str(row[1]) for row in rows)
+                    chunks.append(np.stack([row[2] for row in rows]))
+                    latest = max(row[3] for row in rows)
+                    watermark = latest if watermark is None or latest > watermark else watermark
+            if not ids:
+                return True
+            
+            name = f"index-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            
+            def build_and_save():
+                vectors = np.concatenate(chunks)
+                chunks.clear()
+                IVFIndex.build(vectors, ids, owners, meta={"watermark": watermark.isoformat(), "embedding_version": EMBEDDING_VERSION}).save(
+                    os.path.join(self.directory, name)
+                )
+                pointer = os.path.join(self.directory, f"{CURRENT}.tmp")
+                with open(pointer, "w") as f:
+                    f.write(name)
+                os.replace(pointer, os.path.join(self.directory, CURRENT))
+                # Processes still reading older indexes keep their mapped files until they reload
+                for entry in os.listdir(self.directory):
+                    if entry.startswith("index-") and entry != name:
+                        shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+            
+            await asyncio.get_running_loop().run_in_executor(None, build_and_save)
+            logger.info("similarity_index_built", name=name, count=len(ids), seconds=round(time.perf_counter() - start, 1))
+            self._load_current()
+            return True
+        finally:
+            lock.close()
+    
+    # ---- search ----
+    
+    def _owner_delta(self, owner: str) -> Tuple[np.ndarray, List[uuid.UUID]]:
+        """The owner's delta as (vectors, creative ids), stacked once per change."""
+        stacked = self._by_owner.get(owner)
+        if stacked is None:
+            entries = [(cid, vector) for cid, (o, vector, _) in self._delta.items() if o == owner]
+            stacked = (
+                np.stack([vector for _, vector in entries]) if entries else np.empty((0, 0), np.float32),
+                [cid for cid, _ in entries]
+            )
+            self._by_owner[owner] = stacked
+        return stacked
+    
+    def search(self, query: np.ndarray, owner: str, k: int) -> List[Match]:
+        """Up to k (creative_id, similarity) pairs among the owner's creatives, best first."""
+        matches = exact_search(*self._owner_delta(owner), query, k)
+        if self.index is not None:
+            # An entry in the delta supersedes the indexed vector of that creative
+            fetched = self.index.search(query, k + len(matches), owner=owner, nprobe=settings.SIMILARITY_NPROBE)
+            matches.extend(m for m in fetched if m[0] not in self._delta)
+        return sorted(matches, key=lambda m: -m[1])[:k]
+    
+    def stats(self) -> Dict:
+        return {
+            "index": self._current,
+            "indexed": len(self.index) if self.index is not None else 0,
+            "delta": len(self._delta),
+            "since": self._since.isoformat() if self._since else None,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+_local: Optional[LocalSimilarityIndex] = None
+_refresher: Optional[asyncio.Task] = None
+
+
+def get_local_index() -> LocalSimilarityIndex:
+    global _local
+    if _local is None:
+        _local = LocalSimilarityIndex(_index_dir())
+    return _local
+
+
+async def _refresh_quietly():
+    try:
+        await get_local_index().refresh()
+    except Exception as e:
+        logger.warning("similarity_refresh_failed", error=str(e))
+
+
+async def _refresh_periodically():
+    while True:
+        await asyncio.sleep(settings.SIMILARITY_REFRESH_SECONDS)
+        await _refresh_quietly()
+
+
+async def start_similarity_index():
+    """Load the local index and keep it current on this event loop (no-op for pgvector)."""
+    global _refresher
+    if similarity_backend() != "local":
+        return
+    await _refresh_quietly()
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.create_task(_refresh_periodically(), name="similarity-refresh")
+
+
+async def stop_similarity_index():
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _refresher
+        _refresher = None
+
+
+_iterative_scan: Optional[bool] = None
+
+
+async def _supports_iterative_scan(db: AsyncSession) -> bool:
+    """hnsw.iterative_scan arrived in pgvector 0.8."""
+    global _iterative_scan
+    if _iterative_scan is None:
+        version = await db.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+        _iterative_scan = tuple(int(part) for part in (version or "0").split(".")[:2]) >= (0, 8)
+    return _iterative_scan
+
+
+async def _pgvector_search(
+    db: AsyncSession, vector: np.ndarray, creative_id: uuid.UUID, owner_id: uuid.UUID, k: int
+) -> List[Tuple[Creative, float]]:
+    """
+    Nearest owner creatives, filtering before the limit: HNSW on its own
+    returns at most ef_search global neighbours, which a small owner may
+    have none of.
+    """
+    owned = (
+        select(CreativeEmbedding.id)
+        .join(Creative, Creative.id == CreativeEmbedding.creative_id)
+        .join(Campaign, Campaign.id == Creative.campaign_id)
+        .join(Brand, Brand.id == Campaign.brand_id)
+        .where(_current_embedding(), Brand.user_id == owner_id)
+        .limit(EXACT_SEARCH_LIMIT + 1)
+        .subquery()
+    )
+    owner_rows = await db.scalar(select(func.count()).select_from(owned))
+    
+    distance = CreativeEmbedding.embedding_data.op("<=>", return_type=Float)(vector)
+    query = (
+        select(Creative, 1 - distance)
+        .join(CreativeEmbedding, CreativeEmbedding.creative_id == Creative.id)
+        .join(Campaign, Campaign.id == Creative.campaign_id)
+        .join(Brand, Brand.id == Campaign.brand_id)
+        .where(
+            _current_embedding(),
+            Brand.user_id == owner_id,
+            Creative.id != creative_id
+        )
+        .order_by(distance)
+        .limit(k)
+    )
+    
+    if owner_rows > EXACT_SEARCH_LIMIT and await _supports_iterative_scan(db):
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(PGVECTOR_EF_SEARCH, k)}"))
+        await db.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+        await db.execute(text(f"SET LOCAL hnsw.max_scan_tuples = {PGVECTOR_MAX_SCAN_TUPLES}"))
+        matches = (await db.execute(query)).all()
+        if len(matches) >= k:
+            return [(creative, float(similarity)) for creative, similarity in matches]
+        logger.info("similarity_iterative_scan_short", owner_id=str(owner_id), found=len(matches), k=k)
+    
+    # Exact scan of the owner's rows; the planner would otherwise pick HNSW
+    await db.execute(text("SET LOCAL enable_indexscan = off"))
+    matches = (await db.execute(query)).all()
+    await db.execute(text("SET LOCAL enable_indexscan = on"))
+    return [(creative, float(similarity)) for creative, similarity in matches]
+
+
+async def find_similar(
+    db: AsyncSession, creative_id: uuid.UUID, owner_id: uuid.UUID, k: int = 10
+) -> Optional[List[Tuple[Creative, float]]]:
+    """
+    The owner's k creatives most similar to this one, best first, with their
+    cosine similarity; None when the creative has no current embedding yet.
+    """
+    vector = await db.scalar(
+        select(CreativeEmbedding.embedding_data).where(
+            CreativeEmbedding.creative_id == creative_id, _current_embedding()
+        )
+    )
+    if vector is None:
+        return None
+    
+    if similarity_backend() == "pgvector":
+        return await _pgvector_search(db, vector, creative_id, owner_id, k)
+    
+    index = get_local_index()
+    if index.refreshed_at is None:
+        await index.refresh()
+    matches = [m for m in index.search(vector, str(owner_id), (k + 1) * OVERFETCH) if m[0] != creative_id]
+    if not matches:
+        return []
+    
+    # Deleted (or moved) creatives can linger in the index until it is rebuilt
+    result = await db.execute(
+        select(Creative)
+        .join(Campaign, Campaign.id == Creative.campaign_id)
+        .join(Brand, Brand.id == Campaign.brand_id)
+        .where(Creative.id.in_([cid for cid, _ in matches]), Brand.user_id == owner_id)
+    )
+    creatives = {creative.id: creative for creative in result.scalars().all()}
+    return [(creatives[cid], score) for cid, score in matches if cid in creatives][:k]
+
+
+# ---- backfill ----
+
+async def _describe_stored_image(creative_id: uuid.UUID, media_url: str) -> Optional[Dict]:
+    """OpenCV appearance descriptors of a stored creative, None when it cannot be read."""
+    from app.services.cpu_pool import get_cpu_pool
+    from app.services.storage.media_storage import get_storage
+    from app.services.vision.opencv_analyzer import describe_image
+    
+    try:
+        async with get_storage().local_copy(media_url) as image_path:
+            return await get_cpu_pool().run(describe_image, image_path)
+    except Exception as e:
+        logger.warning("embedding_backfill_describe_failed", creative_id=str(creative_id), error=str(e))
+        return None
+
+
+async def _backfill_chunk(db: AsyncSession, rows: List[Tuple[uuid.UUID, str]], counts: Dict[str, int]):
+    """Embed one chunk of creatives in the session's transaction."""
+    from app.services.persistence import save_embedding
+    
+    result = await db.execute(
+        select(CreativeAnalysis).where(
+            CreativeAnalysis.creative_id.in_([creative_id for creative_id, _ in rows]),
+            CreativeAnalysis.analysis_type.in_(("opencv", "ocr"))
+        )
+    )
+    analyses: Dict[uuid.UUID, Dict[str, CreativeAnalysis]] = {}
+    for analysis in result.scalars().all():
+        analyses.setdefault(analysis.creative_id, {})[analysis.analysis_type] = analysis
+    
+    for creative_id, media_url in rows:
+        layers = analyses.get(creative_id, {})
+        opencv = layers.get("opencv")
+        if opencv is None:
+            # No stored layer outputs: only a reanalysis can embed it
+            counts["skipped"] += 1
+            continue
+        if not (opencv.raw_output or {}).get("descriptors"):
+            descriptors = await _describe_stored_image(creative_id, media_url)
+            if not descriptors:
+                counts["skipped"] += 1
+                continue
+            # Kept with the layer, so later version bumps need no image
+            opencv.raw_output = {**(opencv.raw_output or {}), "descriptors": descriptors}
+            counts["described"] += 1
+        
+        try:
+            async with db.begin_nested():
+                embedded = await save_embedding(
+                    db, creative_id, {source: {"raw_output": row.raw_output or {}} for source, row in layers.items()}
+                )
+        except Exception as e:
+            logger.warning("embedding_save_failed", creative_id=str(creative_id), error=str(e))
+            embedded = False
+        counts["embedded" if embedded else "skipped"] += 1
+
+
+async def backfill_embeddings(after: Optional[str] = None, time_budget: Optional[float] = None) -> Optional[str]:
+    """
+    Embed every completed creative without an embedding of the current
+    EMBEDDING_VERSION, in id order after `after`, committing each chunk.
+    
+    Returns the last creative id done when time_budget (seconds) ran out
+    first, to continue from; None once every creative has been visited.
+    """
+    from app.core.database import AsyncSessionLocal
+    
+    current = select(CreativeEmbedding.id).where(
+        CreativeEmbedding.creative_id == Creative.id, _current_embedding()
+    )
+    start = time.monotonic()
+    last_id = uuid.UUID(after) if after else None
+    counts = {"embedded": 0, "described": 0, "skipped": 0}
+    while True:
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(Creative.id, Creative.media_url)
+                .where(Creative.status == CreativeStatus.COMPLETED, ~current.exists())
+                .order_by(Creative.id)
+                .limit(BACKFILL_CHUNK)
+            )
+            if last_id is not None:
+                query = query.where(Creative.id > last_id)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+            await _backfill_chunk(db, rows, counts)
+            await db.commit()
+        last_id = rows[-1][0]
+        if time_budget is not None and time.monotonic() - start > time_budget:
+            logger.info("embedding_backfill_paused", after=str(last_id), **counts)
+            return str(last_id)
+    
+    logger.info("embedding_backfill_finished", version=EMBEDDING_VERSION, **counts)
+    return None
+
+
+async def enqueue_embedding_backfill():
+    """Run the backfill on the bulk Celery queue, or here with the inline analysis queue backend."""
+    if settings.ANALYSIS_QUEUE_BACKEND.lower() == "inline":
+        await backfill_embeddings()
+        return
+    
+    from app.workers.tasks import backfill_embeddings_task
+    await asyncio.to_thread(backfill_embeddings_task.delay)
@@ -0,0 +1 @@
+"""Media storage services package."""
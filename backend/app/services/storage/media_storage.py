@@ -0,0 +1,235 @@
+"""
+Media Storage - Streaming upload ingest and pluggable storage backends.
+Uploads are copied in fixed-size chunks (hashed and size-checked on the way),
+so memory per upload is bounded by the chunk size rather than the file size.
+"""
+import asyncio
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import structlog
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class UploadTooLarge(Exception):
+    """Upload exceeded its size limit; maps to HTTP 413."""
+    
+    def __init__(self, filename: str, max_bytes: int):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        super().__init__(f"{filename} exceeds {max_bytes // (1024 * 1024)} MB")
+
+
+@dataclass
+class IngestedFile:
+    """An upload written to local disk."""
+    path: str
+    size: int
+    sha256: str
+    filename: str
+    
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.path)[1]
+
+
+def max_upload_bytes(content_type: Optional[str]) -> int:
+    """Size limit for an upload from its content type."""
+    if content_type and content_type.startswith("video/"):
+        return settings.MAX_VIDEO_SIZE_MB * 1024 * 1024
+    return settings.MAX_IMAGE_SIZE_MB * 1024 * 1024
+
+
+def _extension(filename: Optional[str]) -> str:
+    ext = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    return f".{ext}" if ext.isalnum() and len(ext) <= 5 else ".jpg"
+
+
+async def ingest_upload(
+    upload: UploadFile,
+    max_bytes: Optional[int] = None,
+    directory: Optional[str] = None
+) -> IngestedFile:
+    """
+    Stream an upload to a new file in `directory` (default: system temp dir).
+    
+    Reads UPLOAD_CHUNK_SIZE bytes at a time, hashing as it goes, and stops as
+    soon as the upload passes max_bytes; the partial file is removed.
+    """
+    filename = upload.filename or "upload"
+    max_bytes = max_bytes if max_bytes is not None else max_upload_bytes(upload.content_type)
+    
+    # Starlette knows the spooled size up front; reject before reading anything
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(filename, max_bytes)
+    
+    path = os.path.join(directory or tempfile.gettempdir(), f"upload_{uuid.uuid4()}{_extension(filename)}")
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(filename, max_bytes)
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+    
+    return IngestedFile(path=path, size=size, sha256=digest.hexdigest(), filename=filename)
+
+
+# ============== BACKENDS ==============
+
+class StorageBackend(ABC):
+    """Durable storage for creative media, addressed by URI."""
+    
+    name = "base"
+    
+    @abstractmethod
+    async def put(self, local_path: str, key: str) -> str:
+        """Move a local file into storage and return its URI."""
+        ...
+    
+    @abstractmethod
+    async def delete(self, uri: str):
+        ...
+    
+    @abstractmethod
+    def local_copy(self, uri: str) -> contextlib.AbstractAsyncContextManager:
+        """Async context manager yielding a local path for the stored object."""
+        ...
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files under a local directory; URIs are plain absolute paths."""
+    
+    name = "local"
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    async def put(self, local_path: str, key: str) -> str:
+        dest = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        await asyncio.to_thread(shutil.move, local_path, dest)
+        return dest
+    
+    async def delete(self, uri: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(uri)
+    
+    @contextlib.asynccontextmanager
+    async def local_copy(self, uri: str) -> AsyncIterator[str]:
+        yield uri
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3-compatible object storage (AWS, MinIO, ...) from the S3_* settings.
+    
+    Uploads and downloads go through boto3's managed transfer, which streams
+    multipart from disk in a worker thread.
+    """
+    
+    name = "s3"
+    
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None
+    ):
+        import boto3
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+    
+    def _key(self, uri: str) -> Optional[str]:
+        """Object key of an s3:// URI; None for local paths stored before S3 was enabled."""
+        prefix = f"s3://{self.bucket}/"
+        if uri.startswith(prefix):
+            return uri[len(prefix):]
+        if uri.startswith("s3://"):
+            raise ValueError(f"Not an object in bucket {self.bucket}: {uri}")
+        return None
+    
+    async def put(self, local_path: str, key: str) -> str:
+        try:
+            await asyncio.to_thread(self.client.upload_file, local_path, self.bucket, key)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(local_path)
+        return f"s3://{self.bucket}/{key}"
+    
+    async def delete(self, uri: str):
+        key = self._key(uri)
+        if key is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(uri)
+            return
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+    
+    @contextlib.asynccontextmanager
+    async def local_copy(self, uri: str) -> AsyncIterator[str]:
+        key = self._key(uri)
+        if key is None:
+            yield uri
+            return
+        path = os.path.join(tempfile.gettempdir(), f"s3_{uuid.uuid4()}{os.path.splitext(key)[1]}")
+        await asyncio.to_thread(self.client.download_file, self.bucket, key, path)
+        try:
+            yield path
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Process-wide media storage built from settings."""
+    global _storage
+    
+    if _storage is None:
+        backend_name = settings.STORAGE_BACKEND.lower()
+        if backend_name == "s3":
+            _storage = S3StorageBackend(
+                settings.S3_BUCKET,
+                settings.S3_ENDPOINT,
+                settings.AWS_ACCESS_KEY_ID,
+                settings.AWS_SECRET_ACCESS_KEY,
+            )
+        elif backend_name == "local":
+            _storage = LocalStorageBackend(
+                settings.STORAGE_DIR or os.path.join(tempfile.gettempdir(), "creative_intel_media")
+            )
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    
+    return _storage
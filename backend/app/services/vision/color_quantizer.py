@@ -0,0 +1,159 @@
+"""
+Color Quantizer - Single-pass palette extraction for the OpenCV layer.
+Pixels are binned once into a reduced 3D color histogram; clustering then runs
+on the occupied bins (at most a few thousand weighted points) instead of on
+raw pixels, so color count and dominant coverage share one pass over the image.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+# Bits kept per channel: 4 -> 16x16x16 = 4096 histogram bins
+QUANT_BITS = 4
+# Fixed RNG seed so the same image always yields the same palette
+QUANT_SEED = 1337
+# A cluster counts as a "significant" color above this share of pixels
+SIGNIFICANT_SHARE = 0.05
+
+
+@dataclass
+class ColorPalette:
+    """Weighted cluster centers in the input color space."""
+    centers: np.ndarray  # (k, 3) float32
+    shares: np.ndarray  # (k,) fraction of pixels, sums to 1
+    
+    @property
+    def dominant_share(self) -> float:
+        return float(self.shares.max()) if len(self.shares) else 0.0
+
+
+class ColorQuantizer:
+    """
+    Histogram-based color quantizer with deterministic weighted k-means.
+    
+    Call `fit(img)` once per image, then read palettes for any k from the
+    cached histogram via `palette(k)`.
+    """
+    
+    def __init__(
+        self,
+        bits: int = QUANT_BITS,
+        seed: int = QUANT_SEED,
+        attempts: int = 3,
+        max_iter: int = 100,
+        epsilon: float = 0.2
+    ):
+        self.bits = bits
+        self.seed = seed
+        self.attempts = attempts
+        self.max_iter = max_iter
+        self.epsilon = epsilon
+        self._points: Optional[np.ndarray] = None
+        self._weights: Optional[np.ndarray] = None
+        self._palettes: Dict[int, ColorPalette] = {}
+    
+    def fit(self, img: np.ndarray) -> "ColorQuantizer":
+        """Bin every pixel of a 3-channel uint8 image in one pass."""
+        shift = 8 - self.bits
+        pixels = img.reshape(-1, 3)
+        q = (pixels >> shift).astype(np.int32)
+        index = (q[:, 0] << (2 * self.bits)) | (q[:, 1] << self.bits) | q[:, 2]
+        
+        n_bins = 1 << (3 * self.bits)
+        counts = np.bincount(index, minlength=n_bins)
+        occupied = np.nonzero(counts)[0]
+        
+        # Bin representative = mean color of the pixels that fell into it
+        sums = np.stack([
+            np.bincount(index, weights=pixels[:, c], minlength=n_bins)[occupied]
+            for c in range(3)
+        ], axis=1)
+        weights = counts[occupied].astype(np.float64)
+        
+        self._points = (sums / weights[:, None]).astype(np.float32)
+        self._weights = weights / weights.sum()
+        self._palettes = {}
+        return self
+    
+    def palette(self, k: int) -> ColorPalette:
+        """Weighted k-means over the histogram bins; memoized per k."""
+        if self._points is None:
+            raise ValueError("ColorQuantizer.fit() must be called first")
+        
+        if k not in self._palettes:
+            self._palettes[k] = self._kmeans(min(k, len(self._points)))
+        return self._palettes[k]
+    
+    def count_colors(self, max_colors: int = 8) -> int:
+        """Largest k in 2..max_colors whose clusters all hold a significant share."""
+        best_k = 1
+        for k in range(2, max_colors + 1):
+            shares = self.palette(k).shares
+            if int(np.sum(shares > SIGNIFICANT_SHARE)) >= k:
+                best_k = k
+        return best_k
+    
+    def dominant_coverage(self, k: int = 3) -> float:
+        """Percentage of pixels in the largest of k clusters."""
+        return self.palette(k).dominant_share * 100
+    
+    def _kmeans(self, k: int) -> ColorPalette:
+        points, weights = self._points.astype(np.float64), self._weights
+        point_sq = (points * points).sum(axis=1)
+        rng = np.random.default_rng(self.seed + k)
+        
+        best_centers, best_labels, best_inertia = None, None, np.inf
+        for _ in range(self.attempts):
+            centers = self._init_centers(points, weights, k, rng)
+            
+            for _ in range(self.max_iter):
+                labels, dist = self._assign(points, point_sq, centers)
+                
+                mass = np.bincount(labels, weights=weights, minlength=k)
+                new_centers = centers.copy()
+                filled = mass > 0
+                for c in range(3):
+                    sums = np.bincount(labels, weights=weights * points[:, c], minlength=k)
+                    new_centers[filled, c] = sums[filled] / mass[filled]
+                
+                shift = float(np.max(np.linalg.norm(new_centers - centers, axis=1)))
+                centers = new_centers
+                if shift <= self.epsilon:
+                    break
+            
+            labels, dist = self._assign(points, point_sq, centers)
+            inertia = float(np.sum(weights * dist))
+            if inertia < best_inertia:
+                best_centers, best_labels, best_inertia = centers, labels, inertia
+        
+        shares = np.bincount(best_labels, weights=weights, minlength=k)
+        return ColorPalette(centers=best_centers.astype(np.float32), shares=shares)
+    
+    @staticmethod
+    def _assign(points: np.ndarray, point_sq: np.ndarray, centers: np.ndarray):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2; |p|^2 does not affect the argmin
+        d = points @ (-2 * centers.T)
+        d += (centers * centers).sum(axis=1)
+        labels = d.argmin(axis=1)
+        dist = d[np.arange(len(points)), labels] + point_sq
+        return labels, np.maximum(dist, 0)
+    
+    @staticmethod
+    def _init_centers(points: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+        """Weighted k-means++ seeding."""
+        centers = [points[rng.choice(len(points), p=weights)]]
+        closest = ((points - centers[0]) ** 2).sum(axis=1)
+        
+        for _ in range(1, k):
+            p = weights * closest
+            total = p.sum()
+            if total <= 0:
+                # Fewer distinct colors than k; duplicate centers end up empty
+                idx = rng.choice(len(points), p=weights)
+            else:
+                idx = rng.choice(len(points), p=p / total)
+            centers.append(points[idx])
+            closest = np.minimum(closest, ((points - points[idx]) ** 2).sum(axis=1))
+        
+        return np.array(centers, dtype=np.float64)
@@ -0,0 +1,70 @@
+"""
+Feature Maps - Per-image lazy store of derived OpenCV maps.
+Each map is computed on first access and reused by every signal function in
+the same analyze() call, so no conversion or filter runs twice per image.
+"""
+from functools import cached_property
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FeatureMaps:
+    """
+    Derived maps for one resized BGR image.
+    
+    Gradient and filter maps are float32; nothing here is promoted to float64.
+    """
+    
+    def __init__(
+        self,
+        img: np.ndarray,
+        gray: Optional[np.ndarray] = None,
+        canny: Optional[np.ndarray] = None
+    ):
+        self.img = img
+        # Maps already derived from the same pixels (e.g. ImageHandle.gray/.edges)
+        if gray is not None:
+            self.__dict__["gray"] = gray
+        if canny is not None:
+            self.__dict__["canny"] = canny
+    
+    @property
+    def shape(self):
+        return self.img.shape[:2]
+    
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+    
+    @cached_property
+    def gray_f32(self) -> np.ndarray:
+        return self.gray.astype(np.float32)
+    
+    @cached_property
+    def hsv(self) -> np.ndarray:
+        return cv2.cvtColor(self.img, cv2.COLOR_BGR2HSV)
+    
+    @cached_property
+    def lab(self) -> np.ndarray:
+        return cv2.cvtColor(self.img, cv2.COLOR_BGR2LAB)
+    
+    @cached_property
+    def canny(self) -> np.ndarray:
+        return cv2.Canny(self.gray, 50, 150)
+    
+    @cached_property
+    def sobel_magnitude(self) -> np.ndarray:
+        sobelx = cv2.Sobel(self.gray, cv2.CV_32F, 1, 0, ksize=3)
+        sobely = cv2.Sobel(self.gray, cv2.CV_32F, 0, 1, ksize=3)
+        return cv2.magnitude(sobelx, sobely)
+    
+    @cached_property
+    def laplacian(self) -> np.ndarray:
+        return cv2.Laplacian(self.gray, cv2.CV_32F)
+    
+    @cached_property
+    def blur(self) -> np.ndarray:
+        """5x5 Gaussian blur of the grayscale image."""
+        return cv2.GaussianBlur(self.gray, (5, 5), 0)
@@ -9,8 +9,18 @@ from typing import Dict, Any, List, Tuple
 from dataclasses import dataclass
 import structlog
 
+from app.services.image_handle import ImageSource, open_image
+from app.services.vision.color_quantizer import ColorQuantizer
+from app.services.vision.feature_maps import FeatureMaps
+
 logger = structlog.get_logger()
 
+# Appearance descriptors (similarity search) are taken from a thumbnail this size
+DESCRIPTOR_SIZE = 256
+COLOR_BINS = (10, 4, 2)  # hue, saturation, value
+GRID = 4  # cells per side for the edge and saliency layouts
+ORIENTATION_BINS = 4
+
 
 @dataclass
 class VisionSignal:
@@ -31,49 +41,96 @@ class OpenCVAnalyzer:
     def __init__(self):
         self.target_size = (1024, 1024)
     
-    def analyze(self, image_path: str) -> Dict[str, VisionSignal]:
+    def analyze(self, image: ImageSource) -> Dict[str, VisionSignal]:
         """
-        Run all deterministic analyses on an image.
+        Run all deterministic analyses on an image (a path, or the decoded
+        ImageHandle shared by the pipeline).
         Returns dictionary of signal_name -> VisionSignal.
         """
-        # Load image
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Could not load image: {image_path}")
-        
+        with open_image(image) as handle:
+            return self._analyze_pixels(handle)
+    
+    def describe(self, image: ImageSource) -> Dict[str, Any]:
+        """
+        Compact appearance descriptors for similarity search: colour
+        distribution, edge-orientation and saliency layouts, and a
+        perceptual hash. Histograms are normalised to sum to 1.
+        """
+        with open_image(image) as handle:
+            h, w = handle.bgr.shape[:2]
+            scale = min(1.0, DESCRIPTOR_SIZE / max(h, w))
+            thumb = cv2.resize(handle.bgr, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+            maps = FeatureMaps(thumb)
+            return {
+                "color_histogram": self._color_histogram(maps),
+                "edge_orientations": self._edge_orientations(maps),
+                "saliency_grid": self._saliency_grid(maps),
+                "phash": f"{perceptual_hash(handle.gray):016x}",
+            }
+    
+    def _color_histogram(self, maps: FeatureMaps) -> List[float]:
+        hist = cv2.calcHist([maps.hsv], [0, 1, 2], None, list(COLOR_BINS), [0, 180, 0, 256, 0, 256]).ravel()
+        return _distribution(hist)
+    
+    def _edge_orientations(self, maps: FeatureMaps) -> List[float]:
+        """Gradient magnitude per (grid cell, unsigned orientation) bin."""
+        gx = cv2.Sobel(maps.gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(maps.gray, cv2.CV_32F, 0, 1, ksize=3)
+        magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+        
+        h, w = maps.shape
+        orientation = ((angle % 180) * ORIENTATION_BINS / 180).astype(np.int64) % ORIENTATION_BINS
+        cell = (np.arange(h) * GRID // h)[:, None] * GRID + (np.arange(w) * GRID // w)[None, :]
+        bins = cell * ORIENTATION_BINS + orientation
+        hist = np.bincount(bins.ravel(), weights=magnitude.ravel(), minlength=GRID * GRID * ORIENTATION_BINS)
+        return _distribution(hist)
+    
+    def _saliency_grid(self, maps: FeatureMaps) -> List[float]:
+        """Spectral-residual saliency (Hou & Zhang) pooled over the grid."""
+        small = cv2.resize(maps.gray_f32, (64, 64), interpolation=cv2.INTER_AREA)
+        spectrum = np.fft.fft2(small)
+        log_amplitude = np.log1p(np.abs(spectrum)).astype(np.float32)
+        residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+        saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+        saliency = cv2.GaussianBlur(saliency.astype(np.float32), (9, 9), 2.5)
+        return _distribution(cv2.resize(saliency, (GRID, GRID), interpolation=cv2.INTER_AREA).ravel())
+    
+    def _analyze_pixels(self, handle) -> Dict[str, VisionSignal]:
         # Resize for consistent analysis
-        img = self._resize_image(img)
+        img = self._resize_image(handle.bgr)
         
-        # Convert to different color spaces
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        # Color spaces and filter maps are derived lazily, once per image;
+        # the handle's grayscale and edges are reused when no resize was needed
+        if img is handle.bgr:
+            maps = FeatureMaps(img, gray=handle.gray, canny=handle.edges)
+        else:
+            maps = FeatureMaps(img)
         
         signals = {}
         
         # === BRIGHTNESS & CONTRAST ===
-        signals.update(self._analyze_brightness_contrast(gray))
+        signals.update(self._analyze_brightness_contrast(maps))
         
         # === COLOR ANALYSIS ===
-        signals.update(self._analyze_colors(img, hsv))
+        signals.update(self._analyze_colors(maps))
         
         # === COMPOSITION ===
-        signals.update(self._analyze_composition(gray, img))
+        signals.update(self._analyze_composition(maps))
         
         # === TEXT DENSITY (from edges) ===
-        signals.update(self._analyze_edges(gray))
+        signals.update(self._analyze_edges(maps))
         
         # === SALIENCY ===
-        signals.update(self._analyze_saliency(img))
+        signals.update(self._analyze_saliency(maps))
         
         # === WHITE SPACE ===
-        signals.update(self._analyze_whitespace(gray))
+        signals.update(self._analyze_whitespace(maps))
         
         # === SYMMETRY ===
-        signals.update(self._analyze_symmetry(gray))
+        signals.update(self._analyze_symmetry(maps))
         
         # === VISUAL COMPLEXITY / NOISE ===
-        signals.update(self._analyze_noise(gray))
+        signals.update(self._analyze_noise(maps))
         
         logger.info("opencv_analysis_complete", signal_count=len(signals))
         return signals
@@ -85,12 +142,15 @@ class OpenCVAnalyzer:
         
         scale = min(target_w / w, target_h / h)
         new_w, new_h = int(w * scale), int(h * scale)
+        if (new_w, new_h) == (w, h):
+            return img
         
         return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
     
-    def _analyze_brightness_contrast(self, gray: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_brightness_contrast(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze brightness and contrast from grayscale image."""
         signals = {}
+        gray = maps.gray
         
         # Mean brightness (0-255)
         brightness_mean = float(np.mean(gray))
@@ -131,9 +191,10 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _analyze_colors(self, img: np.ndarray, hsv: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_colors(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze color properties."""
         signals = {}
+        img, hsv = maps.img, maps.hsv
         
         # Mean saturation
         saturation_mean = float(np.mean(hsv[:, :, 1]))
@@ -151,8 +212,11 @@ class OpenCVAnalyzer:
             unit="variance"
         )
         
+        # One histogram pass feeds both clustering signals
+        quantizer = ColorQuantizer().fit(img)
+        
         # Color count (unique colors via clustering)
-        color_count = self._count_dominant_colors(img)
+        color_count = quantizer.count_colors()
         signals["color_count"] = VisionSignal(
             name="color_count",
             value=color_count,
@@ -160,7 +224,7 @@ class OpenCVAnalyzer:
         )
         
         # Dominant color coverage
-        dominant_coverage = self._dominant_color_coverage(img)
+        dominant_coverage = quantizer.dominant_coverage()
         signals["dominant_color_coverage"] = VisionSignal(
             name="dominant_color_coverage",
             value=dominant_coverage,
@@ -177,44 +241,6 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _count_dominant_colors(self, img: np.ndarray, n_colors: int = 8) -> int:
-        """Count number of distinct dominant colors using k-means."""
-        pixels = img.reshape(-1, 3).astype(np.float32)
-        
-        # Sample for speed
-        sample_size = min(10000, len(pixels))
-        indices = np.random.choice(len(pixels), sample_size, replace=False)
-        pixels = pixels[indices]
-        
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-        
-        # Try different k values, count significant clusters
-        best_k = 1
-        for k in range(2, n_colors + 1):
-            _, labels, centers = cv2.kmeans(pixels, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-            
-            # Count clusters with >5% of pixels
-            unique, counts = np.unique(labels, return_counts=True)
-            significant = sum(1 for c in counts if c / len(labels) > 0.05)
-            
-            if significant >= k:
-                best_k = k
-        
-        return best_k
-    
-    def _dominant_color_coverage(self, img: np.ndarray) -> float:
-        """Calculate percentage of image covered by dominant color."""
-        pixels = img.reshape(-1, 3).astype(np.float32)
-        
-        # Single cluster k-means
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-        _, labels, centers = cv2.kmeans(pixels, 3, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-        
-        unique, counts = np.unique(labels, return_counts=True)
-        max_coverage = max(counts) / len(labels) * 100
-        
-        return float(max_coverage)
-    
     def _analyze_color_temperature(self, img: np.ndarray) -> float:
         """Analyze color temperature (-100=cool blue, +100=warm orange)."""
         b, g, r = cv2.split(img)
@@ -226,13 +252,12 @@ class OpenCVAnalyzer:
         
         return float(temp)
     
-    def _analyze_composition(self, gray: np.ndarray, img: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_composition(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze visual composition and layout."""
         signals = {}
-        h, w = gray.shape
         
         # Rule of thirds alignment
-        thirds_score = self._rule_of_thirds_score(gray)
+        thirds_score = self._rule_of_thirds_score(maps.canny)
         signals["rule_of_thirds_alignment"] = VisionSignal(
             name="rule_of_thirds_alignment",
             value=thirds_score,
@@ -240,7 +265,7 @@ class OpenCVAnalyzer:
         )
         
         # Visual weight distribution (center vs edges)
-        center_weight = self._center_weight_ratio(gray)
+        center_weight = self._center_weight_ratio(maps.sobel_magnitude)
         signals["center_weight_ratio"] = VisionSignal(
             name="center_weight_ratio",
             value=center_weight,
@@ -248,7 +273,7 @@ class OpenCVAnalyzer:
         )
         
         # Quadrant balance
-        balance_score = self._quadrant_balance(gray)
+        balance_score = self._quadrant_balance(maps.gray)
         signals["quadrant_balance"] = VisionSignal(
             name="quadrant_balance",
             value=balance_score,
@@ -257,17 +282,15 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _rule_of_thirds_score(self, gray: np.ndarray) -> float:
+    def _rule_of_thirds_score(self, edges: np.ndarray) -> float:
         """Calculate how well key elements align with rule of thirds."""
-        h, w = gray.shape
+        h, w = edges.shape
         
         # Define thirds lines
         h_thirds = [h // 3, 2 * h // 3]
         w_thirds = [w // 3, 2 * w // 3]
         
-        # Find high-contrast regions (potential focal points)
-        edges = cv2.Canny(gray, 50, 150)
-        
+        # High-contrast regions (Canny edges) are potential focal points
         # Score based on edge density near thirds intersections
         score = 0
         total_edge_density = np.sum(edges) / (h * w)
@@ -286,19 +309,14 @@ class OpenCVAnalyzer:
         
         return float(score)
     
-    def _center_weight_ratio(self, gray: np.ndarray) -> float:
-        """Calculate visual weight in center vs edges."""
-        h, w = gray.shape
+    def _center_weight_ratio(self, magnitude: np.ndarray) -> float:
+        """Calculate visual weight in center vs edges, using gradient magnitude."""
+        h, w = magnitude.shape
         
         # Define center region (middle 50%)
         ch1, ch2 = h // 4, 3 * h // 4
         cw1, cw2 = w // 4, 3 * w // 4
         
-        # Use gradient magnitude as visual weight
-        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        magnitude = np.sqrt(sobelx**2 + sobely**2)
-        
         center_weight = np.mean(magnitude[ch1:ch2, cw1:cw2])
         total_weight = np.mean(magnitude)
         
@@ -331,12 +349,12 @@ class OpenCVAnalyzer:
         
         return float(balance_score)
     
-    def _analyze_edges(self, gray: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_edges(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze edge density and clutter."""
         signals = {}
         
         # Edge detection
-        edges = cv2.Canny(gray, 50, 150)
+        edges = maps.canny
         
         # Edge density (percentage of edge pixels)
         edge_density = np.sum(edges > 0) / edges.size * 100
@@ -366,7 +384,7 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _analyze_saliency(self, img: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_saliency(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze visual saliency using a simple gradient-based method.
         
         Note: cv2.saliency requires opencv-contrib-python which may not be installed.
@@ -375,16 +393,8 @@ class OpenCVAnalyzer:
         signals = {}
         
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Simple saliency based on gradient magnitude
-            sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-            sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-            magnitude = np.sqrt(sobelx**2 + sobely**2)
-            
-            # Normalize to 0-255
-            saliency_map = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+            # Simple saliency based on gradient magnitude, normalized to 0-255
+            saliency_map = cv2.normalize(maps.sobel_magnitude, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
             
             # Apply Gaussian blur to smooth
             saliency_map = cv2.GaussianBlur(saliency_map, (21, 21), 0)
@@ -434,15 +444,16 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _analyze_whitespace(self, gray: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_whitespace(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze white/empty space in the image."""
         signals = {}
+        gray, gray_f32 = maps.gray, maps.gray_f32
         
         # Threshold for "white" (high brightness, low variance)
         # Use local variance to detect uniform regions
         kernel_size = 15
-        local_mean = cv2.blur(gray.astype(np.float32), (kernel_size, kernel_size))
-        local_sq_mean = cv2.blur((gray.astype(np.float32))**2, (kernel_size, kernel_size))
+        local_mean = cv2.blur(gray_f32, (kernel_size, kernel_size))
+        local_sq_mean = cv2.blur(cv2.multiply(gray_f32, gray_f32), (kernel_size, kernel_size))
         local_variance = local_sq_mean - local_mean**2
         
         # White space = bright + uniform
@@ -467,9 +478,10 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _analyze_symmetry(self, gray: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_symmetry(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze horizontal and vertical symmetry."""
         signals = {}
+        gray = maps.gray
         h, w = gray.shape
         
         # Horizontal symmetry (left-right)
@@ -481,7 +493,7 @@ class OpenCVAnalyzer:
         left = left[:, :min_w]
         right = right[:, :min_w]
         
-        h_symmetry = 1 - np.mean(np.abs(left.astype(float) - right.astype(float))) / 255
+        h_symmetry = 1 - np.mean(cv2.absdiff(left, right)) / 255
         signals["horizontal_symmetry"] = VisionSignal(
             name="horizontal_symmetry",
             value=h_symmetry * 100,
@@ -496,7 +508,7 @@ class OpenCVAnalyzer:
         top = top[:min_h, :]
         bottom = bottom[:min_h, :]
         
-        v_symmetry = 1 - np.mean(np.abs(top.astype(float) - bottom.astype(float))) / 255
+        v_symmetry = 1 - np.mean(cv2.absdiff(top, bottom)) / 255
         signals["vertical_symmetry"] = VisionSignal(
             name="vertical_symmetry",
             value=v_symmetry * 100,
@@ -505,13 +517,13 @@ class OpenCVAnalyzer:
         
         return signals
     
-    def _analyze_noise(self, gray: np.ndarray) -> Dict[str, VisionSignal]:
+    def _analyze_noise(self, maps: FeatureMaps) -> Dict[str, VisionSignal]:
         """Analyze image noise and visual complexity."""
         signals = {}
+        gray = maps.gray
         
         # Laplacian variance (measure of focus/detail/noise)
-        laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-        laplacian_var = float(np.var(laplacian))
+        laplacian_var = float(np.var(maps.laplacian))
         
         signals["laplacian_variance"] = VisionSignal(
             name="laplacian_variance",
@@ -521,8 +533,7 @@ class OpenCVAnalyzer:
         
         # High frequency noise estimation
         # Difference between original and gaussian blurred
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        noise = np.abs(gray.astype(float) - blurred.astype(float))
+        noise = cv2.absdiff(gray, maps.blur)
         noise_level = float(np.mean(noise))
         
         signals["noise_level"] = VisionSignal(
@@ -536,7 +547,7 @@ class OpenCVAnalyzer:
         hist = hist.flatten() / hist.sum()
         # Remove zeros for log calculation
         hist = hist[hist > 0]
-        entropy = -np.sum(hist * np.log2(hist))
+        entropy = float(-np.sum(hist * np.log2(hist)))
         
         signals["visual_entropy"] = VisionSignal(
             name="visual_entropy",
@@ -559,11 +570,31 @@ class OpenCVAnalyzer:
         }
 
 
-# Convenience function
-def analyze_image(image_path: str) -> Dict[str, Any]:
+def perceptual_hash(gray: np.ndarray) -> int:
+    """64-bit pHash: low-frequency DCT coefficients of a 32x32 grayscale thumbnail."""
+    thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(thumb)[:8, :8]
+    bits = (dct > np.median(dct)).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def _distribution(hist: np.ndarray) -> List[float]:
+    total = float(hist.sum())
+    if total <= 0:
+        return [0.0] * len(hist)
+    return [round(float(v) / total, 5) for v in hist]
+
+
+# Convenience functions
+def describe_image(image: ImageSource) -> Dict[str, Any]:
+    """Appearance descriptors of an image (see OpenCVAnalyzer.describe)."""
+    return OpenCVAnalyzer().describe(image)
+
+
+def analyze_image(image: ImageSource) -> Dict[str, Any]:
     """
     Analyze an image and return structured signals.
     """
     analyzer = OpenCVAnalyzer()
-    signals = analyzer.analyze(image_path)
+    signals = analyzer.analyze(image)
     return analyzer.get_signal_dict(signals)
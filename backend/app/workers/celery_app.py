@@ -1,7 +1,16 @@
 """
 Celery application for background task processing.
+
+Analysis runs on two queues so backfills never delay single uploads; give
+each its own workers, e.g.:
+    celery -A app.workers.celery_app worker -Q analysis.interactive
+    celery -A app.workers.celery_app worker -Q analysis.bulk,default -P threads -c 8
+
+A thread pool lets concurrent tasks share the worker's event loop
+(app.workers.runtime), which is what Vision micro-batching needs.
 """
 from celery import Celery
+from kombu import Queue
 from app.core.config import settings
 
 celery_app = Celery(
@@ -22,4 +31,23 @@ celery_app.conf.update(
     task_time_limit=300,  # 5 minutes max per task
     worker_prefetch_multiplier=1,
     task_acks_late=True,
+    task_queues=(
+        Queue("analysis.interactive"),
+        Queue("analysis.bulk"),
+        Queue("default"),
+    ),
+    task_default_queue="default",
+    task_routes={
+        "app.workers.tasks.analyze_creative_task": {"queue": "analysis.interactive"},
+        "app.workers.tasks.rescore_job_task": {"queue": "analysis.bulk"},
+        "app.workers.tasks.rebuild_benchmarks_task": {"queue": "analysis.bulk"},
+        "app.workers.tasks.backfill_embeddings_task": {"queue": "analysis.bulk"},
+    },
+    task_default_priority=6,
+    # Redis emulates priorities with one list per level; 0 is served first
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
 )
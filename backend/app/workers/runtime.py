@@ -0,0 +1,118 @@
+"""
+Worker Runtime - One long-lived event loop per Celery worker process.
+Async task bodies run on a loop owned by a background thread instead of a
+fresh `asyncio.run()` per task, so the database pool, the pooled LLM client
+and other loop-bound resources stay warm between tasks.
+"""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+import structlog
+from celery.signals import worker_process_init, worker_process_shutdown
+
+logger = structlog.get_logger()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+async def _warm_up():
+    """Open the loop-bound resources once so the first task doesn't pay for them."""
+    from sqlalchemy import text
+    from app.core.database import engine
+    from app.services.benchmark_index import start_benchmark_index
+    from app.services.benchmark_stats import start_benchmark_aggregation
+    from app.services.llm.client import get_llm_client
+    from app.services.storage.media_storage import get_storage
+    
+    get_llm_client()
+    get_storage()
+    await start_benchmark_index()
+    await start_benchmark_aggregation()
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+def start():
+    """Start this process's loop thread and warm it up; no-op if already running."""
+    global _loop, _thread
+    
+    with _lock:
+        if _loop is not None:
+            return
+        
+        from app.core.database import engine
+        from app.services.cpu_pool import warm_worker_imports
+        
+        # Connections inherited from the parent belong to its process (and loop)
+        engine.sync_engine.dispose(close=False)
+        warm_worker_imports()
+        
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="worker-loop", daemon=True)
+        thread.start()
+        _loop, _thread = loop, thread
+    
+    try:
+        run(_warm_up())
+    except Exception as e:
+        # The task that needs the resource will report the real error
+        logger.warning("worker_warm_up_failed", error=str(e))
+    logger.info("worker_loop_started")
+
+
+def run(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the worker loop and wait for its result."""
+    if _loop is None:
+        start()
+    
+    future = asyncio.run_coroutine_threadsafe(coro, _loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Soft time limit or worker shutdown: don't leave the coroutine running
+        future.cancel()
+        raise
+
+
+def stop():
+    """Close pooled connections and stop the loop thread."""
+    global _loop, _thread
+    
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+    if loop is None:
+        return
+    
+    from app.core.database import engine
+    from app.services.benchmark_index import stop_benchmark_index
+    from app.services.benchmark_stats import stop_benchmark_aggregation
+    from app.services.llm.client import close_llm_client
+    
+    async def close():
+        await stop_benchmark_aggregation()
+        await stop_benchmark_index()
+        await close_llm_client()
+        await engine.dispose()
+    
+    try:
+        asyncio.run_coroutine_threadsafe(close(), loop).result(10)
+    except Exception as e:
+        logger.warning("worker_loop_close_failed", error=str(e))
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+    logger.info("worker_loop_stopped")
+
+
+@worker_process_init.connect
+def _on_process_init(**_):
+    start()
+
+
+@worker_process_shutdown.connect
+def _on_process_shutdown(**_):
+    stop()
@@ -2,62 +2,80 @@
 Celery tasks for async processing.
 """
 from celery import shared_task
+from app.core.config import settings
 from app.workers.celery_app import celery_app
+from app.workers import runtime
 import structlog
 
 logger = structlog.get_logger()
 
+# A running analysis keeps its idempotency key this long past the time limit
+TASK_KEY_GRACE_SECONDS = 60
+
 
 @celery_app.task(bind=True, max_retries=3)
-def analyze_creative_task(self, creative_id: str, image_path: str):
+def analyze_creative_task(self, creative_id: str, media_url: str, requested_at: str = None):
     """
     Background task to analyze a creative.
+    
+    Routed to the interactive or bulk analysis queue by the caller
+    (see app.services.analysis_queue).
+    """
+    from app.services.analysis_queue import run_creative_analysis, claim_task_key, release_task_key
+    
+    logger.info("analysis_task_started", creative_id=creative_id, task_id=self.request.id)
+    
+    if self.request.id:
+        time_limit = self.time_limit or celery_app.conf.task_time_limit
+        claim_task_key(creative_id, self.request.id, time_limit + TASK_KEY_GRACE_SECONDS)
+    try:
+        runtime.run(run_creative_analysis(creative_id, media_url, requested_at))
+    finally:
+        if self.request.id:
+            release_task_key(creative_id, self.request.id)
+
+
+@celery_app.task
+def rescore_job_task(job_id: str):
+    """
+    Background task for a bulk rescore job.
+    
+    Runs for about RESCORE_TASK_SLICE_SECONDS (well inside the task time
+    limit), then re-queues itself to continue from the job's checkpoint.
     """
-    import asyncio
-    from app.services.orchestrator import analyze_creative
-    from app.core.database import AsyncSessionLocal
-    from app.models.models import Creative, CreativeStatus
-    from sqlalchemy import select
+    from app.services.rescore import run_rescore_job
     
-    logger.info("analysis_task_started", creative_id=creative_id)
+    logger.info("rescore_task_started", job_id=job_id)
     
-    async def run_analysis():
-        async with AsyncSessionLocal() as db:
-            try:
-                # Update status
-                result = await db.execute(select(Creative).where(Creative.id == creative_id))
-                creative = result.scalar_one_or_none()
-                
-                if not creative:
-                    logger.error("creative_not_found", creative_id=creative_id)
-                    return
-                
-                creative.status = CreativeStatus.PROCESSING
-                await db.commit()
-                
-                # Run analysis
-                analysis_result = await analyze_creative(image_path)
-                
-                # Update with results
-                if analysis_result.get("score"):
-                    creative.status = CreativeStatus.COMPLETED
-                    creative.final_score = analysis_result["score"].get("overall_score")
-                    creative.funnel_fit_score = analysis_result["score"].get("funnel_fit_score")
-                    creative.platform_fit_score = analysis_result["score"].get("platform_fit_score")
-                else:
-                    creative.status = CreativeStatus.FAILED
-                
-                await db.commit()
-                logger.info("analysis_task_completed", creative_id=creative_id)
-                
-            except Exception as e:
-                logger.error("analysis_task_failed", creative_id=creative_id, error=str(e))
-                if creative:
-                    creative.status = CreativeStatus.FAILED
-                    await db.commit()
-                raise
+    if not runtime.run(run_rescore_job(job_id, settings.RESCORE_TASK_SLICE_SECONDS)):
+        rescore_job_task.delay(job_id)
+
+
+@celery_app.task(soft_time_limit=3300, time_limit=3600)
+def rebuild_benchmarks_task(partition: int, partitions: int):
+    """
+    Background task rebuilding one partition of the benchmark sketches from
+    stored analyses (see app.services.benchmark_stats).
+    """
+    from app.services.benchmark_stats import rebuild_benchmarks
+    
+    logger.info("benchmark_rebuild_task_started", partition=partition, partitions=partitions)
+    runtime.run(rebuild_benchmarks(partition, partitions))
+
+
+@celery_app.task
+def backfill_embeddings_task(after: str = None):
+    """
+    Background task embedding creatives without a current similarity
+    embedding (see app.services.similarity). Re-queues itself after about
+    RESCORE_TASK_SLICE_SECONDS to continue after the last creative done.
+    """
+    from app.services.similarity import backfill_embeddings
     
-    asyncio.run(run_analysis())
+    logger.info("embedding_backfill_task_started", after=after)
+    last_id = runtime.run(backfill_embeddings(after, settings.RESCORE_TASK_SLICE_SECONDS))
+    if last_id:
+        backfill_embeddings_task.delay(last_id)
 
 
 @celery_app.task
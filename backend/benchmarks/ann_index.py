@@ -0,0 +1,68 @@
+"""
+IVF index build time, query latency and recall against exact search on
+clustered synthetic embeddings:
+    python -m benchmarks.ann_index [n] [nprobe]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex, _top_k
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+nprobe = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+dim, k = 256, 10
+rng = np.random.default_rng(7)
+
+# Clustered unit vectors (creatives come in families: templates, campaigns)
+centers = rng.normal(size=(5000, dim)).astype(np.float32)
+vectors = np.empty((n, dim), np.float32)
+for start in range(0, n, 100_000):
+    end = min(n, start + 100_000)
+    block = centers[rng.integers(0, len(centers), end - start)]
+    block += rng.normal(scale=0.6, size=block.shape).astype(np.float32)
+    vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+ids = [uuid.UUID(int=i) for i in range(n)]
+# 50 large tenants and one with 1000 creatives
+owner_codes = np.arange(n) % 50
+owner_codes[:1000] = 50
+owners = [f"user-{c}" for c in owner_codes]
+
+start = time.perf_counter()
+index = IVFIndex.build(vectors, ids, owners)
+print(f"build: {time.perf_counter() - start:.1f} s for {n} x {dim} ({len(index.centroids)} lists)")
+
+directory = os.path.join(tempfile.mkdtemp(), "index")
+start = time.perf_counter()
+index.save(directory)
+saved = time.perf_counter() - start
+start = time.perf_counter()
+index = IVFIndex.load(directory)
+print(f"save {saved:.1f} s, load (mmap) {(time.perf_counter() - start) * 1000:.1f} ms")
+
+queries = rng.choice(n, 200, replace=False)
+for label, code_of in (("all", lambda q: None), ("large tenant", lambda q: owner_codes[q] % 50), ("small tenant", lambda q: 50)):
+    latencies, recalls = [], []
+    for q in queries:
+        code = code_of(q)
+        owner = None if code is None else f"user-{code}"
+        start = time.perf_counter()
+        got = index.search(vectors[q], k, owner=owner, nprobe=nprobe)
+        latencies.append(time.perf_counter() - start)
+        
+        scores = vectors @ vectors[q]
+        if code is not None:
+            scores = np.where(owner_codes == code, scores, -np.inf)
+        truth = {ids[i] for i in _top_k(scores, k)}
+        recalls.append(len(truth & {i for i, _ in got}) / k)
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{label:12s} top-{k}: p50 {np.percentile(latencies, 50):.2f} ms, "
+        f"p99 {np.percentile(latencies, 99):.2f} ms, recall@{k} {np.mean(recalls):.3f}"
+    )
+shutil.rmtree(os.path.dirname(directory), ignore_errors=True)
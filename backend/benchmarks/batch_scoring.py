@@ -0,0 +1,86 @@
+"""
+Compiled batch scoring vs score_creative_three_layer per creative, with an
+exactness check (tests/test_batch_scoring.py asserts the same on fewer
+creatives):
+    python -m benchmarks.batch_scoring [creatives ...]
+"""
+import logging
+import random
+import sys
+import time
+from typing import Dict
+
+import structlog
+
+from app.services.scoring.batch_scoring import SignalMatrix, get_compiled_pillars, score_matrix
+from app.services.scoring.three_layer_engine import (
+    PILLAR_DEFINITIONS, SignalLayer, score_creative_three_layer
+)
+
+structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+# Per-creative timing is extrapolated beyond this many
+reference_limit = 10000
+
+compiled = get_compiled_pillars()
+sources = {
+    SignalLayer.DETERMINISTIC: ["opencv", "ocr"],
+    SignalLayer.PERCEPTUAL: ["vision"],
+    SignalLayer.COGNITIVE: ["copy", "cognitive"],
+}
+layer_of = {}
+for definition in PILLAR_DEFINITIONS.values():
+    for name, config in definition["target_signals"].items():
+        layer_of.setdefault(name, SignalLayer(config["layer"]))
+
+
+def random_creative(rng: random.Random) -> Dict[str, Dict]:
+    signals: Dict[str, Dict] = {"opencv": {}, "ocr": {}, "vision": {}, "copy": {}, "cognitive": {}}
+    for name, layer in layer_of.items():
+        if rng.random() < 0.8:
+            if rng.random() < 0.2:
+                signal = {"value": rng.random() < 0.5, "unit": "boolean"}
+            else:
+                signal = {"value": round(rng.uniform(-10, 110), rng.choice([0, 1, 3])),
+                          "confidence": rng.choice([1.0, 0.9, 0.75, 0.6])}
+            signals[rng.choice(sources[layer])][name] = signal
+    for i in range(rng.randint(5, 25)):
+        signals["opencv"][f"extra_{i}"] = {"value": rng.uniform(0, 100)}
+    return signals
+
+
+rng = random.Random(7)
+creatives = [random_creative(rng) for _ in range(max(sizes))]
+context = ("fmcg", "instagram", "conversion")
+
+for n in sizes:
+    batch = creatives[:n]
+    start = time.perf_counter()
+    matrix = SignalMatrix.from_signals(batch, compiled)
+    flattened = time.perf_counter()
+    scores = score_matrix(matrix, compiled, *context)
+    scored = time.perf_counter()
+    
+    checked = min(n, reference_limit)
+    start_ref = time.perf_counter()
+    mismatches = 0
+    for i in range(checked):
+        expected = score_creative_three_layer(batch[i], *context)
+        got = scores.row(i)
+        if (
+            got["overall_score"] != expected["overall_score"]
+            or got["confidence"] != expected["confidence"]
+            or got["confidence_band"] != tuple(expected["confidence_band"])
+            or got["data_quality"] != expected["data_quality"]
+            or [(q["score"], q["confidence"], q["vs_category_avg"]) for q in got["pillars"]]
+            != [(q["score"], q["confidence"], q["vs_category_avg"]) for q in expected["pillars"]]
+        ):
+            mismatches += 1
+    per_creative = (time.perf_counter() - start_ref) / checked * n
+    
+    print(
+        f"{n:>7} creatives: compiled {scored - start:6.2f} s "
+        f"(flatten {flattened - start:5.2f} s, score {scored - flattened:5.3f} s) | "
+        f"per-creative {per_creative:7.2f} s{' (est.)' if checked < n else ''} | "
+        f"mismatches {mismatches}/{checked}"
+    )
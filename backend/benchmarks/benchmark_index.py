@@ -0,0 +1,47 @@
+"""
+Benchmark index context resolution and lookup cost:
+    python -m benchmarks.benchmark_index [rows]
+"""
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from app.services.benchmark_index import STAT_FIELDS, BenchmarkIndex
+from app.services.scoring.three_layer_engine import PILLAR_DEFINITIONS
+
+n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+rng = random.Random(7)
+categories = ["general", "fmcg", "tech", "fashion"] + [f"category_{i}" for i in range(46)]
+platforms = [None, "instagram", "facebook", "youtube", "search"]
+stages = [None, "awareness", "consideration", "conversion"]
+signals = [f"signal_{i}" for i in range(n_rows // 200 or 1)]
+
+rows = [
+    SimpleNamespace(
+        category=rng.choice(categories), platform=rng.choice(platforms),
+        funnel_stage=rng.choice(stages), signal_name=rng.choice(signals),
+        **{field: rng.uniform(0, 100) for field in STAT_FIELDS}
+    )
+    for _ in range(n_rows)
+]
+weight_rows = [
+    SimpleNamespace(category=c, platform=None, funnel_stage=None, pillar_name=p, weight=rng.uniform(0.1, 0.3))
+    for c in categories[:10] for p in PILLAR_DEFINITIONS
+]
+
+start = time.perf_counter()
+index = BenchmarkIndex.from_rows(rows, weight_rows)
+print(f"built from {n_rows} rows in {time.perf_counter() - start:.2f} s, version {index.version}")
+
+contexts = [(c, p or "general", f or "awareness") for c in categories for p in platforms for f in stages]
+start = time.perf_counter()
+for context in contexts:
+    index.resolve(*context)
+print(f"first resolve: {(time.perf_counter() - start) / len(contexts) * 1e6:8.1f} us/context")
+
+lookups = 1_000_000
+start = time.perf_counter()
+for i in range(lookups):
+    index.resolve(*contexts[i % len(contexts)]).benchmarks.get("signal_0")
+print(f"cached lookup: {(time.perf_counter() - start) / lookups * 1e6:8.2f} us")
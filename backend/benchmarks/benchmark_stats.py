@@ -0,0 +1,82 @@
+"""
+Benchmark sketch flush and rebuild cost on a scratch SQLite database:
+    DATABASE_URL=sqlite+aiosqlite:////tmp/bench.db python -m benchmarks.benchmark_stats [creatives]
+"""
+import asyncio
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict
+
+from sqlalchemy import insert
+
+from app.core.database import AsyncSessionLocal, init_db
+from app.models.models import Brand, Campaign, Creative, CreativeStatus, MediaType, MicroSignal, User
+from app.services.benchmark_index import get_benchmark_index, refresh_benchmark_index
+from app.services.benchmark_stats import get_benchmark_aggregator, rebuild_benchmarks
+from app.services.persistence import micro_signal_rows
+
+n_creatives = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+rng = random.Random(7)
+signal_names = [f"signal_{i}" for i in range(100)]
+contexts = [(c, p, f) for c in ("fmcg", "tech") for p in ("instagram", "youtube") for f in ("awareness", "conversion")]
+
+
+def fake_result() -> Dict[str, Any]:
+    return {
+        "signals": {"opencv": {name: {"value": rng.gauss(50 + i % 7, 12), "unit": "score"} for i, name in enumerate(signal_names)}},
+        "score": {"pillars": [{"name": "attention_capture", "score": rng.uniform(30, 90)}]},
+    }
+
+
+async def main():
+    await init_db()
+    results = []
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        campaigns = {}
+        for category, platform, funnel_stage in contexts:
+            brand = Brand(user_id=user.id, name=category, category=category)
+            db.add(brand)
+            await db.flush()
+            campaign = Campaign(brand_id=brand.id, name=platform, platform=platform, funnel_stage=funnel_stage)
+            db.add(campaign)
+            await db.flush()
+            campaigns[(category, platform, funnel_stage)] = campaign.id
+        signal_rows = []
+        for i in range(n_creatives):
+            context = contexts[i % len(contexts)]
+            creative = Creative(
+                campaign_id=campaigns[context], media_url=f"bench/{i}.png", media_type=MediaType.IMAGE,
+                status=CreativeStatus.COMPLETED
+            )
+            db.add(creative)
+            await db.flush()
+            result = fake_result()
+            results.append((context, result))
+            signal_rows.extend(micro_signal_rows(creative.id, result["signals"]))
+        await db.execute(insert(MicroSignal), signal_rows)
+        await db.commit()
+    
+    start = time.perf_counter()
+    for context, result in results:
+        get_benchmark_aggregator().record(context, result)
+    record_time = time.perf_counter() - start
+    start = time.perf_counter()
+    flushed = await get_benchmark_aggregator().flush()
+    print(f"record: {record_time / n_creatives * 1e6:.0f} us/analysis; flush of {flushed} sketches {time.perf_counter() - start:.2f} s")
+    
+    start = time.perf_counter()
+    for partition in range(4):
+        await rebuild_benchmarks(partition, 4)
+    print(f"rebuild from {len(signal_rows)} signal rows in 4 partitions: {time.perf_counter() - start:.2f} s")
+    
+    await refresh_benchmark_index()
+    reference = get_benchmark_index().resolve("fmcg", "instagram", "awareness")
+    print("fmcg/instagram/awareness signal_0:", reference.benchmarks.get("signal_0"))
+
+
+asyncio.run(main())
@@ -0,0 +1,44 @@
+"""
+ColorQuantizer against the previous per-k cv2.kmeans sweep:
+    python -m benchmarks.color_quantizer
+"""
+import time
+
+import cv2
+import numpy as np
+
+from app.services.vision.color_quantizer import ColorQuantizer
+
+rng = np.random.default_rng(0)
+img = np.zeros((1024, 1024, 3), dtype=np.uint8)
+for color in rng.integers(0, 256, size=(6, 3)):
+    x, y = rng.integers(0, 768, size=2)
+    img[y:y + 384, x:x + 384] = color
+img = cv2.add(img, rng.integers(0, 24, size=img.shape, dtype=np.uint8))
+
+
+def legacy(img):
+    pixels = img.reshape(-1, 3).astype(np.float32)
+    sample = pixels[np.random.choice(len(pixels), 10000, replace=False)]
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
+    best_k = 1
+    for k in range(2, 9):
+        _, labels, _ = cv2.kmeans(sample, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+        _, counts = np.unique(labels, return_counts=True)
+        if sum(1 for c in counts if c / len(labels) > 0.05) >= k:
+            best_k = k
+    _, labels, _ = cv2.kmeans(pixels, 3, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+    _, counts = np.unique(labels, return_counts=True)
+    return best_k, max(counts) / len(labels) * 100
+
+
+def single_pass(img):
+    q = ColorQuantizer().fit(img)
+    return q.count_colors(), q.dominant_coverage()
+
+
+for name, fn in (("kmeans sweep", legacy), ("quantizer", single_pass)):
+    start = time.perf_counter()
+    count, coverage = fn(img)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{name:>12}: {elapsed:8.1f} ms  color_count={count} dominant_coverage={coverage:.1f}%")
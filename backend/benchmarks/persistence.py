@@ -0,0 +1,82 @@
+"""
+Row throughput for bulk persistence vs one ORM object per row:
+    python -m benchmarks.persistence [creatives]
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core.database import Base
+from app.models.models import MicroSignal, Recommendation, ScorePillar
+from app.services.persistence import (
+    SIGNAL_SOURCES, micro_signal_rows, recommendation_rows, save_analysis_rows, score_pillar_rows
+)
+
+n_creatives = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+sample = {
+    "signals": {
+        group: {
+            f"{group}_signal_{i}": {"value": i * 1.5, "unit": "score_0_100", "confidence": 0.9}
+            for i in range(25)
+        }
+        for group in SIGNAL_SOURCES
+    },
+    "score": {
+        "overall_score": 64.0,
+        "pillars": [
+            {"name": f"pillar_{i}", "score": 60.0 + i, "layer_breakdown": {"deterministic": 20.0},
+             "explanation": {"boardroom_summary": "Solid."}}
+            for i in range(6)
+        ],
+    },
+    "recommendations": [
+        {"priority": i + 1, "signal": "edge_density", "category": "visual",
+         "fix": "Reduce clutter", "uplift": 2.5, "difficulty": "easy"}
+        for i in range(5)
+    ],
+}
+
+
+async def orm_rows(db, creative_id):
+    for model, rows in (
+        (MicroSignal, micro_signal_rows(creative_id, sample["signals"])),
+        (ScorePillar, score_pillar_rows(creative_id, sample["score"])),
+        (Recommendation, recommendation_rows(creative_id, sample)),
+    ):
+        for row in rows:
+            db.add(model(**row))
+    await db.flush()
+
+
+async def bulk_rows(db, creative_id):
+    await save_analysis_rows(db, creative_id, sample)
+
+
+async def bench(name, write):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, expire_on_commit=False)
+    
+    rows = n_creatives * (len(micro_signal_rows(None, sample["signals"])) + 6 + 5)
+    start = time.perf_counter()
+    async with session() as db:
+        for _ in range(n_creatives):
+            await write(db, uuid.uuid4())
+            db.expunge_all()
+        await db.commit()
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    print(f"{name:>6}: {n_creatives} creatives, {rows} rows in {elapsed:6.1f} s = {rows / elapsed:9.0f} rows/s")
+
+
+async def main():
+    await bench("orm", orm_rows)
+    await bench("bulk", bulk_rows)
+
+
+asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+t-digest accuracy and cost against exact percentiles:
+    python -m benchmarks.quantile_sketch [n]
+"""
+import sys
+import time
+
+import numpy as np
+
+from app.services.quantile_sketch import TDigest
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+rng = np.random.default_rng(7)
+distributions = {
+    "normal": rng.normal(60, 15, n),
+    "lognormal": rng.lognormal(1.0, 0.8, n),
+    "bimodal": np.r_[rng.normal(20, 5, n // 2), rng.normal(80, 5, n - n // 2)],
+}
+
+for name, data in distributions.items():
+    start = time.perf_counter()
+    digest = TDigest()
+    for value in data[:10_000]:
+        digest.add(value)
+    for chunk in np.array_split(data[10_000:], 100):
+        digest.update(chunk)
+    build = time.perf_counter() - start
+    
+    # Same data as 8 partial digests merged
+    parts = []
+    for part in np.array_split(data, 8):
+        parts.append(TDigest())
+        parts[-1].update(part)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    
+    start = time.perf_counter()
+    exact = np.percentile(data, [25, 50, 75, 90])
+    exact_time = time.perf_counter() - start
+    
+    sorted_data = np.sort(data)
+    for label, d in (("streamed", digest), ("merged", merged)):
+        rank_errors = [
+            abs(np.searchsorted(sorted_data, d.quantile(q)) / n - q) * 100
+            for q in (0.25, 0.5, 0.75, 0.9)
+        ]
+        print(
+            f"{name:9s} {label:8s} centroids={len(d):4d} "
+            f"max rank error={max(rank_errors):.3f} pct pts  "
+            f"mean err={abs(d.mean - data.mean()):.2e} std err={abs(d.std_dev - data.std()):.2e}"
+        )
+    print(f"{'':9s} build {build:.2f} s for {n} values; exact np.percentile {exact_time * 1000:.0f} ms (all in memory)")
+    print(f"{'':9s} exact {np.round(exact, 2)} vs sketch {np.round([digest.quantile(q) for q in (0.25, 0.5, 0.75, 0.9)], 2)}")
@@ -0,0 +1,101 @@
+"""
+End-to-end bulk rescore throughput on an in-memory SQLite database:
+    python -m benchmarks.rescore [creatives]
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict
+
+import structlog
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core import database
+from app.core.database import Base
+from app.models.models import (
+    Brand, Campaign, Creative, CreativeAnalysis, CreativeStatus, MediaType, RescoreJob, ScorePillar, User
+)
+from app.services.orchestrator import SIGNAL_LAYERS
+from app.services.rescore import create_rescore_job, run_rescore_job
+from app.services.scoring.three_layer_engine import PILLAR_DEFINITIONS
+
+structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+n_creatives = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+names = {
+    name: config["layer"]
+    for definition in PILLAR_DEFINITIONS.values()
+    for name, config in definition["target_signals"].items()
+}
+layer_sources = {"deterministic": "opencv", "perceptual": "vision", "cognitive": "copy"}
+
+
+def stored_layers(rng: random.Random) -> Dict[str, Dict]:
+    layers = {source: {} for source in SIGNAL_LAYERS}
+    for name, layer in names.items():
+        if rng.random() < 0.8:
+            layers[layer_sources[layer]][name] = {"value": round(rng.uniform(0, 100), 1), "confidence": 0.9}
+    for i in range(20):
+        layers["ocr" if i % 2 else "opencv"][f"extra_{i}"] = {"value": rng.uniform(0, 100)}
+    return layers
+
+
+async def main():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    database.AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    
+    rng = random.Random(7)
+    async with database.AsyncSessionLocal() as db:
+        user = User(email="bench@example.com", password_hash="x")
+        brand = Brand(user=user, name="Bench", category="fmcg")
+        campaign = Campaign(brand=brand, name="Bench", platform="instagram", funnel_stage="conversion")
+        db.add_all([user, brand, campaign])
+        await db.flush()
+        
+        start = time.perf_counter()
+        conn = await db.connection()
+        for offset in range(0, n_creatives, 5000):
+            creatives, analyses, pillars = [], [], []
+            for _ in range(min(5000, n_creatives - offset)):
+                creative_id = uuid.uuid4()
+                creatives.append({
+                    "id": creative_id, "campaign_id": campaign.id, "media_url": "bench",
+                    "media_type": MediaType.IMAGE, "status": CreativeStatus.COMPLETED,
+                    "final_score": 50.0, "score_confidence": 40.0, "analyzed_at": datetime.utcnow(),
+                })
+                for source, signals in stored_layers(rng).items():
+                    analyses.append({
+                        "id": uuid.uuid4(), "creative_id": creative_id, "analysis_type": source,
+                        "raw_output": {}, "signals_extracted": signals,
+                    })
+                for name in PILLAR_DEFINITIONS:
+                    pillars.append({"id": uuid.uuid4(), "creative_id": creative_id, "pillar_name": name, "score": 50.0})
+            await conn.execute(insert(Creative.__table__), creatives)
+            await conn.execute(insert(CreativeAnalysis.__table__), analyses)
+            await conn.execute(insert(ScorePillar.__table__), pillars)
+        await db.commit()
+        print(f"seeded {n_creatives} creatives in {time.perf_counter() - start:.1f} s")
+        
+        job = await create_rescore_job(db, user.id, brand_id=brand.id)
+    
+    start = time.perf_counter()
+    await run_rescore_job(str(job.id))
+    elapsed = time.perf_counter() - start
+    
+    async with database.AsyncSessionLocal() as db:
+        job = await db.get(RescoreJob, job.id)
+        print(
+            f"rescored {job.processed}/{job.total} creatives ({job.updated} updated) "
+            f"in {elapsed:.1f} s = {job.processed / elapsed:.0f} creatives/s"
+        )
+    await engine.dispose()
+
+
+asyncio.run(main())
@@ -0,0 +1,34 @@
+"""
+Unbatched vs batched Vision calls for a burst of creatives, e.g. against a
+local mock server (OPENAI_BASE_URL=http://localhost:8100/v1):
+    python -m benchmarks.vision_batcher <image> [creatives] [max_images]
+"""
+import asyncio
+import sys
+import time
+
+from app.core.config import settings
+from app.services.llm.vision_batcher import VisionBatcher
+
+image = sys.argv[1]
+n_creatives = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+
+async def burst(max_images: int):
+    batcher = VisionBatcher(max_images=max_images, window_ms=settings.VISION_BATCH_WINDOW_MS)
+    start = time.perf_counter()
+    await asyncio.gather(*(batcher.analyze(image) for _ in range(n_creatives)))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    print(f"max_images={max_images}: {stats['requests']:3d} requests, "
+          f"{stats['tokens_per_image']:7.1f} tokens/creative, "
+          f"{n_creatives / elapsed * 60:7.0f} creatives/min, fallbacks={stats['fallbacks']}")
+
+
+async def main():
+    await burst(1)
+    await burst(batch_size)
+
+
+asyncio.run(main())
@@ -0,0 +1,88 @@
+"""score_batch must give every creative exactly what score_creative_three_layer gives it."""
+import random
+from typing import Dict
+
+import pytest
+
+from app.services.scoring.batch_scoring import score_batch
+from app.services.scoring.three_layer_engine import (
+    PILLAR_DEFINITIONS, SignalLayer, pillar_benchmark_name, score_creative_three_layer
+)
+
+SOURCES = {
+    SignalLayer.DETERMINISTIC: ["opencv", "ocr"],
+    SignalLayer.PERCEPTUAL: ["vision"],
+    SignalLayer.COGNITIVE: ["copy", "cognitive"],
+}
+LAYER_OF = {
+    name: SignalLayer(config["layer"])
+    for definition in PILLAR_DEFINITIONS.values()
+    for name, config in definition["target_signals"].items()
+}
+
+
+def random_signals(rng: random.Random) -> Dict[str, Dict]:
+    """Missing, boolean, out-of-range and low-confidence signals, plus ones no pillar uses."""
+    signals: Dict[str, Dict] = {"opencv": {}, "ocr": {}, "vision": {}, "copy": {}, "cognitive": {}}
+    for name, layer in LAYER_OF.items():
+        if rng.random() < 0.8:
+            if rng.random() < 0.2:
+                signal = {"value": rng.random() < 0.5, "unit": "boolean"}
+            else:
+                signal = {"value": round(rng.uniform(-10, 110), rng.choice([0, 1, 3])),
+                          "confidence": rng.choice([1.0, 0.9, 0.75, 0.6])}
+            signals[rng.choice(SOURCES[layer])][name] = signal
+    for i in range(rng.randint(0, 10)):
+        signals["opencv"][f"extra_{i}"] = {"value": rng.uniform(0, 100)}
+    return signals
+
+
+def stored_reference(rng: random.Random):
+    """Benchmark rows and pillar weights as the benchmark index serves them."""
+    benchmarks = {}
+    for pillar in PILLAR_DEFINITIONS:
+        p50 = rng.uniform(40, 70)
+        benchmarks[pillar_benchmark_name(pillar)] = {
+            "p25": p50 - 10, "p50": p50, "p75": p50 + 10, "p90": p50 + 18, "mean": p50 + 1
+        }
+    for name in LAYER_OF:
+        p50 = rng.uniform(30, 70)
+        benchmarks[name] = {"p25": p50 - 15, "p50": p50, "p75": p50 + 15, "p90": p50 + 25}
+    total = len(PILLAR_DEFINITIONS)
+    weights = {pillar: (1 + i) / (total * (total + 1) / 2) for i, pillar in enumerate(PILLAR_DEFINITIONS)}
+    return benchmarks, weights
+
+
+def numeric(result: Dict) -> Dict:
+    return {
+        "overall_score": result["overall_score"],
+        "confidence": result["confidence"],
+        "confidence_band": tuple(result["confidence_band"]),
+        "data_quality": result["data_quality"],
+        "pillars": [
+            (p["name"], p["score"], p["confidence"], p["vs_category_avg"]) for p in result["pillars"]
+        ],
+    }
+
+
+@pytest.mark.parametrize("seed, context", [
+    (1, ("general", "general", "awareness")),
+    (2, ("fmcg", "instagram", "conversion")),
+    (3, ("tech", "youtube", "consideration")),
+])
+@pytest.mark.parametrize("stored", [False, True], ids=["built-in", "stored"])
+def test_score_batch_matches_per_creative_scoring(seed, context, stored):
+    rng = random.Random(seed)
+    benchmarks, weights = stored_reference(rng) if stored else (None, None)
+    signal_sets = [random_signals(rng) for _ in range(300)]
+    
+    scores = score_batch(signal_sets, *context, benchmarks=benchmarks, weights=weights)
+    
+    assert len(scores) == len(signal_sets)
+    for i, signals in enumerate(signal_sets):
+        expected = score_creative_three_layer(signals, *context, benchmarks=benchmarks, weights=weights)
+        assert numeric(scores.row(i)) == numeric(expected), f"creative {i}"
+
+
+def test_score_batch_of_nothing():
+    assert len(score_batch([])) == 0